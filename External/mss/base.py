@@ -12,6 +12,11 @@ from .models import Monitor, Monitors
 from .screenshot import ScreenShot
 from .tools import to_png
 
+try:
+    import numpy as np
+except ImportError:  # pragma: nocover
+    np = None
+
 lock = Lock()
 
 
@@ -208,6 +213,9 @@ class MSSBase(metaclass=ABCMeta):
         if not overlap:
             return screenshot
 
+        if np is not None:
+            return MSSBase._merge_numpy(screenshot, cursor)
+
         screen_data = screenshot.raw
         cursor_data = cursor.raw
 
@@ -240,6 +248,33 @@ class MSSBase(metaclass=ABCMeta):
 
         return screenshot
 
+    @staticmethod
+    def _merge_numpy(screenshot: ScreenShot, cursor: ScreenShot, /) -> ScreenShot:
+        """Vectorized version of the blending loop in ``_merge``, byte-exact with it."""
+
+        (cx, cy), (cw, ch) = cursor.pos, cursor.size
+        (x, y), (w, h) = screenshot.pos, screenshot.size
+
+        # screenshot.raw is a bytearray, so this view writes into it in place
+        screen = np.frombuffer(screenshot.raw, dtype=np.uint8, count=w * h * 4).reshape(h, w, 4)
+        cursor_px = np.frombuffer(cursor.raw, dtype=np.uint8, count=cw * ch * 4).reshape(ch, cw, 4)
+
+        left, top = max(cx, x), max(cy, y)
+        right, bottom = min(cx + cw, x + w), min(cy + ch, y + h)
+        dst = screen[top - y : bottom - y, left - x : right - x]
+        src = cursor_px[top - cy : bottom - cy, left - cx : right - cx]
+
+        alpha = src[..., 3]
+        opaque = alpha == 255
+        dst[opaque, :3] = src[opaque, :3]
+        blend = (alpha != 0) & ~opaque
+        if blend.any():
+            # Same float64 expression and truncation as the pure Python path
+            factor = (alpha[blend] / 255)[:, None]
+            dst[blend, :3] = (src[blend, :3] * factor + dst[blend, :3] * (1 - factor)).astype(np.uint8)
+
+        return screenshot
+
     @staticmethod
     def _cfactory(
         attr: Any,
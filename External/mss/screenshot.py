@@ -8,6 +8,11 @@ from typing import Any, Dict, Iterator, Optional, Type
 from .exception import ScreenShotError
 from .models import Monitor, Pixel, Pixels, Pos, Size
 
+try:
+    import numpy as np
+except ImportError:  # pragma: nocover
+    np = None
+
 
 class ScreenShot:
     """
@@ -96,12 +101,21 @@ class ScreenShot:
         """
 
         if not self.__rgb:
-            rgb = bytearray(self.height * self.width * 3)
-            raw = self.raw
-            rgb[::3] = raw[2::4]
-            rgb[1::3] = raw[1::4]
-            rgb[2::3] = raw[::4]
-            self.__rgb = bytes(rgb)
+            if np is not None:
+                bgra = np.frombuffer(self.raw, dtype=np.uint8, count=self.height * self.width * 4).reshape(-1, 4)
+                # Per-channel copies are about twice as fast as a reversed fancy slice
+                rgb = np.empty((bgra.shape[0], 3), dtype=np.uint8)
+                rgb[:, 0] = bgra[:, 2]
+                rgb[:, 1] = bgra[:, 1]
+                rgb[:, 2] = bgra[:, 0]
+                self.__rgb = rgb.tobytes()
+            else:
+                rgb = bytearray(self.height * self.width * 3)
+                raw = self.raw
+                rgb[::3] = raw[2::4]
+                rgb[1::3] = raw[1::4]
+                rgb[2::3] = raw[::4]
+                self.__rgb = bytes(rgb)
 
         return self.__rgb
 
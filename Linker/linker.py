@@ -5,11 +5,12 @@ import blf
 import gpu
 from bpy.app.translations import pgettext_iface
 from bpy.app import background
-from math import sin, pi, cos
+import heapq
+from math import sin, pi, cos, floor
 from mathutils import Vector
 from bpy.types import Context
 from ..translations.translation import ctxt
-from ..SDNode.nodes import NodeBase, calc_hash_type, ctxt
+from ..SDNode.nodes import LazyNodeRegistry, SocketIndex
 from ..utils import _T2
 from ..preference import get_pref
 
@@ -283,25 +284,132 @@ class Socket:
         self.name = txt
 
 
+def NodeBox(nd: bpy.types.Node):
+    """
+        节点中心和尺寸(节点编辑器坐标)
+    """
+    ndLocation = RecrGetNodeFinalLoc(nd)
+    ndSize = Vector((4, 4)) if nd.bl_idname == 'NodeReroute' else nd.dimensions / UiScale()
+    ndLocation = ndLocation if nd.bl_idname == 'NodeReroute' else ndLocation + ndSize / 2 * Vector((1, -1))
+    return ndLocation, ndSize
+
+
+def NodeDist(ndLocation, ndSize, callPos):
+    field0 = callPos - ndLocation
+    field1 = Vector(((field0.x > 0) * 2 - 1, (field0.y > 0) * 2 - 1))
+    field0 = Vector((abs(field0.x), abs(field0.y))) - ndSize / 2
+    field2 = Vector((max(field0.x, 0), max(field0.y, 0)))
+    field3 = Vector((abs(field0.x), abs(field0.y)))
+    field3 = field3 * Vector((field3.x <= field3.y, field3.x > field3.y))
+    field3 = field3 * -((field2.x + field2.y) == 0)
+    field4 = (field2 + field3) * field1
+    return field4.length
+
+
 def GetNearestNodes(nodes: list[bpy.types.Node], callPos):
     all_nodes = []
     for nd in nodes:
-        ndLocation = RecrGetNodeFinalLoc(nd)
-        ndSize = Vector((4, 4)) if nd.bl_idname == 'NodeReroute' else nd.dimensions / UiScale()
-        ndLocation = ndLocation if nd.bl_idname == 'NodeReroute' else ndLocation + ndSize / 2 * Vector((1, -1))
-        field0 = callPos - ndLocation
-        field1 = Vector(((field0.x > 0) * 2 - 1, (field0.y > 0) * 2 - 1))
-        field0 = Vector((abs(field0.x), abs(field0.y))) - ndSize / 2
-        field2 = Vector((max(field0.x, 0), max(field0.y, 0)))
-        field3 = Vector((abs(field0.x), abs(field0.y)))
-        field3 = field3 * Vector((field3.x <= field3.y, field3.x > field3.y))
-        field3 = field3 * -((field2.x + field2.y) == 0)
-        field4 = (field2 + field3) * field1
-        all_nodes.append((nd, field4.length))
+        ndLocation, ndSize = NodeBox(nd)
+        all_nodes.append((nd, NodeDist(ndLocation, ndSize, callPos)))
     all_nodes.sort(key=lambda a: a[1])
     return all_nodes
 
 
+class NodeGrid:
+    """
+        节点包围盒的均匀网格索引, 用于由近到远查找节点
+        sync: 只重新计算 位置/尺寸 发生变化的节点
+        nearest: 从光标所在格子逐圈向外搜索, 按距离惰性产出 (node, dist)
+    """
+    CELL = 200
+    GRIDS: dict[int, NodeGrid] = {}
+
+    def __init__(self):
+        self.cells: dict[tuple[int, int], set[str]] = {}
+        self.boxes: dict[str, tuple] = {}  # {name: (state, location, size, cells)}
+
+    @staticmethod
+    def get(tree: bpy.types.NodeTree) -> NodeGrid:
+        grid = NodeGrid.GRIDS.setdefault(tree.as_pointer(), NodeGrid())
+        grid.sync(tree.nodes)
+        return grid
+
+    @staticmethod
+    def cell_of(x, y):
+        return floor(x / NodeGrid.CELL), floor(y / NodeGrid.CELL)
+
+    def discard(self, name):
+        _, _, _, cells = self.boxes.pop(name)
+        for cell in cells:
+            names = self.cells[cell]
+            names.discard(name)
+            if not names:
+                self.cells.pop(cell)
+
+    def add(self, name, ndLocation: Vector, ndSize: Vector, state):
+        x0, y0 = NodeGrid.cell_of(ndLocation.x - ndSize.x / 2, ndLocation.y - ndSize.y / 2)
+        x1, y1 = NodeGrid.cell_of(ndLocation.x + ndSize.x / 2, ndLocation.y + ndSize.y / 2)
+        cells = [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+        for cell in cells:
+            self.cells.setdefault(cell, set()).add(name)
+        self.boxes[name] = (state, ndLocation.copy(), ndSize.copy(), cells)
+
+    def sync(self, nodes):
+        seen = set()
+        for nd in nodes:
+            # 框架不参与查找
+            if nd.type == "FRAME":
+                continue
+            seen.add(nd.name)
+            ndLocation, ndSize = NodeBox(nd)
+            state = (*ndLocation, *ndSize)
+            if (old := self.boxes.get(nd.name)) and old[0] == state:
+                continue
+            if old:
+                self.discard(nd.name)
+            self.add(nd.name, ndLocation, ndSize, state)
+        for name in set(self.boxes) - seen:
+            self.discard(name)
+
+    def nearest(self, nodes, callPos):
+        cx, cy = NodeGrid.cell_of(callPos.x, callPos.y)
+        visited = set()
+        heap = []
+
+        def push(names):
+            for name in names:
+                if name in visited:
+                    continue
+                visited.add(name)
+                _, ndLocation, ndSize, _ = self.boxes[name]
+                heapq.heappush(heap, (NodeDist(ndLocation, ndSize, callPos), name))
+
+        r = 0
+        while len(visited) < len(self.boxes):
+            # 圈内格子数超过已占用格子数时, 直接遍历剩余格子
+            if 8 * r > len(self.cells):
+                for names in self.cells.values():
+                    push(names)
+                break
+            if r == 0:
+                ring = [(cx, cy)]
+            else:
+                ring = [(cx + dx, cy + dy) for dx in range(-r, r + 1) for dy in (-r, r)]
+                ring += [(cx + dx, cy + dy) for dx in (-r, r) for dy in range(-r + 1, r)]
+            for cell in ring:
+                push(self.cells.get(cell, ()))
+            # 未访问的节点距离至少为 r * CELL
+            while heap and heap[0][0] <= r * NodeGrid.CELL:
+                dist, name = heapq.heappop(heap)
+                if nd := nodes.get(name):
+                    yield nd, dist
+            r += 1
+        while heap:
+            dist, name = heapq.heappop(heap)
+            if nd := nodes.get(name):
+                yield nd, dist
+
+
 def SocketsFromNode(nd: bpy.types.Node, side, callPos) -> list[Socket]:
     """
         从Node获取输入输出的Socket列表
@@ -408,30 +516,16 @@ class DRAG_LINK_MT_NODE_PIE(bpy.types.Menu):
 
     @staticmethod
     def update_sb_list():
-        def find_node_by_type(sb):
-            fsocket = P.foundSocket.socket
-            if not fsocket:
-                return False
-            if fsocket.is_output:
-                for inp_name in sb.inp_types:
-                    inp = sb.inp_types[inp_name]
-                    if not inp:
-                        continue
-                    inp_type = inp[0]
-                    if isinstance(inp[0], list):
-                        inp_type = calc_hash_type(inp[0])
-                        continue
-                    if inp_type in {"ENUM", "INT", "FLOAT", "STRING", "BOOLEAN"}:
-                        continue
-                    if inp_type == fsocket.bl_idname:
-                        return True
-            else:
-                for out_type, _ in sb.out_types:
-                    if out_type == fsocket.bl_idname:
-                        return True
-            return False
-        sb_list = [sb for sb in NodeBase.__subclasses__() if find_node_by_type(sb)]
-        DRAG_LINK_MT_NODE_PIE.sb_list = sb_list
+        fsocket = P.foundSocket.socket
+        if not fsocket:
+            DRAG_LINK_MT_NODE_PIE.sb_list = []
+            return
+        candidates = SocketIndex.find(fsocket.bl_idname, fsocket.is_output)
+        # 按当前文件中的使用次数排序
+        counts = SocketIndex.COUNTS
+        names = sorted(candidates, key=lambda name: (-counts.get(name, 0), name))
+        nodes = LazyNodeRegistry.NODES
+        DRAG_LINK_MT_NODE_PIE.sb_list = [nodes[name] for name in names if name in nodes]
 
     @staticmethod
     def draw_prepare():
@@ -539,7 +633,7 @@ class Comfyui_Swapper(bpy.types.Operator):
         P.foundSocket = None
         callPos = context.space_data.cursor_location
 
-        for nd, _ in GetNearestNodes(self.tree.nodes, callPos):
+        for nd, _ in self.grid.nearest(self.tree.nodes, callPos):
             if nd.type in {"FRAME", "REROUTE"}:
                 continue
             if nd.hide:
@@ -565,6 +659,7 @@ class Comfyui_Swapper(bpy.types.Operator):
         self.keyType = GetOpKey(self.__class__.bl_idname)
         if not self.tree:
             return {'FINISHED'}
+        self.grid = NodeGrid.get(self.tree)
         Comfyui_Swapper.NextAssessment(self, context)
         context.area.tag_redraw()
         f = PreviewerDrawCallback
@@ -624,7 +719,7 @@ class Comfyui_Linker(bpy.types.Operator):
 
     def NextAssessment(self, context):
         callPos = context.space_data.cursor_location
-        for nd, _ in GetNearestNodes(self.tree.nodes, callPos):
+        for nd, _ in self.grid.nearest(self.tree.nodes, callPos):
             if nd.type in {"FRAME", "REROUTE"}:
                 continue
             if nd.hide:
@@ -668,6 +763,7 @@ class Comfyui_Linker(bpy.types.Operator):
         bpy.ops.node.select_all(action="DESELECT")
         self.from_node.select = True
         self.keyType = GetOpKey(self.__class__.bl_idname)
+        self.grid = NodeGrid.get(self.tree)
         self.NextAssessment(context)
         context.area.tag_redraw()
 
@@ -765,6 +861,8 @@ class DragLinkOps(bpy.types.Operator):
         fsocket = P.foundSocket.socket
         if not fsocket:
             return {"FINISHED"}
+        LazyNodeRegistry.ensure(self.create_type)
+        LazyNodeRegistry.record_usage([self.create_type])
         new_node: bpy.types.Node = tree.nodes.new(self.create_type)
         bpy.ops.node.select_all(action='DESELECT')
         new_node.select = True
@@ -836,5 +934,6 @@ def linker_unregister():
         for li in list_addonKeymaps:
             newKeyMapNodeEditor.keymap_items.remove(li)
         list_addonKeymaps.clear()
+        NodeGrid.GRIDS.clear()
     except BaseException:
         ...
@@ -0,0 +1,115 @@
+"""
+imgui 提示词编辑器的异步自动补全
+    绘制代码每帧 submit 当前输入并读取最近发布的结果, 从不等待搜索
+    工作线程在输入稳定 DEBOUNCE 秒后才搜索, 期间的新输入直接替换旧输入(旧输入取消)
+    每次提交或取消都递增 GEN, 搜索期间 GEN 变化的结果直接丢弃
+"""
+import time
+from collections import deque
+from threading import Thread, Condition, current_thread
+from ..kclogger import logger
+
+
+class AutoComplete:
+    DEBOUNCE = 0.03
+    COND = Condition()
+    PENDING = None  # (输入, 数量, 提交时间)
+    RESULT = ("", [])  # (输入, 结果)
+    GEN = 0
+    LATENCY = deque(maxlen=256)  # 提交到发布的耗时(ms)
+    STATS = {"submitted": 0, "searched": 0, "cancelled": 0}
+    WORKER: Thread = None
+
+    @staticmethod
+    def submit(query: str, max_size=20):
+        with AutoComplete.COND:
+            pending = AutoComplete.PENDING
+            if pending and pending[:2] == (query, max_size):
+                return
+            if not pending and AutoComplete.RESULT[0] == query:
+                return
+            if pending:
+                AutoComplete.STATS["cancelled"] += 1
+            AutoComplete.STATS["submitted"] += 1
+            AutoComplete.GEN += 1
+            AutoComplete.PENDING = (query, max_size, time.perf_counter())
+            AutoComplete.COND.notify()
+        AutoComplete._run()
+
+    @staticmethod
+    def result(query: str) -> list[tuple] | None:
+        """
+        query 的结果: 最近发布的是 query 前缀的结果时从中过滤, 否则返回 None(搜索中)
+        """
+        last, words = AutoComplete.RESULT
+        if last == query:
+            return words
+        if last and query.startswith(last):
+            return [w for w in words if query in w[1] or query in w[3]]
+        return None
+
+    @staticmethod
+    def cancel():
+        with AutoComplete.COND:
+            AutoComplete.GEN += 1
+            AutoComplete.PENDING = None
+            AutoComplete.RESULT = ("", [])
+
+    @staticmethod
+    def _run():
+        if AutoComplete.WORKER:
+            return
+        AutoComplete.WORKER = Thread(target=AutoComplete._worker, daemon=True)
+        AutoComplete.WORKER.start()
+
+    @staticmethod
+    def _worker():
+        from .trie import Trie
+        cond = AutoComplete.COND
+        # stop 后再启动的新线程会替换 WORKER, 旧线程醒来后直接退出
+        while AutoComplete.WORKER is current_thread():
+            with cond:
+                if AutoComplete.PENDING is None:
+                    cond.wait()
+                    continue
+                query, max_size, ts = AutoComplete.PENDING
+                # 去抖: 最后一次输入后等待 DEBOUNCE 秒, 期间有新输入则重新计时
+                if (remain := ts + AutoComplete.DEBOUNCE - time.perf_counter()) > 0:
+                    cond.wait(remain)
+                    continue
+                AutoComplete.PENDING = None
+                gen = AutoComplete.GEN
+            try:
+                words = Trie.TRIE.bl_search(query, max_size=max_size) if Trie.TRIE else []
+            except Exception as e:
+                logger.debug("Autocomplete search error: %s", e)
+                continue
+            with cond:
+                AutoComplete.STATS["searched"] += 1
+                # 搜索期间已有新输入或被取消, 结果作废
+                if AutoComplete.GEN != gen:
+                    AutoComplete.STATS["cancelled"] += 1
+                    continue
+                AutoComplete.RESULT = (query, words)
+                AutoComplete.LATENCY.append((time.perf_counter() - ts) * 1000)
+
+    @staticmethod
+    def stop():
+        with AutoComplete.COND:
+            AutoComplete.WORKER = None
+            AutoComplete.GEN += 1
+            AutoComplete.PENDING = None
+            AutoComplete.COND.notify_all()
+
+    @staticmethod
+    def percentiles(ps=(50, 90, 99)) -> dict[int, float]:
+        latency = sorted(AutoComplete.LATENCY)
+        if not latency:
+            return {p: 0.0 for p in ps}
+        return {p: latency[min(len(latency) - 1, len(latency) * p // 100)] for p in ps}
+
+    @staticmethod
+    def report() -> str:
+        pcts = ", ".join(f"p{p}: {v:.1f}ms" for p, v in AutoComplete.percentiles().items())
+        stats = AutoComplete.STATS
+        return f"searched {stats['searched']}/{stats['submitted']}, cancelled {stats['cancelled']}, {pcts}"
@@ -316,6 +316,8 @@ class MLTOps(bpy.types.Operator, BaseDrawCall):
         self.__class__.REG_AREA.discard(self.area)
 
     def stop_search(self):
+        from .autocomplete import AutoComplete
+        AutoComplete.cancel()
         self.candicates_words = []
         self.try_search = False
 
@@ -532,14 +534,23 @@ class MLTOps(bpy.types.Operator, BaseDrawCall):
 
     def t(self, pos, word: str):
         from .trie import Trie
+        from .autocomplete import AutoComplete
         if Trie.TRIE is None:
             return
         word = word.strip().replace("\n", "").replace(" ", "_").replace("\\(", "(").replace("\\)", ")")
         if not word:
             self.stop_search()
             return
+        # 搜索在后台线程进行, 这里只读取最近一次的结果, 不阻塞绘制
         # (83, 'girly_pred', '0', '', 'e621', {}, (173, 216, 230))
-        self.candicates_words = Trie.TRIE.bl_search(word, max_size=20)
+        Trie.set_pinyin(bpy.context.preferences.view.language in {"zh_HANS", "zh_CN"})
+        AutoComplete.submit(word, max_size=20)
+        if (words := AutoComplete.result(word)) is None:
+            # 结果还属于上一个词, 不显示也不允许补全
+            self.candicates_words = []
+            self.candicates_word = ""
+            return
+        self.candicates_words = words
         candicates_list = self.candicates_words
         self.candicates_index = max(0, min(self.candicates_index, len(candicates_list) - 1))
         index = self.candicates_index
@@ -612,6 +623,9 @@ def multiline_register():
 
 
 def multiline_unregister():
+    from .autocomplete import AutoComplete
+    logger.debug("Autocomplete: %s", AutoComplete.report())
+    AutoComplete.stop()
     GlobalImgui().handler_remove()
     bpy.utils.unregister_class(MLTOps)
     bpy.utils.unregister_class(GuiTest)
@@ -1,12 +1,17 @@
 # Refeence: https://github.com/DominikDoom/a1111-sd-webui-tagcomplete
 from __future__ import annotations
+import os
+import sys
+import json
 import time
-import pickle
+import bisect
+import struct
+import itertools
+from array import array
+from collections import Counter, OrderedDict
 from pathlib import Path
-from threading import Thread
-from functools import lru_cache
+from threading import Thread, Lock, get_ident
 DEBUG = True
-CACHE_VERSION = (0, 0, 1)
 danbooru_type = {"0": "General",
                  "1": "Artist",
                  "3": "Copyright",
@@ -57,6 +62,46 @@ COLOR_MAP = {
 }
 
 
+def edit_distance(a: str, b: str, max_dist: int) -> int:
+    """
+    限定距离的编辑距离(相邻字符交换算 1 次), 超过 max_dist 时提前返回 max_dist + 1
+    """
+    if abs(len(a) - len(b)) > max_dist:
+        return max_dist + 1
+    # 公共前后缀不影响距离
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a, b = a[start:len(a) - end], b[start:len(b) - end]
+    if not a or not b:
+        return min(len(a) + len(b), max_dist + 1)
+    # 只计算 |i - j| <= max_dist 的带状区域, 带外视为超限
+    over = max_dist + 1
+    prev2 = None
+    prev = [j if j <= max_dist else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        ca = a[i - 1]
+        cur = [over] * (len(b) + 1)
+        if i <= max_dist:
+            cur[0] = i
+        for j in range(max(1, i - max_dist), min(len(b), i + max_dist) + 1):
+            cb = b[j - 1]
+            d = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if prev2 and i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                d = min(d, prev2[j - 2] + 1)
+            cur[j] = d
+        if min(cur) > max_dist:
+            return over
+        prev2, prev = prev, cur
+    return min(prev[-1], over)
+
+
+TRANSLATION_PATH = Path(__file__).parent / "translation.csv"
+
+
 class Utils:
     def is_word(self):
         return "id" in self
@@ -73,30 +118,399 @@ class Utils:
         return *self, Utils.eval_color(self)
 
 
+class TagIndex:
+    """
+    只读的标签索引文件, mmap 映射后直接查询, 不做反序列化(多个 Blender 实例共享同一份页缓存)
+        头部: MAGIC | 版本 | 词条数 | meta长度 | meta(json: wtypes, 源文件签名)
+        列存: key偏移[n+1] content偏移[n+1] freq[n] 按freq降序的下标[n] link[n] (uint32) | type[n] (int8) | wtype[n] lang[n] (uint8)
+        三元组倒排: 三元组编码[m] 倒排偏移[m+1] 倒排表[p] (uint32), 倒排表存的是 freq 排名, 升序即热度降序
+        字符串区: key 按 utf-8 字节序排列, 各串以 \\n 分隔; content 按词条顺序排列
+    词条语言: 英文标签/别名, 中文译名, 拼音首字母; 后两者的 content 为原标签, 拼音词条的 link 指向对应的译名词条
+    """
+    MAGIC = b"SDNTAGS\0"
+    VERSION = 4
+    LANG_EN = 0
+    LANG_ZH = 1
+    LANG_PINYIN = 2
+    HEADER = struct.Struct("<8sIII")
+    SEP = b"\n"
+
+    def __init__(self, path: Path, mm, count: int, meta: dict, base: int) -> None:
+        self.path = path
+        self.mm = mm
+        self.count = count
+        self.meta = meta
+        self.wtypes: list[str] = meta["wtypes"]
+        view = self.view = memoryview(mm)
+        n = count
+        pos = base
+
+        def column(fmt, size, length):
+            nonlocal pos
+            col = view[pos:pos + size * length].cast(fmt)
+            pos += size * length
+            return col
+        self.key_offs = column("I", 4, n + 1)
+        self.content_offs = column("I", 4, n + 1)
+        self.freqs = column("I", 4, n)
+        self.by_freq = column("I", 4, n)
+        self.links = column("I", 4, n)
+        self.gram_codes = column("I", 4, meta["grams"])
+        self.gram_offs = column("I", 4, meta["grams"] + 1)
+        self.postings = column("I", 4, meta["postings"])
+        self.types = column("b", 1, n)
+        self.wtype_ids = column("B", 1, n)
+        self.langs = column("B", 1, n)
+        self.keys_base = pos
+        self.contents_base = pos + self.key_offs[n]
+
+    @staticmethod
+    def source_sign(files: list[Path]) -> list:
+        return [[f.name, f.stat().st_size, int(f.stat().st_mtime)] for f in files]
+
+    @staticmethod
+    def versioned_path(path: Path, files: list[Path]) -> Path:
+        """
+        带源文件签名的备用文件名, 原文件无法替换时使用
+        """
+        from hashlib import md5
+        sign = md5(json.dumps(TagIndex.source_sign(files)).encode()).hexdigest()[:8]
+        return path.with_name(f"{path.stem}.{sign}{path.suffix}")
+
+    @staticmethod
+    def valid_size(mm, count: int, meta: dict, base: int) -> bool:
+        # 列存和字符串区都必须完整
+        blobs = base + 4 * (5 * count + 2 + 2 * meta["grams"] + 1 + meta["postings"]) + 3 * count
+        if blobs > len(mm):
+            return False
+        keys_len = struct.unpack_from("=I", mm, base + 4 * count)[0]
+        contents_len = struct.unpack_from("=I", mm, base + 4 * (2 * count + 1))[0]
+        return blobs + keys_len + contents_len <= len(mm)
+
+    @staticmethod
+    def open(path: Path, files: list[Path] = None) -> TagIndex | None:
+        """
+        打开索引文件, 版本或源文件签名不符时返回 None
+        """
+        import mmap
+        if not path.exists():
+            return None
+        with open(path, "rb") as f:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                return None
+        try:
+            magic, version, count, meta_len = TagIndex.HEADER.unpack_from(mm, 0)
+            valid = magic == TagIndex.MAGIC and version == TagIndex.VERSION
+            if valid:
+                base = TagIndex.HEADER.size + meta_len
+                meta = json.loads(mm[TagIndex.HEADER.size:base])
+                valid = meta.get("byteorder") == sys.byteorder and TagIndex.valid_size(mm, count, meta, base)
+            if valid and files is not None:
+                valid = meta.get("sources") == TagIndex.source_sign(files)
+        except (struct.error, ValueError, KeyError, TypeError):
+            # 文件被截断或损坏
+            valid = False
+        if not valid:
+            mm.close()
+            return None
+        return TagIndex(path, mm, count, meta, base)
+
+    @staticmethod
+    def build(path: Path, words: list[tuple], files: list[Path]) -> Path:
+        """
+        words: [(freq, key, type, content, wtype[, lang, 译名])], 英文 key 重复时保留先出现的词条
+            译名和拼音词条按 (key, content) 去重, 同一个译名可以对应多个标签
+        返回实际写入的文件(path 无法替换时为 versioned_path)
+        """
+        unique = {}
+        for word in words:
+            lang = word[5] if len(word) > 5 else TagIndex.LANG_EN
+            content = word[3] if lang != TagIndex.LANG_EN else ""
+            unique.setdefault((word[1].encode("utf-8"), content, lang), word)
+        dkeys = sorted(unique)
+        keys = [dkey[0] for dkey in dkeys]
+        index_of = {dkey: i for i, dkey in enumerate(dkeys)}
+        wtypes = sorted({word[4] for word in unique.values()})
+        wtype_map = {w: i for i, w in enumerate(wtypes)}
+        key_offs, content_offs = array("I", [0]), array("I", [0])
+        freqs, links, types, wtype_ids, langs = array("I"), array("I"), array("b"), array("B"), array("B")
+        key_blob, content_blob = bytearray(), bytearray()
+        contents = []
+        for i, dkey in enumerate(dkeys):
+            key, _, lang = dkey
+            word = unique[dkey]
+            freq, _, cat, content, wtype = word[:5]
+            link = i
+            if lang == TagIndex.LANG_PINYIN:
+                link = index_of.get((word[6].encode("utf-8"), content, TagIndex.LANG_ZH), i)
+            links.append(link)
+            langs.append(lang)
+            key_blob += key + TagIndex.SEP
+            key_offs.append(len(key_blob))
+            contents.append(content := content.encode("utf-8"))
+            content_blob += content + TagIndex.SEP
+            content_offs.append(len(content_blob))
+            freqs.append(min(max(int(freq), 0), 0xFFFFFFFF))
+            types.append(int(cat))
+            wtype_ids.append(wtype_map[wtype])
+        # 同 freq 时 key 大的在前, 与 word 元组降序一致
+        by_freq = array("I", sorted(range(len(keys)), key=lambda i: (freqs[i], i), reverse=True))
+        # 按排名遍历, 每个倒排表自然有序
+        grams: dict[bytes, array] = {}
+        for rank, i in enumerate(by_freq):
+            # 译名/拼音词条的 content 是英文原标签, 不参与子串匹配
+            grams_i = TagIndex.grams(keys[i]) if langs[i] else TagIndex.grams(keys[i]) | TagIndex.grams(contents[i])
+            for gram in grams_i:
+                if (plist := grams.get(gram)) is None:
+                    plist = grams[gram] = array("I")
+                plist.append(rank)
+        gram_codes, gram_offs, postings = array("I"), array("I", [0]), array("I")
+        for gram in sorted(grams):
+            gram_codes.append(int.from_bytes(gram, "big"))
+            postings.extend(grams[gram])
+            gram_offs.append(len(postings))
+        meta = {"wtypes": wtypes,
+                "grams": len(gram_codes),
+                "postings": len(postings),
+                "byteorder": sys.byteorder,
+                "sources": TagIndex.source_sign(files)}
+        meta = json.dumps(meta).encode()
+        tmp = path.with_suffix(f".tmp{os.getpid()}_{get_ident()}")
+        with open(tmp, "wb") as f:
+            f.write(TagIndex.HEADER.pack(TagIndex.MAGIC, TagIndex.VERSION, len(keys), len(meta)))
+            f.write(meta)
+            for col in (key_offs, content_offs, freqs, by_freq, links, gram_codes, gram_offs, postings, types, wtype_ids, langs):
+                f.write(col.tobytes())
+            f.write(key_blob)
+            f.write(content_blob)
+        # 原子替换, POSIX 上其他实例已映射的旧文件不受影响
+        try:
+            os.replace(tmp, path)
+        except PermissionError:
+            # Windows 上旧文件仍被其他实例映射时无法替换, 写到带源文件签名的文件名
+            alt = TagIndex.versioned_path(path, files)
+            try:
+                os.replace(tmp, alt)
+            except PermissionError:
+                # 其他实例已用同样的源文件生成并映射了该文件, 内容相同
+                os.remove(tmp)
+            return alt
+        for old in path.parent.glob(f"{path.stem}.*{path.suffix}"):
+            try:
+                old.unlink()
+            except OSError:
+                ...
+        return path
+
+    def close(self):
+        for col in (self.key_offs, self.content_offs, self.freqs, self.by_freq, self.links,
+                    self.gram_codes, self.gram_offs, self.postings, self.types, self.wtype_ids, self.langs):
+            col.release()
+        self.view.release()
+        self.mm.close()
+
+    def __len__(self):
+        return self.count
+
+    def key_bytes(self, i: int) -> bytes:
+        return self.mm[self.keys_base + self.key_offs[i]:self.keys_base + self.key_offs[i + 1] - 1]
+
+    def key_len(self, i: int) -> int:
+        return self.key_offs[i + 1] - self.key_offs[i] - 1
+
+    def key(self, i: int) -> str:
+        return self.key_bytes(i).decode("utf-8")
+
+    def content_bytes(self, i: int) -> bytes:
+        return self.mm[self.contents_base + self.content_offs[i]:self.contents_base + self.content_offs[i + 1] - 1]
+
+    def content(self, i: int) -> str:
+        return self.content_bytes(i).decode("utf-8")
+
+    def word(self, i: int) -> tuple:
+        # freq, key, type, content, wtype (拼音词条以译名显示)
+        return self.freqs[i], self.key(self.links[i]), str(self.types[i]), self.content(i), self.wtypes[self.wtype_ids[i]]
+
+    def matches(self, i: int, sub: bytes) -> bool:
+        if sub in self.key_bytes(i):
+            return True
+        return self.langs[i] == TagIndex.LANG_EN and sub in self.content_bytes(i)
+
+    def find(self, key: str) -> int:
+        k = key.encode("utf-8")
+        i = self.lower_bound(k)
+        return i if i < self.count and self.key_bytes(i) == k else -1
+
+    def lower_bound(self, k: bytes, lo=0, hi=None) -> int:
+        if hi is None:
+            hi = self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key_bytes(mid) < k:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def prefix_range(self, prefix: str) -> range:
+        k = prefix.encode("utf-8")
+        # utf-8 中不会出现 0xFF, 作为前缀区间的上界
+        return range(self.lower_bound(k), self.lower_bound(k + b"\xff"))
+
+    @staticmethod
+    def grams(text: bytes) -> set[bytes]:
+        return {text[j:j + 3] for j in range(len(text) - 2)}
+
+    def gram_postings(self, gram: bytes):
+        code = int.from_bytes(gram, "big")
+        j = bisect.bisect_left(self.gram_codes, code)
+        if j == len(self.gram_codes) or self.gram_codes[j] != code:
+            return None
+        return self.postings[self.gram_offs[j]:self.gram_offs[j + 1]]
+
+    def iter_substr(self, substr: str):
+        """
+        子串搜索(子串至少 3 字节): 倒排表求交集, 按热度降序逐个产出命中的词条下标
+        """
+        sub = substr.encode("utf-8")
+        lists = []
+        for gram in TagIndex.grams(sub):
+            if (plist := self.gram_postings(gram)) is None:
+                return
+            lists.append(plist)
+        lists.sort(key=len)
+        head, rest = lists[0], lists[1:]
+        los = [0] * len(rest)
+        for rank in head:
+            for k, plist in enumerate(rest):
+                # 排名单调递增, 每个表只需向后查找
+                los[k] = lo = bisect.bisect_left(plist, rank, los[k])
+                if lo == len(plist):
+                    return
+                if plist[lo] != rank:
+                    break
+            else:
+                i = self.by_freq[rank]
+                # 三元组全部命中不代表子串命中, 需要校验
+                if self.matches(i, sub):
+                    yield i
+
+    def find_blob(self, substr: str, contents=False) -> set[int]:
+        """
+        在字符串区中查找子串, 返回命中的词条下标(子串不含分隔符, 不会跨词条命中)
+        """
+        sub = substr.encode("utf-8")
+        if not sub or TagIndex.SEP in sub:
+            return set()
+        offs = self.content_offs if contents else self.key_offs
+        base = self.contents_base if contents else self.keys_base
+        end = base + offs[self.count]
+        found = set()
+        pos = self.mm.find(sub, base, end)
+        while pos != -1:
+            i = bisect.bisect_right(offs, pos - base) - 1
+            found.add(i)
+            # 跳到下一个词条
+            pos = self.mm.find(sub, base + offs[i + 1], end)
+        return found
+
+
+class SearchCache:
+    """
+    自动补全结果缓存: 按估算的内存占用做 LRU 淘汰, 统计命中率
+    """
+    INFO_EST_BYTES = 256  # 单条结果元组(含字符串)的估算大小
+
+    def __init__(self, budget=16 * 1024 * 1024) -> None:
+        self.budget = budget
+        self.entries: OrderedDict = OrderedDict()  # {key: (nbytes, value)}
+        self.used = 0
+        self.lock = Lock()
+        self.stats = {"hits": 0, "misses": 0, "narrowed": 0, "evicted": 0}
+
+    def get(self, key):
+        with self.lock:
+            if (entry := self.entries.get(key)) is None:
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def peek(self, key):
+        """
+        不计入命中统计, 也不调整 LRU 顺序
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+        return entry and entry[1]
+
+    def put(self, key, value, nbytes: int):
+        with self.lock:
+            if (old := self.entries.pop(key, None)) is not None:
+                self.used -= old[0]
+            self.entries[key] = (nbytes, value)
+            self.used += nbytes
+            while self.used > self.budget and len(self.entries) > 1:
+                _, (size, _) = self.entries.popitem(last=False)
+                self.used -= size
+                self.stats["evicted"] += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.used = 0
+
+    def hit_rate(self) -> float:
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0
+
+    def report(self) -> str:
+        return (f"{len(self.entries)} entries, {self.used / 1024:.1f}KB, "
+                f"hit rate {self.hit_rate():.1%}, narrowed {self.stats['narrowed']}, evicted {self.stats['evicted']}")
+
+
 class Trie:
+    """
+    标签自动补全, 数据来自 mmap 的 TagIndex
+    """
     TRIE: Trie = None
-    SEARCH_CACHE = {}
+    PINYIN = False  # 拼音首字母词条只在中文界面下参与搜索
+    CACHE = SearchCache()
+    CANDIDATE_LIMIT = 2000  # 候选不超过该数量时缓存完整列表, 供更长的输入直接过滤
     FLAGS = set()
-    CACHE_PATH = Path(__file__).parent / "trie.cache"
+    FUZZY_SCAN = 2000
+    TYPO_BUDGET = 0.005  # 每次纠错查询的时间预算(秒)
+    TYPO_ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789_-()'"
+    INDEX_PATH = Path(__file__).parent / "tags.idx"
+    LEGACY_CACHE_PATH = Path(__file__).parent / "trie.cache"
+
+    def __init__(self, index: TagIndex = None):
+        self.index = index
+
+    @staticmethod
+    def set_pinyin(enabled: bool):
+        if Trie.PINYIN == enabled:
+            return
+        Trie.PINYIN = enabled
+        Trie.CACHE.clear()
 
-    def __init__(self):
-        self.root: dict = {}
-        self.word_list: list[tuple] = []
+    def visible(self, query: str):
+        """
+            词条可见性: 译名只响应含中文的输入, 拼音首字母只在中文界面下响应英文输入
+        """
+        langs = self.index.langs
+        if not query.isascii():
+            return lambda i: langs[i] != TagIndex.LANG_PINYIN
+        if Trie.PINYIN:
+            return lambda i: langs[i] != TagIndex.LANG_ZH
+        return lambda i: langs[i] == TagIndex.LANG_EN
 
-    def insert(self, word: tuple) -> None:
-        # print(word)
-        key = word[1]
-        if self.search(key):
-            return
-        # [freq, key, type, content, wtype]
-        assert isinstance(word, tuple), str(word)
-        node: dict = self.root
-        for char in key:
-            if char not in node:
-                node[char] = {}
-            node = node[char]
-        node["id"] = len(self.word_list)
-        self.word_list.append(word)
+    @property
+    def word_list(self) -> list[tuple]:
+        return [self.index.word(i) for i in range(len(self.index))]
 
     def info_from_words(self, words: list[dict], max_size=100, sort=False, test=False):
         if test and sort:
@@ -107,118 +521,297 @@ class Trie:
             words = sorted(words, key=lambda x: x[0], reverse=True)[:max_size]
         info = [Utils.eval_info(word) for word in words]
         return info
-        info = [Utils.eval_info(word) for word in words]
-        if sort:
-            info.sort(reverse=True)
-        return info[:max_size]
 
     def search(self, word) -> bool:
         """
             单个搜索: 搜索word是否存在
         """
-        node = self.root
-        for char in word:
-            node = node.get(char)
-            if not node:
-                return False
-        return Utils.is_word(node)
+        return self.index.find(word) != -1
 
     def starts_with(self, prefix) -> bool:
         """
             前缀判断: 判断前缀是否存在
         """
-        node = self.root
-        for char in prefix:
-            node = node.get(char)
-            if not node:
-                return False
-        return True
+        return len(self.index.prefix_range(prefix)) > 0
 
-    def search_all(self, prefix, pre_node: dict = None, words: list = None, ) -> list[tuple]:
+    def search_all(self, prefix) -> list[tuple]:
         """
             模糊搜索: 前缀符合的所有words
         """
-        if words is None:
-            words = []
-        if not pre_node:
-            pre_node = self.root
-            for char in prefix:
-                pre_node = pre_node.get(char)
-        if Utils.is_word(pre_node):
-            words.append(self.word_list[pre_node["id"]])
-        for c, node in pre_node.items():
-            if len(c) != 1:
-                continue
-            self.search_all(prefix + c, node, words, )
-        return words
+        return [self.index.word(i) for i in self.index.prefix_range(prefix)]
 
     def prefix_search(self, prefix) -> list[dict]:
         """
             前缀搜索: 如果前缀存在则搜索所有符合前缀的words
         """
-        if not self.starts_with(prefix):
-            return []
-        words = self.search_all(prefix)
-        return words
+        return self.search_all(prefix)
 
-    @lru_cache
-    def fuzzy_search(self, substr, max_size=100) -> list[dict]:
-        words = [word for word in self.word_list if not (word[1].startswith(substr) or word[3].startswith(substr)) and (substr in word[1] or substr in word[3])]
+    def prefix_top(self, prefix, max_size=100) -> list[tuple]:
+        """
+            前缀搜索 top-k: 只在 freq 列上排序, 仅解码入选的词条
+        """
+        import heapq
+        freqs = self.index.freqs
+        # 同 freq 时与热度排名一致(key 大的在前)
+        ids = filter(self.visible(prefix), self.index.prefix_range(prefix))
+        ids = heapq.nlargest(max_size, ids, key=lambda i: (freqs[i], i))
+        return [self.index.word(i) for i in ids]
+
+    def substr_ids(self, substr):
+        """
+            子串搜索: 按热度降序逐个产出 key 或 content 包含 substr 的词条下标
+        """
+        index = self.index
+        visible = self.visible(substr)
+        if len(substr.encode("utf-8")) >= 3:
+            yield from filter(visible, index.iter_substr(substr))
+            return
+        # 一两个字符没有三元组可用: 常见子串按热度扫描前 FUZZY_SCAN 个即可, 剩余的在字符串区查找
+        sub = substr.encode("utf-8")
+        for i in itertools.islice(index.by_freq, Trie.FUZZY_SCAN):
+            if visible(i) and index.matches(i, sub):
+                yield i
+        contents = {i for i in index.find_blob(substr, contents=True) if index.langs[i] == TagIndex.LANG_EN}
+        found = sorted(index.find_blob(substr) | contents, key=lambda i: (index.freqs[i], i), reverse=True)
+        skip = set(itertools.islice(index.by_freq, Trie.FUZZY_SCAN))
+        yield from (i for i in found if i not in skip and visible(i))
+
+    def substr_search(self, substr):
+        """
+            子串搜索: 按热度降序逐个产出 key 或 content 包含 substr 的 words
+        """
+        return map(self.index.word, self.substr_ids(substr))
 
-        info = [Utils.eval_info(word) for word in sorted(words, reverse=True)[:20]]
+    def fuzzy_search(self, substr, max_size=100) -> list[dict]:
+        index = self.index
+        sub = substr.encode("utf-8")
+        ids = (i for i in self.substr_ids(substr) if not (index.key_bytes(i).startswith(sub) or index.content_bytes(i).startswith(sub)))
+        info = [Utils.eval_info(index.word(i)) for i in itertools.islice(ids, 20)]
         return info
 
-    @lru_cache
+    def candidates(self, query: str) -> tuple[bool, array]:
+        """
+            key 或 content 包含 query 的词条下标(热度降序)及是否完整
+            输入逐字符变长时, 从缓存中最长的完整前缀结果里过滤, 不再从头搜索
+        """
+        sub = query.encode("utf-8")
+        if len(sub) < 3:
+            # 一两个字符的匹配通常极多, 不收集完整列表
+            return False, array("I")
+        cache = Trie.CACHE
+        if (hit := cache.get(("ids", query))) is not None:
+            return hit
+        index = self.index
+        for k in range(len(query) - 1, 2, -1):
+            # 可见的词条随输入是否含中文变化, 只能从同类输入的结果里过滤
+            if query[:k].isascii() != query.isascii():
+                continue
+            base = cache.peek(("ids", query[:k]))
+            if base and base[0]:
+                ids = array("I", (i for i in base[1] if index.matches(i, sub)))
+                cache.stats["narrowed"] += 1
+                break
+        else:
+            ids = array("I", itertools.islice(self.substr_ids(query), Trie.CANDIDATE_LIMIT + 1))
+        complete = len(ids) <= Trie.CANDIDATE_LIMIT
+        if not complete:
+            ids = array("I")
+        cache.put(("ids", query), (complete, ids), ids.itemsize * len(ids) + 64)
+        return complete, ids
+
+    @staticmethod
+    def edits1(word: str) -> tuple[set[str], set[str]]:
+        """
+            1 次编辑的结果: (删除和交换, 替换和插入), 前者数量少且是最常见的笔误, 先查找
+        """
+        splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+        deletes = {a + b[1:] for a, b in splits if b}
+        transposes = {a + b[1] + b[0] + b[2:] for a, b in splits if len(b) > 1}
+        replaces = {a + c + b[1:] for a, b in splits if b for c in Trie.TYPO_ALPHABET}
+        inserts = {a + c + b for a, b in splits for c in Trie.TYPO_ALPHABET}
+        return deletes | transposes, (replaces | inserts) - deletes - transposes
+
+    def typo_candidates(self, word: str, max_dist: int, deadline: float):
+        """
+            纠错候选: 短词直接查找所有 1 次编辑的结果, 长词按共享三元组数量过滤(q-gram 引理)
+        """
+        index = self.index
+        visible = self.visible(word)
+        sub = word.encode("utf-8")
+        grams = TagIndex.grams(sub)
+        # 增删改最多破坏 3 个三元组, 相邻交换最多破坏 4 个
+        threshold = len(grams) - 4 * max_dist
+        if threshold < 1:
+            # 按前两个字节分组查找, 大部分编辑结果的前缀区间为空, 直接跳过
+            heads = {}
+            near, far = Trie.edits1(word)
+            for cand in itertools.chain(sorted(near), sorted(far)):
+                if time.perf_counter() > deadline:
+                    return
+                cand = cand.encode("utf-8")
+                if (bound := heads.get(head := cand[:2])) is None:
+                    lo = index.lower_bound(head)
+                    bound = heads[head] = (lo, index.lower_bound(head + b"\xff", lo))
+                lo, hi = bound
+                if lo == hi:
+                    continue
+                i = index.lower_bound(cand, lo, hi)
+                if i < hi and index.key_bytes(i) == cand and visible(i):
+                    yield i
+            return
+        counts = Counter()
+        for gram in grams:
+            counts.update(index.gram_postings(gram) or ())
+        # 共享三元组多的先查找, 同组内排名升序即热度降序, 超时截断时丢掉的是差异大且冷门的词条
+        buckets = [[] for _ in range(len(grams) + 1)]
+        for rank, count in counts.items():
+            if count >= threshold:
+                buckets[count].append(rank)
+        for bucket in reversed(buckets):
+            for rank in sorted(bucket):
+                if time.perf_counter() > deadline:
+                    return
+                i = index.by_freq[rank]
+                if abs(index.key_len(i) - len(sub)) <= max_dist and visible(i):
+                    yield i
+
+    def typo_search(self, word: str, max_size=10, budget: float = None) -> tuple[bool, list[tuple]]:
+        """
+            纠错搜索: 返回是否完整及编辑距离在限定内的 words, 按距离升序、热度降序, 超出时间预算时返回已找到的结果
+        """
+        if not word.isascii():
+            # 纠错只针对英文标签
+            return True, []
+        deadline = time.perf_counter() + (budget or Trie.TYPO_BUDGET)
+        max_dist = 1 if len(word) <= 10 else 2
+        found = []
+        for i in self.typo_candidates(word, max_dist, deadline):
+            dist = edit_distance(word, key := self.index.key(i), max_dist)
+            if dist <= max_dist:
+                # 同距离同热度时原词排在别名前
+                is_alias = self.index.content_offs[i + 1] - self.index.content_offs[i] > 1
+                found.append((dist, -self.index.freqs[i], is_alias, key, i))
+        # 候选生成只在超时时提前结束
+        complete = time.perf_counter() <= deadline
+        found.sort()
+        return complete, [Utils.eval_info(self.index.word(i)) for *_, i in found[:max_size]]
+
     def bl_search1(self, prefix, max_size=100):
-        words = Trie.TRIE.prefix_search(prefix)
-        info2 = Trie.TRIE.info_from_words(words, max_size, sort=True, test=True)
-        return info2[:max_size]
+        words = self.prefix_top(prefix, max_size)
+        return self.info_from_words(words, max_size)
 
     @timeit
     def bl_search(self, prefix, max_size=100):
-        if prefix in Trie.SEARCH_CACHE:
-            return Trie.SEARCH_CACHE[prefix]
-        w1 = self.bl_search1(prefix, max_size)
-        w2 = self.fuzzy_search(prefix, max_size)
+        key = ("bl", prefix, max_size)
+        if (hit := Trie.CACHE.get(key)) is not None:
+            return hit
+        complete, ids = self.candidates(prefix)
+        if complete:
+            # 候选已按热度排好, 直接拆分为前缀匹配和子串匹配
+            index = self.index
+            sub = prefix.encode("utf-8")
+            head = [i for i in ids if index.key_bytes(i).startswith(sub)][:max_size]
+            rest = (i for i in ids if not (index.key_bytes(i).startswith(sub) or index.content_bytes(i).startswith(sub)))
+            w1 = [Utils.eval_info(index.word(i)) for i in head]
+            w2 = [Utils.eval_info(index.word(i)) for i in itertools.islice(rest, 20)]
+        else:
+            w1 = self.bl_search1(prefix, max_size)
+            w2 = self.fuzzy_search(prefix, max_size)
+        if not w1 and not w2:
+            # 没有任何匹配时多半是拼写错误, 给出纠错建议, 超时截断的结果不缓存
+            complete, w1 = self.typo_search(prefix, max_size)
+            if not complete:
+                return w1
         if w2:
             w1.extend(w2)
             w1.sort(reverse=True)
-            Trie.SEARCH_CACHE[prefix] = w1
+        Trie.CACHE.put(key, w1, len(w1) * SearchCache.INFO_EST_BYTES + 64)
         return w1
 
     @timeit
-    def from_cache(self):
-        if not self.CACHE_PATH.exists():
-            return
-        # ts = time.time()
-        data: dict = pickle.load(open(self.CACHE_PATH.as_posix(), "rb+"))
-        if data.get("version") != CACHE_VERSION:
-            self.CACHE_PATH.unlink()
-            return
-        # print(time.time()- ts)
-        self.root = data.pop("root", None)
-        self.word_list = data.pop("word_list", None)
+    def load(self, files: list[Path]):
+        """
+        映射索引文件, 不存在或过期时返回 None
+        """
+        sources = index_sources(files)
+        self.index = TagIndex.open(self.INDEX_PATH, sources) or TagIndex.open(TagIndex.versioned_path(self.INDEX_PATH, sources), sources)
         return self.is_loaded()
 
     @timeit
-    def to_cache(self):
-        """快速序列化 root 和 word_list到缓存文件"""
-        data = {"root": self.root, "word_list": self.word_list, "version": CACHE_VERSION}
-        # ts = time.time()
-        pickle.dump(data, open(self.CACHE_PATH.as_posix(), "wb+"))
-        # print(time.time()- ts)
+    def build(self, files: list[Path]):
+        words = read_words(files)
+        words += read_translated_words(words)
+        TagIndex.build(self.INDEX_PATH, words, index_sources(files))
+        if self.LEGACY_CACHE_PATH.exists():
+            self.LEGACY_CACHE_PATH.unlink()
 
     def is_loaded(self):
-        return self.root and self.word_list
+        return self.index is not None and len(self.index) > 0
 
-def insert_internal(trie: Trie):
-    words = []
-    for file in Path(__file__).parent.joinpath("tags").iterdir():
-        if file.is_dir():
+
+def tag_files() -> list[Path]:
+    tag_dir = Path(__file__).parent.joinpath("tags")
+    return sorted(f for f in tag_dir.iterdir() if f.is_file() and f.suffix.lower() == ".csv")
+
+
+def index_sources(files: list[Path]) -> list[Path]:
+    # 译名变化时同样需要重建索引
+    return [*files, TRANSLATION_PATH] if TRANSLATION_PATH.exists() else files
+
+
+# GB2312 一级汉字按拼音排序, 各声母首字的区位码
+PINYIN_CODES = [45217, 45253, 45761, 46318, 46826, 47010, 47297, 47614, 48119, 49062, 49324, 49896,
+                50371, 50614, 50622, 50906, 51387, 51446, 52218, 52698, 52980, 53689, 54481]
+PINYIN_LETTERS = "abcdefghjklmnopqrstwxyz"
+PINYIN_END = 55290
+
+
+def pinyin_initials(text: str) -> str:
+    """
+    拼音首字母, 二级汉字按部首排序无法得到拼音, 直接跳过
+    """
+    letters = []
+    for c in text:
+        if c.isascii():
+            if c.isalnum():
+                letters.append(c.lower())
+            continue
+        try:
+            b = c.encode("gb2312")
+        except UnicodeEncodeError:
             continue
-        if file.suffix.lower() != ".csv":
+        code = b[0] << 8 | b[1]
+        if PINYIN_CODES[0] <= code < PINYIN_END:
+            letters.append(PINYIN_LETTERS[bisect.bisect_right(PINYIN_CODES, code) - 1])
+    return "".join(letters)
+
+
+def read_translated_words(words: list[tuple]) -> list[tuple]:
+    """
+    原标签的中文译名和拼音首字母词条, content 指向原标签, 沿用原标签的热度
+    """
+    if not TRANSLATION_PATH.exists():
+        return []
+    import csv
+    with open(TRANSLATION_PATH, "rt", encoding="utf-8") as f:
+        translation = {row[0]: row[1].strip() for row in csv.reader(f) if len(row) > 1}
+    res = []
+    for freq, key, cat, content, wtype in words:
+        # 别名没有译名
+        # 纯英文的译名与原标签重复
+        if content or not (name := translation.get(key)) or name.isascii():
             continue
-        with open(file, "rt") as f:
+        res.append((freq, name, cat, key, wtype, TagIndex.LANG_ZH))
+        if (initials := pinyin_initials(name)):
+            res.append((freq, initials, cat, key, wtype, TagIndex.LANG_PINYIN, name))
+    return res
+
+
+def read_words(files: list[Path]) -> list[tuple]:
+    words = []
+    for file in files:
+        wtype = file.stem
+        with open(file, "rt", encoding="utf-8") as f:
             import csv
             data = csv.reader(f)
             for row in data:
@@ -226,7 +819,7 @@ def insert_internal(trie: Trie):
                 # 1girl, 0,    4114588, "1girls,sole_female"
                 content = row[3]
                 row[3] = ""
-                row.append(Path(file).stem)
+                row.append(wtype)
                 # 变更为 freq, key, type, content, wtype
                 row = (int(row[2]), row[0], row[1], *row[3:])
                 words.append(row)
@@ -254,8 +847,6 @@ def insert_internal(trie: Trie):
                         continue
                     rrow = (row[0], split_word, row[2], row[1], row[4])
                     words.append(rrow)
-    for w in words:
-        trie.insert(w)
     # extra1
     extra_word = ["masterpiece",
                   "best_quality",
@@ -264,51 +855,18 @@ def insert_internal(trie: Trie):
                   "low_quality",
                   "worst_quality",]
     for word in extra_word:
-        trie.insert((5000, word, 0, "", "default"))
-    return
-    # extra2
-    extra_word = [
-        {
-            "name": "Basic-NegativePrompt",
-            "terms": "Basic,Negative,Low,Quality",
-            "content": "(worst quality, low quality, normal quality)",
-            "color": 3
-        },
-        {
-            "name": "Basic-HighQuality",
-            "terms": "Basic,Best,High,Quality",
-            "content": "(masterpiece, best quality, high quality, highres, ultra-detailed)",
-            "color": 1
-        },
-        {
-            "name": "Basic-Start",
-            "terms": "Basic, Start, Simple, Demo",
-            "content": "(masterpiece, best quality, high quality, highres), 1girl, extremely beautiful detailed face, short curly hair, light smile, flower dress, outdoors, leaf, tree, best shadow",
-            "color": 5
-        },
-        {
-            "name": "Fancy-FireMagic",
-            "terms": "Fire, Magic, Fancy",
-            "content": "(extremely detailed CG unity 8k wallpaper), (masterpiece), (best quality), (ultra-detailed), (best illustration),(best shadow), (an extremely delicate and beautiful), dynamic angle, floating, fine detail, (bloom), (shine), glinting stars, classic, (painting), (sketch),\n\na girl, solo, bare shoulders, flat_chest, diamond and glaring eyes, beautiful detailed cold face, very long blue and sliver hair, floating black feathers, wavy hair, extremely delicate and beautiful girls, beautiful detailed eyes, glowing eyes,\n\npalace, the best building, ((Fire butterflies, Flying sparks, Flames))",
-            "color": 5
-        },
-        {
-            "name": "Fancy-WaterMagic",
-            "terms": "Water, Magic, Fancy",
-            "content": "(extremely detailed CG unity 8k wallpaper), (masterpiece), (best quality), (ultra-detailed), (best illustration),(best shadow), (an extremely delicate and beautiful), classic, dynamic angle, floating, fine detail, Depth of field, classic, (painting), (sketch), (bloom), (shine), glinting stars,\n\na girl, solo, bare shoulders, flat chest, diamond and glaring eyes, beautiful detailed cold face, very long blue and sliver hair, floating black feathers, wavy hair, extremely delicate and beautiful girls, beautiful detailed eyes, glowing eyes,\n\nriver, (forest),palace, (fairyland,feather,flowers, nature),(sunlight),Hazy fog, mist",
-            "color": 5
-        }
-    ]
-    for word in extra_word:
-        trie.insert((5000, word["content"], 0, word["name"], "default"))
+        words.append((5000, word, 0, "", "default"))
+    return words
+
 
 @timeit
 def csv_to_trie() -> Trie:
+    files = tag_files()
     trie = Trie()
-    if trie.from_cache():
+    if trie.load(files):
         return trie
-    insert_internal(trie)
-    trie.to_cache()
+    trie.build(files)
+    trie.load(files)
     return trie
 
 
@@ -316,6 +874,7 @@ def csv_to_trie() -> Trie:
 def init_trie(debug=False):
     trie = csv_to_trie()
     Trie.TRIE = trie
+    Trie.CACHE.clear()
     global DEBUG
     DEBUG = debug
 
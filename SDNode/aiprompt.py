@@ -163,6 +163,8 @@ def load_apn_config(data):
 
 
 def pre_proc(config, tree, ksampler):
+    from .nodes import LazyNodeRegistry
+    LazyNodeRegistry.ensure("CLIPTextEncode", "EmptyLatentImage")
     if positive := config.pop("positive", None):
         if ksampler.inputs["positive"].links:
             plink = ksampler.inputs["positive"].links[0]
@@ -0,0 +1,256 @@
+"""
+性能基准, 需在 Blender 内执行, 例如在 Python 控制台中:
+
+    import importlib
+    bench = importlib.import_module("ComfyUI-BlenderAI-node.SDNode.benchmark")
+    bench.bench_load_presets()
+"""
+import time
+import bpy
+from pathlib import Path
+from threading import Thread
+from ..datas import PRESETS_DIR
+from ..kclogger import logger
+from ..timer import Timer
+from ..utils import read_json
+
+
+def _remove_trees_later(trees: list[str], delay=0.5):
+    # load_json_ex 会延迟补连接, 树需要等这些任务跑完再删除
+    def remove():
+        for name in trees:
+            if tree := bpy.data.node_groups.get(name):
+                bpy.data.node_groups.remove(tree)
+
+    def f():
+        time.sleep(delay)
+        Timer.put(remove)
+    Thread(target=f, daemon=True).start()
+
+
+def bench_load_presets(root: Path = PRESETS_DIR, top=20, repeat=1) -> list[tuple[float, int, int, str]]:
+    """
+    逐个加载 presets 中的工作流并计时, 按节点数量从大到小取 top 个
+    返回 [(平均耗时, 节点数, 连接数, 文件名), ...]
+    """
+    from .tree import CFNodeTree, TREE_TYPE
+    from .nodes import LazyNodeRegistry
+    workflows = []
+    for path in Path(root).rglob("*.json"):
+        data = read_json(path)
+        if not isinstance(data, dict) or "nodes" not in data:
+            continue
+        workflows.append((len(data.get("nodes", [])), path))
+    workflows.sort(key=lambda x: x[0], reverse=True)
+    results = []
+    trees = []
+    # 基准加载不计入节点使用次数
+    usage = dict(LazyNodeRegistry.USAGE)
+    for _, path in workflows[:top]:
+        cost = 0
+        for _ in range(repeat):
+            data = read_json(path)
+            tree: CFNodeTree = bpy.data.node_groups.new("SDN_BENCH", TREE_TYPE)
+            trees.append(tree.name)
+            ts = time.perf_counter()
+            tree.load_json_ex(data)
+            cost += time.perf_counter() - ts
+            nnodes, nlinks = len(tree.nodes), len(tree.links)
+        results.append((cost / repeat, nnodes, nlinks, path.name))
+    LazyNodeRegistry.USAGE.clear()
+    LazyNodeRegistry.USAGE.update(usage)
+    _remove_trees_later(trees)
+    total = sum(r[0] for r in results)
+    for cost, nnodes, nlinks, name in results:
+        logger.info("%8.2fms  nodes: %4d  links: %4d  %s", cost * 1000, nnodes, nlinks, name)
+    logger.info("Load %d presets cost %.4fs", len(results), total)
+    return results
+
+
+def _legacy_find_node_by_type(sb, stype, is_output):
+    # 按 socket 类型索引之前 update_sb_list 的实现: 遍历所有节点类, 每个枚举输入都重新计算 md5
+    from .nodes import calc_hash_type
+    if is_output:
+        for inp in sb.inp_types.values():
+            if not inp:
+                continue
+            inp_type = inp[0]
+            if isinstance(inp[0], list):
+                inp_type = calc_hash_type(inp[0])
+                continue
+            if inp_type in {"ENUM", "INT", "FLOAT", "STRING", "BOOLEAN"}:
+                continue
+            if inp_type == stype:
+                return True
+    else:
+        for out_type, _ in sb.out_types:
+            if out_type == stype:
+                return True
+    return False
+
+
+def bench_linker_pie(repeat=5) -> tuple[float, float]:
+    """
+    对每种输出/输入 socket 类型模拟一次 Linker 拖拽饼菜单的候选计算
+    返回 (旧实现耗时, 当前实现耗时)
+    """
+    from ..Linker.linker import DRAG_LINK_MT_NODE_PIE, P
+    from .nodes import NodeBase
+
+    class FakeSocket:
+        def __init__(self, bl_idname, is_output):
+            self.bl_idname = bl_idname
+            self.is_output = is_output
+
+    class FakeFound:
+        socket = None
+
+    sbs = NodeBase.__subclasses__()
+    stypes = {out_type for sb in sbs for out_type, _ in sb.out_types}
+    sockets = [FakeSocket(stype, is_output) for stype in stypes for is_output in (True, False)]
+    old_found = P.foundSocket
+    P.foundSocket = FakeFound()
+    try:
+        ts = time.perf_counter()
+        for _ in range(repeat):
+            for socket in sockets:
+                [sb for sb in sbs if _legacy_find_node_by_type(sb, socket.bl_idname, socket.is_output)]
+        legacy = (time.perf_counter() - ts) / repeat
+        ts = time.perf_counter()
+        for _ in range(repeat):
+            for socket in sockets:
+                P.foundSocket.socket = socket
+                DRAG_LINK_MT_NODE_PIE.update_sb_list()
+        current = (time.perf_counter() - ts) / repeat
+    finally:
+        P.foundSocket = old_found
+    logger.info("Linker pie: %d node types, %d sockets", len(sbs), len(sockets))
+    logger.info("    legacy: %8.2fms  current: %8.2fms", legacy * 1000, current * 1000)
+    return legacy, current
+
+
+def _legacy_read_text_chunk(pngpath) -> dict[str, str]:
+    # 流式解析之前 PngParse.read_text_chunk 的实现: 读取所有块内容, 只解析 tEXt
+    import struct
+    data = {}
+    with open(pngpath, 'rb') as file:
+        if file.read(8) != b'\x89PNG\r\n\x1a\n':
+            return data
+        while True:
+            length_bytes = file.read(4)
+            if len(length_bytes) < 4:
+                break
+            length = struct.unpack('>I', length_bytes)[0]
+            chunk_type = file.read(4)
+            chunk_data = file.read(length)
+            _ = file.read(4)
+            if chunk_type == b'tEXt':
+                keyword, text = chunk_data.decode().split('\0', 1)
+                data[keyword] = text
+            elif chunk_type == b'IEND':
+                break
+    return data
+
+
+def _make_large_png(path: Path, idat_size=64 * 1024 * 1024):
+    # 模拟 8K 图片: 大 IDAT + ComfyUI 风格的 tEXt 元数据
+    import os
+    import struct
+    import zlib
+
+    def chunk(chunk_type: bytes, data: bytes):
+        return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+    with open(path, "wb") as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', 7680, 4320, 8, 6, 0, 0, 0)))
+        f.write(chunk(b'tEXt', b'workflow\0{"nodes": [], "links": []}'))
+        f.write(chunk(b'IDAT', os.urandom(idat_size)))
+        f.write(chunk(b'IEND', b''))
+
+
+def bench_png_metadata(paths: list[Path] = None, repeat=5) -> tuple[float, float]:
+    """
+    对比 PNG 元数据读取耗时, 未指定 paths 时在临时目录生成一张 64MB 的 PNG
+    返回 (旧实现耗时, 当前实现耗时)
+    """
+    import tempfile
+    from ..utils import PngParse
+    tmp = None
+    if not paths:
+        tmp = Path(tempfile.gettempdir()) / "sdn_bench_large.png"
+        _make_large_png(tmp)
+        paths = [tmp]
+    try:
+        ts = time.perf_counter()
+        for _ in range(repeat):
+            for path in paths:
+                _legacy_read_text_chunk(path)
+        legacy = (time.perf_counter() - ts) / repeat
+        ts = time.perf_counter()
+        for _ in range(repeat):
+            for path in paths:
+                PngParse.read_text_chunk(path)
+        current = (time.perf_counter() - ts) / repeat
+    finally:
+        if tmp:
+            tmp.unlink(missing_ok=True)
+    logger.info("PNG metadata: %d files", len(paths))
+    logger.info("    legacy: %8.2fms  current: %8.2fms", legacy * 1000, current * 1000)
+    return legacy, current
+
+
+def _legacy_fuzzy_search(word_list: list[tuple], substr) -> list[tuple]:
+    # 三元组索引之前 Trie.fuzzy_search 的实现: 线性扫描全部词条
+    words = [word for word in word_list if not (word[1].startswith(substr) or word[3].startswith(substr)) and (substr in word[1] or substr in word[3])]
+    return sorted(words, reverse=True)[:20]
+
+
+def _synthetic_tags(size: int) -> list[tuple]:
+    # 以内置标签为基础, 加后缀扩充到 size 个, 热度逐轮减半
+    from ..MultiLineText.trie import read_words, tag_files
+    base = read_words(tag_files())
+    words = []
+    k = 0
+    while len(words) < size:
+        words.extend((max(w[0] >> k, 1), f"{w[1]}_{k}" if k else w[1], w[2], w[3], w[4]) for w in base)
+        k += 1
+    return words[:size]
+
+
+def bench_tag_search(sizes=(200_000, 2_000_000), queries=("hair", "long_h", "air_", "(cosplay)", "ktop", "_1", "zzq"), repeat=3) -> list[tuple[int, float, float]]:
+    """
+    对比标签子串搜索耗时(线性扫描 vs 三元组倒排), 在临时目录按 sizes 生成索引
+    2M 词条的索引构建需要几十秒
+    返回 [(词条数, 旧实现单次查询耗时, 当前实现单次查询耗时), ...]
+    """
+    import tempfile
+    from ..MultiLineText.trie import TagIndex, Trie
+    results = []
+    for size in sizes:
+        words = _synthetic_tags(size)
+        path = Path(tempfile.gettempdir()) / f"sdn_bench_tags_{size}.idx"
+        ts = time.perf_counter()
+        TagIndex.build(path, words, [])
+        build = time.perf_counter() - ts
+        index = TagIndex.open(path)
+        trie = Trie(index)
+        try:
+            word_list = trie.word_list
+            ts = time.perf_counter()
+            for _ in range(repeat):
+                for q in queries:
+                    _legacy_fuzzy_search(word_list, q)
+            legacy = (time.perf_counter() - ts) / repeat / len(queries)
+            ts = time.perf_counter()
+            for _ in range(repeat):
+                for q in queries:
+                    trie.fuzzy_search(q)
+            current = (time.perf_counter() - ts) / repeat / len(queries)
+        finally:
+            del trie
+            index.close()
+            path.unlink(missing_ok=True)
+        results.append((len(index), legacy, current))
+        logger.info("Tag search: %d tags, build %.2fs", len(index), build)
+        logger.info("    legacy: %8.2fms  current: %8.2fms", legacy * 1000, current * 1000)
+    return results
@@ -8,6 +8,7 @@ import urllib.request
 import urllib.parse
 import tempfile
 import aud
+from uuid import uuid4
 from functools import partial, lru_cache
 from pathlib import Path
 from platform import system
@@ -17,13 +18,14 @@ from bpy.types import Context, UILayout
 from .nodegroup import LABEL_TAG, SOCK_TAG, SDNGroup
 from .utils import gen_mask, THelper
 from .plugins.animatedimageplayer import AnimatedImagePlayer as AIP
+from .screencap import ScreenStream
 from .nodes import NodeBase, Ops_Add_SaveImage, Ops_Link_Mask, Ops_Active_Tex, Set_Render_Res, Ops_Switch_Socket_Widget
 from .nodes import name2path, get_icon_path, Images
 from ..SDNode.manager import Task
 from ..timer import Timer
 from ..preference import get_pref
 from ..kclogger import logger
-from ..utils import _T, Icon, update_screen, PrevMgr, rgb2hex, hex2rgb
+from ..utils import _T, Icon, Thumbnail, update_screen, PrevMgr, rgb2hex, hex2rgb
 from ..translations import get_reg_name, get_ori_name
 
 
@@ -1101,20 +1103,23 @@ class PrimitiveNode(BluePrintBase):
 
 
 def upload_image(img_path):
-    from .manager import TaskManager
-
-    url = f"{TaskManager.server.get_url()}/upload/image"
     img_path = Path(img_path)
     if img_path.is_dir() or not img_path.exists():
         return
+    img_type = f"image/{img_path.suffix.replace('.', '')}"
+    return upload_image_data(img_path.name, img_path.read_bytes(), img_type)
+
 
+def upload_image_data(name, img_data: bytes, img_type="image/png"):
+    from .manager import TaskManager
+
+    url = f"{TaskManager.server.get_url()}/upload/image"
     # 准备文件数据
     try:
         import requests
         from urllib3.util import Timeout
         data = {"overwrite": "true", "subfolder": "SDN"}
-        img_type = f"image/{img_path.suffix.replace('.', '')}"
-        files = {'image': (img_path.name, img_path.read_bytes(), img_type)}
+        files = {'image': (name, img_data, img_type)}
         timeout = Timeout(connect=5, read=5)
         url = url.replace("0.0.0.0", "127.0.0.1")
         response = requests.post(url, data=data, files=files, timeout=timeout)
@@ -1142,6 +1147,9 @@ def cache_to_local(data, suffix="png", save_path="") -> Path:
             save_path = Path(tempfile.gettempdir()) / data.get('filename', f'preview{suffix}')
         with open(save_path, "wb") as f:
             f.write(img_data)
+        from .metaindex import MetaIndex
+        if MetaIndex.is_watched(save_path):
+            MetaIndex.put(save_path)
         return save_path
 
 
@@ -1168,19 +1176,29 @@ class 预览(BluePrintBase):
             if pnum == 0:
                 return True
             p0 = self.prev[0].image
-            w = max(p0.size[0], p0.size[1])
+            if not p0:
+                return True
+            # 尺寸从文件头读取, 访问 p0.size 会解码整张图
+            path0 = bpy.path.abspath(p0.filepath)
+            size = Thumbnail.get_size(path0) if p0.filepath else tuple(p0.size)
+            w = max(size)
             if w == 0:
                 return True
             w = setwidth(self, w, count=min(self.lnum, pnum))
-            layout.label(text=f"{p0.file_format} : [{p0.size[0]} x {p0.size[1]}]")
+            layout.label(text=f"{Path(path0).suffix[1:].upper() or p0.file_format} : [{size[0]} x {size[1]}]")
             col = layout.column(align=True)
             for i, p in enumerate(self.prev):
                 if i % self.lnum == 0:
                     fcol = col.column_flow(columns=min(self.lnum, pnum), align=True)
                 prev = p.image
-                if prev.name not in Icon:
-                    Icon.reg_icon_by_pixel(prev, prev.name)
-                icon_id = Icon[prev.name]
+                if not prev:
+                    continue
+                if prev.filepath:
+                    icon_id = Thumbnail.get_icon(bpy.path.abspath(prev.filepath), w)
+                else:
+                    if prev.name not in Icon:
+                        Icon.reg_icon_by_pixel(prev, prev.name)
+                    icon_id = Icon[prev.name]
                 fcol.template_icon(icon_id, scale=w // 20)
             return True
 
@@ -1210,11 +1228,8 @@ class 预览(BluePrintBase):
                     continue
                 try:
                     p = self.prev.add()
-                    # p.image = bpy.data.images.load(img_path)
-                    Icon.load_icon(img_path)
-                    if not (img := Icon.find_image(img_path)):
-                        return
-                    p.image = img
+                    # 不解码原图, 显示使用后台生成的缩略图
+                    p.image = Icon.load_image(img_path)
                 except TypeError:
                     ...
         Timer.put((f, self, img_paths))
@@ -1243,19 +1258,29 @@ class PreviewImage(BluePrintBase):
             if pnum == 0:
                 return True
             p0 = self.prev[0].image
-            w = max(p0.size[0], p0.size[1])
+            if not p0:
+                return True
+            # 尺寸从文件头读取, 访问 p0.size 会解码整张图
+            path0 = bpy.path.abspath(p0.filepath)
+            size = Thumbnail.get_size(path0) if p0.filepath else tuple(p0.size)
+            w = max(size)
             if w == 0:
                 return True
             w = setwidth(self, w, count=min(self.lnum, pnum))
-            layout.label(text=f"{p0.file_format} : [{p0.size[0]} x {p0.size[1]}]")
+            layout.label(text=f"{Path(path0).suffix[1:].upper() or p0.file_format} : [{size[0]} x {size[1]}]")
             col = layout.column(align=True)
             for i, p in enumerate(self.prev):
                 if i % self.lnum == 0:
                     fcol = col.column_flow(columns=min(self.lnum, pnum), align=True)
                 prev = p.image
-                if prev.name not in Icon:
-                    Icon.reg_icon_by_pixel(prev, prev.name)
-                icon_id = Icon[prev.name]
+                if not prev:
+                    continue
+                if prev.filepath:
+                    icon_id = Thumbnail.get_icon(bpy.path.abspath(prev.filepath), w)
+                else:
+                    if prev.name not in Icon:
+                        Icon.reg_icon_by_pixel(prev, prev.name)
+                    icon_id = Icon[prev.name]
                 fcol.template_icon(icon_id, scale=w // 20)
             return True
 
@@ -1285,11 +1310,8 @@ class PreviewImage(BluePrintBase):
                     continue
                 try:
                     p = self.prev.add()
-                    # p.image = bpy.data.images.load(img_path)
-                    Icon.load_icon(img_path)
-                    if not (img := Icon.find_image(img_path)):
-                        return
-                    p.image = img
+                    # 不解码原图, 显示使用后台生成的缩略图
+                    p.image = Icon.load_image(img_path)
                 except TypeError:
                     ...
         Timer.put((f, self, img_paths))
@@ -1450,7 +1472,9 @@ class 存储(BluePrintBase):
                         Timer.put((save_out_dir, self, output_dir))
 
                     def f(_, img):
-                        return bpy.data.images.load(img)
+                        img = bpy.data.images.load(img)
+                        Icon.index_image(img)
+                        return img
                 elif mode in {"Import", "ToImage"}:
                     img = cache_to_local(img).as_posix()
 
@@ -1514,7 +1538,9 @@ class SaveImage(BluePrintBase):
                     Timer.put((save_out_dir, self, output_dir))
 
                 def f(_, img):
-                    return bpy.data.images.load(img)
+                    img = bpy.data.images.load(img)
+                    Icon.index_image(img)
+                    return img
                 Timer.put((f, image, img))
         post_fn = partial(__post_fn__, self, image=self.image)
         return {self.id: (self.serialize(parent=parent), self.pre_fn, post_fn)}
@@ -1727,11 +1753,22 @@ class 截图(BluePrintBase):
     comfyClass = "截图"
 
     def draw_button(s, self: NodeBase, context: Context, layout: UILayout, prop: str, swsock=True, swdisp=False):
-        if prop in {"x1", "y1", "x2", "y2"}:
+        if prop in {"x1", "y1", "x2", "y2", "stream_fps", "stream_uid"}:
             return True
         if prop == "capture":
             layout.prop(self, prop, text="", icon="CLIPUV_DEHLT", toggle=True, text_ctxt=self.get_ctxt())
             return True
+        if prop == "stream":
+            row = layout.row(align=True)
+            row.prop(self, prop, icon="REC", toggle=True, text_ctxt=self.get_ctxt())
+            row.prop(self, "stream_fps", text_ctxt=self.get_ctxt())
+            if not self.stream:
+                # 撤销可能把开关恢复为关闭, 采集线程仍在运行
+                ScreenStream.stop_stream(s._stream_key(self))
+            elif stream := ScreenStream.get(s._stream_key(self)):
+                st = stream.stats
+                layout.label(text=f"{st['fps']:.1f}fps  {st['latency_ms']:.0f}ms  skip {st['skipped']}")
+            return True
         elif prop == "image":
             if os.path.exists(self.image):
                 def f(self):
@@ -1765,25 +1802,42 @@ class 截图(BluePrintBase):
             return True
         return super().draw_button(self, context, layout, prop, swsock, swdisp)
 
+    def _monitor(s, self: NodeBase) -> tuple[dict, str]:
+        x1, y1, x2, y2 = self.x1, self.y1, self.x2, self.y2
+        monitor = {"top": y1, "left": x1, "width": x2 - x1, "height": y2 - y1}
+        output = "sct-{top}x{left}_{width}x{height}.png".format(**monitor)
+        return monitor, Path(tempfile.gettempdir()).joinpath(output).as_posix()
+
+    def _stream_key(s, self: NodeBase) -> str:
+        # as_pointer 在撤销/重新加载后会变化, 节点树名会被重命名, 使用开启采集时生成的 uid
+        return self.stream_uid
+
+    def _update_stream(s, self: NodeBase):
+        if not self.stream or self.x1 == self.x2 or self.y1 == self.y2:
+            ScreenStream.stop_stream(s._stream_key(self))
+            return
+        if not self.stream_uid:
+            self.stream_uid = uuid4().hex
+        monitor, self.image = s._monitor(self)
+        ScreenStream.start(s._stream_key(self), monitor, self.stream_fps)
+
     def _capture(s, self: NodeBase):
         from ..External.mss import mss
-        from ..External.mss.tools import to_png
+        from ..utils import PngWriter
         x1, y1, x2, y2 = self.x1, self.y1, self.x2, self.y2
         if x1 == x2 or y1 == y2:
             logger.error("%s: %s", _T('Error Capturing Screen Region'), (x1, y1, x2, y2))
             return
         # print("GET REGION:", x1, y1, x2, y2)
         with mss() as sct:
-            monitor = {"top": y1, "left": x1, "width": x2 - x1, "height": y2 - y1}
-            output = "sct-{top}x{left}_{width}x{height}.png".format(**monitor)
-            output = Path(tempfile.gettempdir()).joinpath(output).as_posix()
+            monitor, output = s._monitor(self)
             # Grab the data
             from ..utils import CtxTimer
             with CtxTimer(f"{_T(('Capture Screen'))}: {output}"):
                 sct_img = sct.grab(monitor)
             # Save to the picture file
             with CtxTimer(f"{_T('Save Screenshot')}: {output}"):
-                to_png(sct_img.rgb, sct_img.size, output=output, level=0)
+                PngWriter.encode(sct_img.rgb, sct_img.size, output=output, level=1)
             self.image = output
 
     def spec_extra_properties(s, properties, nname, ndesc):
@@ -1803,8 +1857,17 @@ class 截图(BluePrintBase):
                 return
             self.x1, self.y1, self.x2, self.y2 = x1, y1, x2, y2
             s._capture(self)
+            if self.stream:
+                s._update_stream(self)
         prop = bpy.props.BoolProperty(default=False, update=update_capture, name="Capture Screen", description="Capture Screen Region")
         properties["capture"] = prop
+
+        def update_stream(self, context):
+            s._update_stream(self)
+        properties["stream"] = bpy.props.BoolProperty(default=False, update=update_stream, name="Continuous Capture",
+                                                      description="Keep grabbing the region in the background, prompts use the latest frame")
+        properties["stream_fps"] = bpy.props.IntProperty(default=10, min=1, max=60, update=update_stream, name="FPS")
+        properties["stream_uid"] = bpy.props.StringProperty(default="")
         prop = bpy.props.PointerProperty(type=bpy.types.Image)
         properties["prev"] = prop
         prop = bpy.props.IntProperty(default=512)
@@ -1814,12 +1877,26 @@ class 截图(BluePrintBase):
         properties["y2"] = prop
 
     def pre_fn(s, self: NodeBase):
+        if self.stream and (stream := ScreenStream.get(s._stream_key(self))) and (png := stream.latest_png()):
+            # 本地服务按路径读取, 远程服务使用上传的数据
+            Path(self.image).write_bytes(png)
+            upload_image_data(Path(self.image).name, png)
+            return
+
         @Timer.wait_run
         def f():
             s._capture(self)
             upload_image(self.image)
         f()
 
+    def free(s, self: NodeBase):
+        ScreenStream.stop_stream(s._stream_key(self))
+
+    def copy(s, self: NodeBase, node):
+        # 复制出的节点没有采集流, 直接写 ID 属性, 不触发 update 停止原节点的流
+        self["stream"] = False
+        self["stream_uid"] = ""
+
 
 class AnimateDiffCombine(BluePrintBase):
     comfyClass = "AnimateDiffCombine"
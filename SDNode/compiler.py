@@ -0,0 +1,425 @@
+"""
+脱离 Blender 的工作流编译器
+    将 save_json 格式的工作流(如 presets/ 下的文件) 结合缓存的 object_info 转换为 /prompt 请求内容
+    规则与 CFNodeTree.serialize / BluePrintBase._serialize_input 保持一致:
+        1. widgets_values 按 inp_types 中 widget 的顺序取值(seed/noise_seed 后跟 control_after_generate)
+        2. 连接到 PrimitiveNode 的输入取第一个目标节点的值
+        3. 组节点(workflow/xxx) 展开为 "组id:内部id"
+        4. Reroute 沿连接向上追溯
+    本模块只依赖标准库, 可直接作为脚本运行:
+        python compiler.py workflow.json [more.json | dir ...] -i object_info.json -o out_dir
+"""
+from __future__ import annotations
+import sys
+import json
+import uuid
+import argparse
+from pathlib import Path
+from urllib import request
+
+INTERNAL_PATH = Path(__file__).parent / "object_info_internal.json"
+OBJECT_INFO_PATH = Path(__file__).parent / "object_info.json"
+WIDGET_TYPES = {"INT", "FLOAT", "STRING", "BOOLEAN"}
+# 未指定 default 时 bpy.props 属性的默认值
+TYPE_DEFAULTS = {"INT": 0, "FLOAT": 0.0, "STRING": "", "BOOLEAN": False}
+SKIP_TYPES = {"Reroute", "PrimitiveNode", "Note"}
+RENAME_TYPES = {"预览": "PreviewImage"}
+GROUP_PREFIX = "workflow/"
+INTERNAL_NODES = {
+    "PrimitiveNode": {"input": {"required": {}}, "output": ["*"]},
+    "Note": {"input": {"required": {"text": ["STRING", {"multiline": True}]}}, "output": ["*"]},
+    "Reroute": {"input": {"required": {}}, "output": ["*"]},
+}
+
+
+class CompileError(Exception):
+    ...
+
+
+def read_json(path: Path | str) -> dict:
+    encodings = ["utf8", "gbk"]
+    for encoding in encodings:
+        try:
+            return json.loads(Path(path).read_text(encoding=encoding))
+        except UnicodeDecodeError:
+            continue
+        except json.JSONDecodeError:
+            continue
+    return {}
+
+
+def load_object_info(*paths) -> dict:
+    """
+    合并内置 object_info 和缓存 object_info(后者覆盖前者), 与 NodeParser.fetch_object 一致
+    """
+    object_info = {}
+    for path in (INTERNAL_PATH, *paths):
+        if path and Path(path).exists():
+            object_info.update(read_json(path))
+    object_info.update(INTERNAL_NODES)
+    return object_info
+
+
+def is_widget(inp) -> bool:
+    """
+    与 NodeParser._parse_node_clss 相同: ENUM/INT/FLOAT/STRING/BOOLEAN 注册为属性(widget), 其余为socket
+    """
+    if not inp:
+        return False
+    if isinstance(inp[0], list):
+        return True
+    return inp[0] in WIDGET_TYPES
+
+
+class NodeSpec:
+    def __init__(self, name: str, desc: dict) -> None:
+        self.name = name
+        inputs = desc.get("input", {})
+        self.inp_types = {}
+        for key, value in list(inputs.get("required", {}).items()) + list(inputs.get("optional", {}).items()):
+            self.inp_types[key] = value
+            if key in {"seed", "noise_seed"}:
+                self.inp_types["control_after_generate"] = [["fixed", "increment", "decrement", "randomize"]]
+        self.widgets = [name for name, inp in self.inp_types.items() if is_widget(inp)]
+
+    def widget_values(self, values) -> dict:
+        """
+        widgets_values 列表/字典 -> {widget名: 值}, 同 BluePrintBase.load
+        """
+        if isinstance(values, dict):
+            return {w: values[w] for w in self.widgets if w in values}
+        values = list(values or [])
+        return {w: v for w, v in zip(self.widgets, values)}
+
+    def default(self, name):
+        """
+        工作流中缺失的 widget 值, 同节点属性的默认值: 枚举取第一项, 其余取 default
+        """
+        inp = self.inp_types[name]
+        if isinstance(inp[0], list):
+            items = inp[0]
+            # [True, False] 注册为 BoolProperty
+            if items and all(isinstance(item, bool) for item in items):
+                return False
+            return items[0] if items else None
+        opts = inp[1] if len(inp) > 1 and isinstance(inp[1], dict) else {}
+        default = opts.get("default")
+        if default is None:
+            return TYPE_DEFAULTS.get(inp[0])
+        if inp[0] == "INT":
+            return int(default)
+        if inp[0] == "FLOAT" and isinstance(default, list):
+            return default[0]
+        return default
+
+
+class FlatNode:
+    def __init__(self, fid: str, data: dict, spec: NodeSpec) -> None:
+        self.fid = fid
+        self.data = data
+        self.spec = spec
+        self.type = data["type"]
+        # 输入socket 名 <-> slot(位置)
+        self.inputs: list[str] = [inp.get("name", "") for inp in data.get("inputs", [])]
+        self.converted = {inp.get("name", "") for inp in data.get("inputs", []) if "widget" in inp or inp.get("name") in spec.widgets}
+        self.values = spec.widget_values(data.get("widgets_values", []))
+
+    def value(self, name):
+        if name in self.values:
+            return self.values[name]
+        return self.spec.default(name)
+
+    def slot_of(self, name):
+        try:
+            return self.inputs.index(name)
+        except ValueError:
+            return -1
+
+
+class WorkflowCompiler:
+    def __init__(self, object_info: dict) -> None:
+        self.specs: dict[str, NodeSpec] = {name: NodeSpec(name, desc) for name, desc in object_info.items()}
+        self.nodes: dict[str, FlatNode] = {}
+        # (目标fid, 目标slot) -> (源fid, 源slot), 插入顺序即 link 顺序
+        self.edges: dict[tuple[str, int], tuple[str, int]] = {}
+        # 组节点fid -> 接口映射
+        self.group_inputs: dict[str, list[tuple[str, int]]] = {}
+        self.group_outputs: dict[str, list[tuple[str, int]]] = {}
+
+    def get_spec(self, ntype: str) -> NodeSpec:
+        if ntype in self.specs:
+            return self.specs[ntype]
+        raise CompileError(f"Invalid Node Type: {ntype}")
+
+    def compile(self, workflow: dict) -> dict:
+        self.nodes.clear()
+        self.edges.clear()
+        self.group_inputs.clear()
+        self.group_outputs.clear()
+        groups = workflow.get("extra", {}).get("groupNodes", {})
+        outer_edges = {}
+        for link in workflow.get("links", []):
+            # [lindex, fnode, fslot, tnode, tslot, type]
+            if link[1] is None or link[3] is None:
+                continue
+            outer_edges[(str(link[3]), link[4])] = (str(link[1]), link[2])
+        for data in workflow.get("nodes", []):
+            nid = str(data.get("index", data.get("id")))
+            ntype = data["type"]
+            if ntype.startswith(GROUP_PREFIX):
+                gname = ntype[len(GROUP_PREFIX):]
+                if gname not in groups:
+                    raise CompileError(f"Group Not Found: {gname}")
+                self.flatten_group(nid, data, groups[gname])
+                continue
+            self.nodes[nid] = FlatNode(nid, data, self.get_spec(ntype))
+        for target, source in outer_edges.items():
+            tfid, tslot = target
+            if tfid in self.group_inputs:
+                interface = self.group_inputs[tfid]
+                if tslot >= len(interface):
+                    continue
+                target = interface[tslot]
+            self.edges[target] = source
+        prompt = {}
+        for fid, node in self.nodes.items():
+            if node.type in SKIP_TYPES:
+                continue
+            prompt[fid] = self.serialize(node)
+        return prompt
+
+    def flatten_group(self, gid: str, data: dict, group: dict):
+        """
+        展开组节点, 接口顺序同 SDNGroup.inner_links_update
+        """
+        cfg = group.get("config", {})
+        inner: list[FlatNode] = []
+        for mnode in sorted(group.get("nodes", []), key=lambda n: n.get("order", n.get("index", 0))):
+            fid = f"{gid}:{mnode.get('index', mnode.get('id'))}"
+            node = FlatNode(fid, mnode, self.get_spec(mnode["type"]))
+            self.nodes[fid] = node
+            inner.append(node)
+        linked_in = set()
+        linked_out = set()
+        for link in group.get("links", []):
+            # [fnode, fslot, tnode, tslot, lindex, type], 开头为 None 代表外部输入
+            if link[0] is None or link[2] is None:
+                continue
+            src = (f"{gid}:{link[0]}", link[1])
+            dst = (f"{gid}:{link[2]}", link[3])
+            self.edges[dst] = src
+            linked_in.add(dst)
+            linked_out.add(src)
+
+        def visible(node: FlatNode, key, in_out):
+            index = node.fid.split(":")[-1]
+            return cfg.get(index, {}).get(in_out, {}).get(str(key), {}).get("visible", True)
+
+        inputs = []
+        outputs = []
+        for node in inner:
+            for slot, name in enumerate(node.inputs):
+                if (node.fid, slot) in linked_in or name in node.converted:
+                    continue
+                if visible(node, name, "input"):
+                    inputs.append((node.fid, slot))
+            if node.type == "PrimitiveNode":
+                continue
+            for slot, _ in enumerate(node.data.get("outputs", [])):
+                if (node.fid, slot) in linked_out:
+                    continue
+                if visible(node, slot, "output"):
+                    outputs.append((node.fid, slot))
+        for node in inner:
+            for slot, name in enumerate(node.inputs):
+                if (node.fid, slot) in linked_in or name not in node.converted:
+                    continue
+                if visible(node, name, "input"):
+                    inputs.append((node.fid, slot))
+        self.group_inputs[gid] = inputs
+        self.group_outputs[gid] = outputs
+        self.load_group_widgets(data, inner, linked_out | linked_in)
+
+    def load_group_widgets(self, data: dict, inner: list[FlatNode], linked: set):
+        """
+        组节点自身的 widgets_values 覆盖内部节点的值, 同 SDNGroupBP.load_delay
+        """
+        num_cw = len([w for w in data.get("inputs", []) if "widget" in w])
+        values = data.get("widgets_values", [])
+        if not isinstance(values, list):
+            return
+        widgets = values[:-num_cw] if num_cw else values[:]
+        dumped = []
+        for node in inner:
+            outputs = node.data.get("outputs", [])
+            if node.type == "PrimitiveNode":
+                if outputs and "widget" in outputs[0]:
+                    dumped.append((node, outputs[0]["widget"]["name"]))
+                continue
+            node_widgets = node.spec.widgets[:]
+            for inp in node.data.get("inputs", []):
+                if "widget" not in inp:
+                    continue
+                if inp["name"] in {"seed", "noise_seed"} and "control_after_generate" in node_widgets:
+                    node_widgets.remove("control_after_generate")
+                if inp["name"] in node_widgets:
+                    node_widgets.remove(inp["name"])
+            dumped.extend((node, w) for w in node_widgets)
+        for node, inp in dumped:
+            if not widgets:
+                break
+            v = widgets.pop(0)
+            if node.type == "PrimitiveNode":
+                target = self.first_target(node.fid)
+                if not target:
+                    continue
+                node = target
+                if (inp in {"seed", "noise_seed"} or type(v) in {int, float}) and widgets:
+                    widgets.pop(0)
+            if inp in node.spec.widgets:
+                node.values[inp] = v
+
+    def first_target(self, fid: str) -> FlatNode | None:
+        for (tfid, _), (sfid, _) in self.edges.items():
+            if sfid == fid and tfid in self.nodes:
+                return self.nodes[tfid]
+        return None
+
+    def resolve(self, fid: str, slot: int) -> tuple[str, int] | None:
+        """
+        查找输入的真实来源, 跳过 Reroute 并将组输出映射到组内节点, 同 get_from_link
+        """
+        seen = set()
+        while (fid, slot) not in seen:
+            seen.add((fid, slot))
+            source = self.edges.get((fid, slot))
+            if not source:
+                return None
+            fid, slot = source
+            if fid in self.group_outputs:
+                interface = self.group_outputs[fid]
+                if slot >= len(interface):
+                    return None
+                fid, slot = interface[slot]
+            node = self.nodes.get(fid)
+            if not node:
+                return None
+            if node.type != "Reroute":
+                return fid, slot
+            slot = 0
+        return None
+
+    def primitive_value(self, fid: str, inp_name: str, default):
+        """
+        PrimitiveNode 的值取自第一个目标节点(serialize_pre_specific 会同步到其余目标)
+        """
+        for (tfid, tslot), (sfid, _) in self.edges.items():
+            if sfid != fid or tfid not in self.nodes:
+                continue
+            target = self.nodes[tfid]
+            if tslot >= len(target.inputs):
+                continue
+            return target.values.get(target.inputs[tslot], default)
+        return default
+
+    def serialize(self, node: FlatNode) -> dict:
+        inputs = {}
+        for inp_name in node.spec.inp_types:
+            is_widget = inp_name in node.spec.widgets
+            slot = node.slot_of(inp_name)
+            # 1. 未在输入接口中
+            if slot == -1:
+                if is_widget:
+                    inputs[inp_name] = node.value(inp_name)
+                continue
+            source = self.resolve(node.fid, slot)
+            # 2. 在输入接口中, 但未连接
+            if not source:
+                if is_widget:
+                    inputs[inp_name] = node.value(inp_name)
+                continue
+            sfid, sslot = source
+            # 3. 连接的是 PrimitiveNode
+            if self.nodes[sfid].type == "PrimitiveNode":
+                inputs[inp_name] = self.primitive_value(sfid, inp_name, node.value(inp_name))
+                continue
+            inputs[inp_name] = [sfid, sslot]
+        for name in ("seed", "noise_seed"):
+            if name in inputs and not isinstance(inputs[name], list):
+                inputs[name] = int(inputs[name])
+        if node.type == "输入图像" and isinstance(inputs.get("image"), str):
+            inputs["image"] = inputs["image"].replace("\\\\", "/").replace("\\", "/")
+        return {"inputs": inputs, "class_type": RENAME_TYPES.get(node.type, node.type)}
+
+
+def make_payload(prompt: dict, workflow: dict, client_id="") -> dict:
+    """
+    同 TaskManager.submit 中发送到 /prompt 的内容
+    """
+    return {"client_id": client_id or uuid.uuid4().hex,
+            "prompt": prompt,
+            "extra_data": {
+                "extra_pnginfo": {"workflow": workflow}
+            }}
+
+
+def compile_workflow(workflow: dict, object_info: dict, client_id="") -> dict:
+    prompt = WorkflowCompiler(object_info).compile(workflow)
+    return make_payload(prompt, workflow, client_id)
+
+
+def queue_prompt(url: str, payload: dict):
+    data = json.dumps(payload).encode()
+    req = request.Request(f"{url.rstrip('/')}/prompt", data=data)
+    with request.urlopen(req) as res:
+        return json.loads(res.read().decode())
+
+
+def iter_workflows(paths: list[str]):
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            yield from sorted(path.rglob("*.json"))
+        else:
+            yield path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile SDN/ComfyUI workflows to /prompt payloads without Blender")
+    parser.add_argument("workflows", nargs="+", help="workflow json files or directories")
+    parser.add_argument("-i", "--object-info", action="append", default=[], help="cached object_info.json (repeatable)")
+    parser.add_argument("-o", "--output", default="", help="output directory, print to stdout if empty")
+    parser.add_argument("--client-id", default="")
+    parser.add_argument("--prompt-only", action="store_true", help="only emit the prompt dict")
+    parser.add_argument("--queue", default="", help="server url, e.g. http://127.0.0.1:8188")
+    args = parser.parse_args(argv)
+
+    object_info = load_object_info(*(args.object_info or [OBJECT_INFO_PATH]))
+    compiler = WorkflowCompiler(object_info)
+    out_dir = Path(args.output) if args.output else None
+    if out_dir:
+        out_dir.mkdir(parents=True, exist_ok=True)
+    failed = 0
+    for path in iter_workflows(args.workflows):
+        workflow = read_json(path)
+        if not isinstance(workflow, dict) or "nodes" not in workflow:
+            continue
+        try:
+            payload = make_payload(compiler.compile(workflow), workflow, args.client_id)
+        except CompileError as e:
+            failed += 1
+            sys.stderr.write(f"{path}: {e}\n")
+            continue
+        result = payload["prompt"] if args.prompt_only else payload
+        if args.queue:
+            res = queue_prompt(args.queue, payload)
+            sys.stderr.write(f"{path}: {res}\n")
+        if out_dir:
+            out_dir.joinpath(f"{path.stem}.prompt.json").write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf8")
+        elif not args.queue:
+            sys.stdout.write(json.dumps(result, ensure_ascii=False, indent=2) + "\n")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,11 +11,12 @@ from platform import system
 import struct
 from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
+from hashlib import md5
 from shutil import rmtree
 from urllib import request
 from urllib.parse import urlparse
 from urllib.error import URLError
-from threading import Thread
+from threading import Thread, Lock
 from subprocess import Popen, PIPE, STDOUT
 from pathlib import Path
 from queue import Queue
@@ -56,7 +57,6 @@ class Task:
         self.executing_node: NodeBase = None
         self.is_finished = False
         self.process = {}
-        self.binary_message = b""
         # 记录node的类型 防止节点树变更
         self.node_ref_map = {}
         if not tree:
@@ -101,7 +101,8 @@ class Task:
 
     def set_executing_node_id(self, node_id):
         self.executing_node_id = node_id
-        self.binary_message = b""
+        from .node_process import LivePreview
+        LivePreview.reset(id(self))
 
         def f(self: Task):
             from .nodes import NodeBase
@@ -502,20 +503,189 @@ class FakeServer(Server):
     server_type = "Fake"
 
 
+class CoverCache:
+    """
+    远程服务器模型封面缓存
+        1. 合并查询: 短时间内同一类型模型的请求合并为一次 /cs/fetch_config
+        2. 并发下载: 封面在后台线程池下载, 完成后在主线程执行回调(刷新枚举), 同一周期内相同的回调只执行一次
+        3. 持久化: 以 服务器+类型+模型 为键保存到 covers 目录, 超出容量时淘汰最久未使用的封面
+        未就绪时返回 None, 由调用方显示占位图标
+    """
+    DIR = Path(__file__).parent / "covers"
+    INDEX_PATH = DIR / "index.json"
+    MAX_SIZE = 256 * 1024 * 1024
+    BATCH_DELAY = 0.1
+    INDEX: dict[str, dict] = {}  # {key: {"file", "size", "atime", "version"}}
+    PENDING: dict[tuple[str, str], dict[str, list]] = {}  # {(url, mtype): {model: [callback]}}
+    CHECKED: set[str] = set()  # 本次连接已校验过的键
+    READY: set = set()  # 待执行的回调(Timer 任务)
+    LOCK = Lock()
+    EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="SDNCover")
+    _loaded = False
+    _flushing = False
+    _notifying = False
+
+    @staticmethod
+    def key(url, mtype, model) -> str:
+        return md5(f"{url}|{mtype}|{model}".encode()).hexdigest()
+
+    @staticmethod
+    def proxies():
+        return None if WITH_PROXY else {"http": None, "https": None}
+
+    @staticmethod
+    def load_index():
+        if CoverCache._loaded:
+            return
+        CoverCache._loaded = True
+        if not CoverCache.INDEX_PATH.exists():
+            return
+        try:
+            CoverCache.INDEX.update(json.loads(CoverCache.INDEX_PATH.read_text()))
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("Cover index load failed: %s", e)
+
+    @staticmethod
+    def save_index():
+        with CoverCache.LOCK:
+            data = json.dumps(CoverCache.INDEX)
+        try:
+            CoverCache.DIR.mkdir(parents=True, exist_ok=True)
+            CoverCache.INDEX_PATH.write_text(data)
+        except OSError as e:
+            logger.error(e)
+
+    @staticmethod
+    def get(url, mtype, model, on_ready=None) -> Path | None:
+        """
+        返回已缓存的封面路径, 同时(每次连接仅一次)排队校验/下载, 新封面就绪后调用 on_ready
+            on_ready 为 Timer 任务, 需可哈希(如 (func, arg)), 以便合并多个封面的回调
+        """
+        CoverCache.load_index()
+        key = CoverCache.key(url, mtype, model)
+        path = None
+        with CoverCache.LOCK:
+            if item := CoverCache.INDEX.get(key):
+                cover = CoverCache.DIR / item["file"]
+                if cover.exists():
+                    item["atime"] = time.time()
+                    path = cover
+            if key in CoverCache.CHECKED:
+                return path
+            CoverCache.CHECKED.add(key)
+            callbacks = CoverCache.PENDING.setdefault((url, mtype), {}).setdefault(model, [])
+            if on_ready:
+                callbacks.append(on_ready)
+            if not CoverCache._flushing:
+                CoverCache._flushing = True
+                Thread(target=CoverCache._flush, daemon=True).start()
+        return path
+
+    @staticmethod
+    def _flush():
+        # 等待同一批枚举项全部入队
+        time.sleep(CoverCache.BATCH_DELAY)
+        with CoverCache.LOCK:
+            pending = CoverCache.PENDING.copy()
+            CoverCache.PENDING.clear()
+            CoverCache._flushing = False
+        for (url, mtype), models in pending.items():
+            meta = CoverCache.fetch_meta(url, mtype, list(models))
+            for model, callbacks in models.items():
+                data = meta.get(model, {})
+                if not (cover := data.get("cover", "")):
+                    continue
+                version = data.get("hash") or data.get("sha256") or cover
+                key = CoverCache.key(url, mtype, model)
+                with CoverCache.LOCK:
+                    item = CoverCache.INDEX.get(key)
+                if item and item.get("version") == version and (CoverCache.DIR / item["file"]).exists():
+                    continue
+                CoverCache.EXECUTOR.submit(CoverCache._download, url, key, cover, version, callbacks)
+
+    @staticmethod
+    def fetch_meta(url, mtype, models: list[str]) -> dict:
+        try:
+            import requests
+            from urllib3.util import Timeout
+            timeout = Timeout(connect=0.1, read=10)
+            req_json = {"mtype": mtype, "models": models}
+            req = requests.post(url=f"{url}/cs/fetch_config", json=req_json, proxies=CoverCache.proxies(), timeout=timeout)
+            if req.status_code != 200:
+                return {}
+            return req.json()
+        except ModuleNotFoundError:
+            logger.error("Module: requests import error!")
+        except Exception as e:
+            logger.error(e)
+        return {}
+
+    @staticmethod
+    def _download(url, key, cover, version, callbacks):
+        try:
+            import requests
+            img_quote = cover.split("?t=")[0]
+            img_data = requests.get(f"{url}{img_quote}", proxies=CoverCache.proxies(), timeout=5).content
+            if not img_data:
+                return
+            file = f"{key}{Path(img_quote).suffix}"
+            CoverCache.DIR.mkdir(parents=True, exist_ok=True)
+            CoverCache.DIR.joinpath(file).write_bytes(img_data)
+        except Exception as e:
+            logger.error(e)
+            return
+        with CoverCache.LOCK:
+            CoverCache.INDEX[key] = {"file": file, "size": len(img_data), "atime": time.time(), "version": version}
+        CoverCache.evict()
+        CoverCache.save_index()
+        CoverCache.notify(callbacks)
+
+    @staticmethod
+    def notify(callbacks):
+        # 多个封面先后下载完成时合并为一次刷新, 避免每张封面都重建整个枚举
+        with CoverCache.LOCK:
+            CoverCache.READY.update(callbacks)
+            if CoverCache._notifying or not CoverCache.READY:
+                return
+            CoverCache._notifying = True
+        Timer.put(CoverCache._run_ready)
+
+    @staticmethod
+    def _run_ready():
+        with CoverCache.LOCK:
+            ready = list(CoverCache.READY)
+            CoverCache.READY.clear()
+            CoverCache._notifying = False
+        for callback in ready:
+            Timer.executor(callback)
+
+    @staticmethod
+    def evict():
+        with CoverCache.LOCK:
+            total = sum(item.get("size", 0) for item in CoverCache.INDEX.values())
+            if total <= CoverCache.MAX_SIZE:
+                return
+            for key, item in sorted(CoverCache.INDEX.items(), key=lambda kv: kv[1].get("atime", 0)):
+                if total <= CoverCache.MAX_SIZE:
+                    break
+                CoverCache.INDEX.pop(key)
+                total -= item.get("size", 0)
+                CoverCache.DIR.joinpath(item["file"]).unlink(missing_ok=True)
+
+
 class RemoteServer(Server):
     server_type = "Remote"
 
     def __init__(self) -> None:
         self.server_connected = False
         self.cs_support = "UNKNOWN"
-        self.covers = {}
         super().__init__()
 
     def run(self) -> bool:
         self.tstart = time.time()
         self.server_connected = False
         self.cs_support = "UNKNOWN"
-        self.covers.clear()
+        CoverCache.CHECKED.clear()
         TaskManager.clear_error_msg()
         self.uid = time.time_ns()
         self.launch_ip = get_ip()
@@ -540,49 +710,12 @@ class RemoteServer(Server):
             logger.error(e)
         return self.cs_support == "YES"
 
-    def cache_model_icon(self, mtype, model) -> str | None:
-        if model in self.covers:
-            return self.covers[model]
+    def cache_model_icon(self, mtype, model, on_ready=None) -> Path | None:
         if not mtype:
             return
         if not self.is_cs_support():
             return
-        self.covers[model] = None
-        try:
-            import requests
-            from tempfile import gettempdir
-            from urllib3.util import Timeout
-            timeout = Timeout(connect=0.1, read=2)
-            url = f"{get_url()}/cs/fetch_config"
-            req_json = {"mtype": mtype, "models": [model]}
-            if WITH_PROXY:
-                req = requests.post(url=url, json=req_json, timeout=timeout)
-            else:
-                req = requests.post(url=url,
-                                    json=req_json,
-                                    proxies={"http": None, "https": None},
-                                    timeout=timeout)
-            if req.status_code != 200:
-                return
-            data = req.json().get(model, {})
-            cover = data.get("cover", "")
-            img_quote = cover.split("?t=")[0]
-            cover_url = f"{get_url()}{img_quote}"
-            img_data = requests.get(cover_url, timeout=5).content
-            if not img_data:
-                return
-            img_name = model.replace("/", "_").replace("\\", "_")
-            img_path = Path(gettempdir()).joinpath(img_name).with_suffix(Path(img_quote).suffix)
-            with open(img_path, "wb") as f:
-                f.write(img_data)
-            self.covers[model] = img_path
-        except requests.exceptions.ConnectionError:
-            logger.warning("Server Launch Failed")
-        except ModuleNotFoundError:
-            logger.error("Module: requests import error!")
-        except Exception as e:
-            logger.error(e)
-        return self.covers[model]
+        return CoverCache.get(get_url(), mtype, model, on_ready)
 
     def wait_connect(self) -> bool:
         import requests
@@ -1201,8 +1334,6 @@ class TaskManager:
 
         def on_message(ws, message):
             if isinstance(message, bytes):
-                if tm.cur_task:
-                    tm.cur_task.binary_message = message
                 TaskManager.handle_binary_message(message)
                 return
             msg = json.loads(message)
@@ -1343,14 +1474,11 @@ class TaskManager:
         if event_type != 1:
             logger.debug("Unknown binary event type: %s", event_type)
             return
-        # 处理图像类型
-        image_type = struct.unpack(">I", data[4:8])[0]
-        image_mime = "image/png" if image_type == 2 else "image/jpeg"
-        # 假设剩余的数据是图像数据，可以保存或进一步处理
-        image_data = data[8:]
-        return
-        with open(f"/Users/karrycharon/Desktop/000.{image_mime.split('/')[1]}", "wb") as f:
-            f.write(image_data)
+        if not (task := TaskManager.cur_task):
+            return
+        # 图像数据(png/jpeg)交给预览解码线程, 只保留最新帧
+        from .node_process import LivePreview
+        LivePreview.push(id(task), data)
 
 
 def removetemp():
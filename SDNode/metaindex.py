@@ -0,0 +1,389 @@
+"""
+输出图片元数据索引
+    后台线程扫描输出目录, 读取 PNG 中的 prompt/workflow, 存入 SQLite
+    每个子目录分别通过 FSWatcher 监听, 变化时只扫描该目录下的文件, 只解析新增/修改的文件
+
+    MetaIndex.watch([dir1, dir2])
+    MetaIndex.query(text="1girl", model="sdxl")
+    MetaIndex.find_similar("approved_frame.png")
+    MetaIndex.get_workflow(path)
+"""
+import json
+import os
+import queue
+import re
+import sqlite3
+from pathlib import Path
+from threading import Thread, Lock
+from ..utils import PngParse, FSWatcher, logger
+
+MODEL_SUFFIX = (".safetensors", ".ckpt", ".pt", ".pth", ".bin", ".gguf", ".sft")
+SEED_KEYS = {"seed", "noise_seed"}
+TEXT_KEYS = {"text", "text_g", "text_l", "positive", "negative", "prompt"}
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def like_pattern(text: str) -> str:
+    # 转义 LIKE 通配符, long_hair 中的 _ 不能匹配任意字符
+    text = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{text}%"
+
+
+class MetaIndex:
+    DB_PATH = Path(__file__).parent.joinpath("history", "meta_index.db")
+    DIRS: set[str] = set()
+    WATCHED: set[str] = set()  # 已监听的目录(含所有子目录)
+    QUEUE = queue.Queue()  # 待扫描的 (目录或文件, 是否递归)
+    _conn: sqlite3.Connection = None
+    _lock = Lock()
+    _running = False
+
+    @staticmethod
+    def conn() -> sqlite3.Connection:
+        if MetaIndex._conn is None:
+            MetaIndex.DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(MetaIndex.DB_PATH.as_posix(), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS images (
+                    path TEXT PRIMARY KEY,
+                    mtime INTEGER,
+                    prompt TEXT,
+                    seed INTEGER,
+                    models TEXT,
+                    classes TEXT,
+                    workflow TEXT
+                );
+                CREATE TABLE IF NOT EXISTS image_models (path TEXT, model TEXT);
+                CREATE TABLE IF NOT EXISTS image_classes (path TEXT, class_type TEXT);
+                CREATE INDEX IF NOT EXISTS idx_images_seed ON images(seed);
+                CREATE INDEX IF NOT EXISTS idx_models_model ON image_models(model);
+                CREATE INDEX IF NOT EXISTS idx_models_path ON image_models(path);
+                CREATE INDEX IF NOT EXISTS idx_classes_class ON image_classes(class_type);
+                CREATE INDEX IF NOT EXISTS idx_classes_path ON image_classes(path);
+            """)
+            MetaIndex._conn = conn
+        return MetaIndex._conn
+
+    @staticmethod
+    def close():
+        with MetaIndex._lock:
+            if MetaIndex._conn:
+                MetaIndex._conn.close()
+                MetaIndex._conn = None
+
+    @staticmethod
+    def extract(meta: dict[str, str]) -> dict | None:
+        """
+        从 PNG 文本块提取 prompt 文本/seed/模型/节点类型
+            优先使用 API 格式的 prompt, 没有时退化为 workflow 的 widgets_values
+        """
+        try:
+            prompt = json.loads(meta["prompt"]) if "prompt" in meta else {}
+        except json.JSONDecodeError:
+            prompt = {}
+        try:
+            workflow = json.loads(meta["workflow"]) if "workflow" in meta else {}
+        except json.JSONDecodeError:
+            workflow = {}
+        if not isinstance(prompt, dict) or not isinstance(workflow, dict):
+            return None
+        texts, models, classes, seed = [], set(), set(), None
+        for node in prompt.values():
+            if not isinstance(node, dict):
+                continue
+            classes.add(node.get("class_type", ""))
+            for key, value in node.get("inputs", {}).items():
+                if isinstance(value, str):
+                    if value.lower().endswith(MODEL_SUFFIX):
+                        models.add(value)
+                    elif key in TEXT_KEYS:
+                        texts.append(value)
+                elif key in SEED_KEYS and isinstance(value, int) and seed is None:
+                    seed = value
+        if not prompt:
+            for node in workflow.get("nodes", []):
+                classes.add(node.get("type", ""))
+                values = node.get("widgets_values", [])
+                if not isinstance(values, list):
+                    continue
+                for value in values:
+                    if isinstance(value, str) and value.lower().endswith(MODEL_SUFFIX):
+                        models.add(value)
+                if node.get("type", "").startswith("CLIPTextEncode") and values and isinstance(values[0], str):
+                    texts.append(values[0])
+        classes.discard("")
+        if not classes:
+            return None
+        return {
+            "prompt": "\n".join(texts),
+            "seed": seed,
+            "models": sorted(models),
+            "classes": sorted(classes),
+            "workflow": meta.get("workflow") or meta.get("prompt", ""),
+        }
+
+    @staticmethod
+    def index_file(path: str, mtime: int):
+        try:
+            info = MetaIndex.extract(PngParse.read_text_chunk(path))
+        except Exception as e:
+            logger.debug("MetaIndex: %s %s", path, e)
+            info = None
+        with MetaIndex._lock:
+            conn = MetaIndex.conn()
+            conn.execute("DELETE FROM image_models WHERE path=?", (path,))
+            conn.execute("DELETE FROM image_classes WHERE path=?", (path,))
+            if not info:
+                # 无元数据也记录 mtime, 避免重复解析
+                conn.execute("INSERT OR REPLACE INTO images(path, mtime) VALUES (?, ?)", (path, mtime))
+                return
+            conn.execute("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (path, mtime, info["prompt"], info["seed"], "\n".join(info["models"]),
+                          "\n".join(info["classes"]), info["workflow"]))
+            conn.executemany("INSERT INTO image_models VALUES (?, ?)", [(path, m) for m in info["models"]])
+            conn.executemany("INSERT INTO image_classes VALUES (?, ?)", [(path, c) for c in info["classes"]])
+
+    @staticmethod
+    def iter_png(root: str, subdirs: list = None):
+        """
+        遍历 root 下的 PNG, 遍历到的目录都加入监听
+            传入 subdirs 时只遍历 root 本身, 直接子目录收集到 subdirs 中
+        """
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            MetaIndex.watch_dir(directory)
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    (stack if subdirs is None else subdirs).append(entry.path.replace(os.sep, "/"))
+                elif entry.name.lower().endswith(".png"):
+                    try:
+                        # root 已规范化, 子路径只需统一分隔符
+                        yield entry.path.replace(os.sep, "/"), entry.stat().st_mtime_ns
+                    except OSError:
+                        continue
+
+    @staticmethod
+    def scan(root: str, recursive=True) -> int:
+        """
+        增量扫描目录: 只解析新增/修改的文件, 删除已不存在的记录
+            recursive=False 时只扫描 root 下的文件, 新出现的子目录整体扫描, 消失的子目录整体删除
+        """
+        root = FSWatcher.to_str(root)
+        # LIKE 会把路径中的 _ % 当作通配符
+        prefix = root.rstrip("/") + "/"
+        sql = "SELECT path, mtime FROM images WHERE substr(path, 1, ?)=?"
+        args = [len(prefix), prefix]
+        if not recursive:
+            sql += " AND instr(substr(path, ?), '/')=0"
+            args.append(len(prefix) + 1)
+        with MetaIndex._lock:
+            rows = MetaIndex.conn().execute(sql, args).fetchall()
+        known = dict(rows)
+        subdirs = None if recursive else []
+        count = 0
+        for path, mtime in MetaIndex.iter_png(root, subdirs):
+            if known.pop(path, None) == mtime:
+                continue
+            MetaIndex.index_file(path, mtime)
+            count += 1
+            if count % 500 == 0:
+                MetaIndex.commit()
+        if known:
+            with MetaIndex._lock:
+                conn = MetaIndex.conn()
+                for table in ("images", "image_models", "image_classes"):
+                    conn.executemany(f"DELETE FROM {table} WHERE path=?", [(p,) for p in known])
+        for sub in subdirs or ():
+            if sub not in MetaIndex.WATCHED:
+                MetaIndex.put(sub)
+        for sub in list(MetaIndex.WATCHED):
+            if not sub.startswith(prefix) or (not recursive and sub.rpartition("/")[0] != root.rstrip("/")):
+                continue
+            if not os.path.isdir(sub):
+                MetaIndex.forget(sub)
+        MetaIndex.commit()
+        if count or known:
+            logger.info("MetaIndex: %s +%d -%d", root, count, len(known))
+        return count
+
+    @staticmethod
+    def commit():
+        with MetaIndex._lock:
+            MetaIndex.conn().commit()
+
+    @staticmethod
+    def put(path, recursive=True):
+        """
+        加入扫描队列, 可以是目录或单个 PNG 文件
+        """
+        MetaIndex.QUEUE.put((FSWatcher.to_str(path), recursive))
+        MetaIndex._run()
+
+    @staticmethod
+    def _run():
+        if MetaIndex._running:
+            return
+        MetaIndex._running = True
+        Thread(target=MetaIndex._worker, daemon=True).start()
+
+    @staticmethod
+    def _worker():
+        while MetaIndex._running:
+            try:
+                item = MetaIndex.QUEUE.get(timeout=1)
+            except queue.Empty:
+                continue
+            if item is None:
+                break
+            path, recursive = item
+            try:
+                if os.path.isdir(path):
+                    MetaIndex.scan(path, recursive)
+                elif os.path.isfile(path):
+                    MetaIndex.index_file(path, os.stat(path).st_mtime_ns)
+                    MetaIndex.commit()
+            except Exception as e:
+                logger.error("MetaIndex: %s", e)
+
+    @staticmethod
+    def is_watched(path) -> bool:
+        path = FSWatcher.to_str(path)
+        return any(path.startswith(d.rstrip("/") + "/") for d in MetaIndex.DIRS)
+
+    @staticmethod
+    def on_change(path):
+        # FSWatcher 只比较目录自身的 mtime, 即只有该目录的直接子项变化
+        if FSWatcher.consume_change(path):
+            MetaIndex.put(path, recursive=False)
+
+    @staticmethod
+    def watch_dir(directory: str):
+        if directory not in MetaIndex.WATCHED:
+            MetaIndex.WATCHED.add(directory)
+            FSWatcher.register(directory, MetaIndex.on_change)
+
+    @staticmethod
+    def unwatch(directory: str):
+        prefix = directory.rstrip("/") + "/"
+        for d in list(MetaIndex.WATCHED):
+            if d == directory or d.startswith(prefix):
+                MetaIndex.WATCHED.discard(d)
+                FSWatcher.unregister(d)
+
+    @staticmethod
+    def forget(directory: str):
+        """
+        目录已删除: 取消监听并删除其下所有记录
+        """
+        MetaIndex.unwatch(directory)
+        prefix = directory.rstrip("/") + "/"
+        with MetaIndex._lock:
+            conn = MetaIndex.conn()
+            for table in ("images", "image_models", "image_classes"):
+                conn.execute(f"DELETE FROM {table} WHERE substr(path, 1, ?)=?", (len(prefix), prefix))
+
+    @staticmethod
+    def watch(dirs):
+        """
+        设置需要索引的目录, 立即扫描一次, 之后由 FSWatcher 触发增量更新
+        """
+        dirs = {FSWatcher.to_str(d) for d in dirs if d and os.path.isdir(d)}
+        for d in MetaIndex.DIRS - dirs:
+            MetaIndex.unwatch(d)
+        for d in dirs - MetaIndex.DIRS:
+            MetaIndex.watch_dir(d)
+            MetaIndex.put(d)
+        MetaIndex.DIRS = dirs
+
+    @staticmethod
+    def stop():
+        MetaIndex.watch([])
+        MetaIndex._running = False
+        MetaIndex.QUEUE.put(None)
+        MetaIndex.close()
+
+    @staticmethod
+    def query(text="", seed=None, model="", class_type="", limit=50) -> list[dict]:
+        """
+        按 prompt 关键词(全部包含)/seed/模型(模糊)/节点类型查找, 按修改时间倒序
+        """
+        sql = "SELECT path, mtime, prompt, seed, models, classes FROM images WHERE classes IS NOT NULL"
+        args = []
+        for word in WORD_RE.findall(text):
+            sql += " AND prompt LIKE ? ESCAPE '\\'"
+            args.append(like_pattern(word))
+        if seed is not None:
+            sql += " AND seed=?"
+            args.append(seed)
+        if model:
+            sql += " AND path IN (SELECT path FROM image_models WHERE model LIKE ? ESCAPE '\\')"
+            args.append(like_pattern(model))
+        if class_type:
+            sql += " AND path IN (SELECT path FROM image_classes WHERE class_type=?)"
+            args.append(class_type)
+        sql += " ORDER BY mtime DESC LIMIT ?"
+        args.append(limit)
+        with MetaIndex._lock:
+            rows = MetaIndex.conn().execute(sql, args).fetchall()
+        return [MetaIndex.row_to_dict(row) for row in rows]
+
+    @staticmethod
+    def row_to_dict(row) -> dict:
+        path, mtime, prompt, seed, models, classes = row
+        return {
+            "path": path,
+            "mtime": mtime,
+            "prompt": prompt,
+            "seed": seed,
+            "models": models.split("\n") if models else [],
+            "classes": classes.split("\n") if classes else [],
+        }
+
+    @staticmethod
+    def find_similar(path, limit=20) -> list[tuple[float, dict]]:
+        """
+        查找与给定图片(需带元数据)生成设置相近的图片
+            候选: 使用相同模型或相同 seed 的图片
+            得分: prompt 词集合的 jaccard + 节点类型 jaccard * 0.5 + 相同 seed 0.5
+        """
+        info = MetaIndex.extract(PngParse.read_text_chunk(path))
+        if not info:
+            return []
+        path = FSWatcher.to_str(path)
+        words = set(WORD_RE.findall(info["prompt"].lower()))
+        classes = set(info["classes"])
+        sql = "SELECT path, mtime, prompt, seed, models, classes FROM images WHERE path!=? AND (seed=?"
+        args = [path, info["seed"]]
+        if info["models"]:
+            sql += f" OR path IN (SELECT path FROM image_models WHERE model IN ({','.join('?' * len(info['models']))}))"
+            args.extend(info["models"])
+        sql += ")"
+        with MetaIndex._lock:
+            rows = MetaIndex.conn().execute(sql, args).fetchall()
+
+        def jaccard(a: set, b: set):
+            return len(a & b) / len(a | b) if a or b else 0
+
+        results = []
+        for row in rows:
+            item = MetaIndex.row_to_dict(row)
+            score = jaccard(words, set(WORD_RE.findall((item["prompt"] or "").lower())))
+            score += jaccard(classes, set(item["classes"])) * 0.5
+            if info["seed"] is not None and item["seed"] == info["seed"]:
+                score += 0.5
+            results.append((score, item))
+        results.sort(key=lambda x: x[0], reverse=True)
+        return results[:limit]
+
+    @staticmethod
+    def get_workflow(path) -> str:
+        with MetaIndex._lock:
+            row = MetaIndex.conn().execute("SELECT workflow FROM images WHERE path=?",
+                                           (FSWatcher.to_str(path),)).fetchone()
+        return row[0] if row else ""
@@ -2,12 +2,13 @@ import bpy
 import blf
 import gpu
 import struct
-import tempfile
-from pathlib import Path
-from functools import lru_cache
+import time
+from collections import deque
+from threading import Thread, Condition
 from mathutils import Vector
 from .manager import TaskManager
-from ..utils import _T
+from ..utils import _T, logger, update_screen, PkgInstaller, Icon
+from ..timer import Timer
 from ..Linker.linker import DrawRectangle, VecWorldToRegScale, UiScale
 
 FONT_ID = 0
@@ -18,32 +19,145 @@ FONT_ID = 0
 #         if sp.type == "NODE_EDITOR":
 #             return sp
 #     return None
-@lru_cache
-def load_texture(data: bytes) -> gpu.types.GPUTexture:
-    if not data:
-        return
-    # 解析二进制数据的前4个字节获取事件类型
-    event_type = struct.unpack(">I", data[:4])[0]
-    # 根据事件类型处理数据
-    if event_type != 1:
-        return
-    # 处理图像类型
-    image_type = struct.unpack(">I", data[4:8])[0]
-    image_mime = ".png" if image_type == 2 else ".jpeg"
-    img_path = Path(tempfile.gettempdir()).joinpath("rviewport").with_suffix(image_mime)
-    img_path.write_bytes(data[8:])
-    bl_img = bpy.data.images.load(img_path.as_posix())
-    gpu_img = gpu.texture.from_image(bl_img)
-    bpy.data.images.remove(bl_img)
-    img_path.unlink()
-    return gpu_img
-
-
-def display_texture(texture: bytes, loc, size):
+class LivePreview:
+    """
+    采样实时预览
+        ws 线程 push 帧, 每个任务只保留最新一帧, 解码不及时的旧帧直接丢弃
+        有 PIL 时在解码线程解码为 numpy 像素, 否则打包进图像由 blender 解码(都不落盘)
+        所有帧共用一张隐藏图像 IMAGE_NAME, 主线程原地更新
+    """
+    IMAGE_NAME = ".sdn_live_preview"
+    PENDING: dict[int, tuple[bytes, float]] = {}  # {任务: (数据, 接收时间)}
+    COND = Condition()
+    READY = None  # (任务, 解码结果)
+    KEY = None  # 当前图像对应的任务
+    SIZE = (0, 0)
+    STATS = {"frames": 0, "dropped": 0, "decode_ms": 0.0, "fps": 0.0}
+    TIMES = deque(maxlen=30)
+    HAS_PIL = None
+    _running = False
+
+    @staticmethod
+    def push(key, data: bytes):
+        if len(data) < 8 or struct.unpack(">I", data[:4])[0] != 1:
+            return
+        with LivePreview.COND:
+            if key in LivePreview.PENDING:
+                LivePreview.STATS["dropped"] += 1
+            LivePreview.PENDING[key] = (data, time.perf_counter())
+            LivePreview.COND.notify()
+        LivePreview._run()
+
+    @staticmethod
+    def reset(key):
+        with LivePreview.COND:
+            LivePreview.PENDING.pop(key, None)
+            if LivePreview.READY and LivePreview.READY[0] == key:
+                LivePreview.READY = None
+            if LivePreview.KEY == key:
+                LivePreview.KEY = None
+
+    @staticmethod
+    def _run():
+        if LivePreview._running:
+            return
+        LivePreview._running = True
+        Thread(target=LivePreview._worker, daemon=True).start()
+
+    @staticmethod
+    def _worker():
+        while LivePreview._running:
+            with LivePreview.COND:
+                while not LivePreview.PENDING:
+                    LivePreview.COND.wait()
+                key, (data, ts) = LivePreview.PENDING.popitem()
+            try:
+                frame = LivePreview.decode(data)
+            except Exception as e:
+                logger.debug("Live preview decode error: %s", e)
+                continue
+            cost = (time.perf_counter() - ts) * 1000
+            with LivePreview.COND:
+                LivePreview.STATS["decode_ms"] = cost
+                scheduled = LivePreview.READY is not None
+                if scheduled:
+                    LivePreview.STATS["dropped"] += 1
+                LivePreview.READY = (key, frame)
+            if not scheduled:
+                Timer.put(LivePreview.upload)
+
+    @staticmethod
+    def decode(data: bytes):
+        payload = data[8:]
+        if LivePreview.HAS_PIL is None:
+            LivePreview.HAS_PIL = bool(PkgInstaller.is_installed("PIL"))
+        if not LivePreview.HAS_PIL:
+            return "packed", payload
+        import numpy as np
+        from io import BytesIO
+        from PIL import Image
+        with Image.open(BytesIO(payload)) as img:
+            img = img.convert("RGBA")
+            w, h = img.size
+            pixels = np.asarray(img, dtype=np.float32)
+        # blender 图像原点在左下角
+        pixels = np.ascontiguousarray(pixels[::-1]).ravel() / 255
+        return "pixels", (w, h, pixels)
+
+    @staticmethod
+    def upload():
+        with LivePreview.COND:
+            ready, LivePreview.READY = LivePreview.READY, None
+        if not ready:
+            return
+        key, (mode, frame) = ready
+        img = bpy.data.images.get(LivePreview.IMAGE_NAME)
+        if mode == "pixels":
+            w, h, pixels = frame
+            if not img or img.source != "GENERATED":
+                if img:
+                    Icon.remove_image(img)
+                img = bpy.data.images.new(LivePreview.IMAGE_NAME, w, h, alpha=True)
+                Icon.index_image(img)
+            elif tuple(img.size) != (w, h):
+                img.scale(w, h)
+            img.pixels.foreach_set(pixels)
+            img.update()
+        else:
+            if not img:
+                img = bpy.data.images.new(LivePreview.IMAGE_NAME, 8, 8, alpha=True)
+                Icon.index_image(img)
+            img.pack(data=frame, data_len=len(frame))
+            img.source = "FILE"
+            img.reload()
+        LivePreview.SIZE = tuple(img.size)
+        LivePreview.KEY = key
+        now = time.perf_counter()
+        LivePreview.TIMES.append(now)
+        LivePreview.STATS["frames"] += 1
+        if len(LivePreview.TIMES) > 1:
+            LivePreview.STATS["fps"] = (len(LivePreview.TIMES) - 1) / max(now - LivePreview.TIMES[0], 1e-6)
+        update_screen()
+
+    @staticmethod
+    def get_texture(key) -> gpu.types.GPUTexture:
+        if key != LivePreview.KEY or not all(LivePreview.SIZE):
+            return None
+        img = bpy.data.images.get(LivePreview.IMAGE_NAME)
+        if not img:
+            return None
+        # 图像未变化时返回的是同一个纹理
+        return gpu.texture.from_image(img)
+
+    @staticmethod
+    def stats() -> dict:
+        return dict(LivePreview.STATS)
+
+
+def display_texture(tex: gpu.types.GPUTexture, loc, size):
     """
     显示图片纹理
     """
-    tex = load_texture(texture)
     if not tex:
         return
     loc = loc.copy()
@@ -100,7 +214,7 @@ def draw():
     loc = n.location.copy()
     loc.y += 10
     pos = VecWorldToRegScale(loc)
-    display_texture(task.binary_message, loc, calc_size(view2d, n.width))
+    display_texture(LivePreview.get_texture(id(task)), loc, calc_size(view2d, n.width))
     display_text(head, pos, size, (0, 1, 0.0, 1.0))
     if not task.process:
         return
@@ -109,7 +223,13 @@ def draw():
     blf.size(FONT_ID, size)
     loc.x += blf.dimensions(FONT_ID, head)[0] / size * vsize
     pos = VecWorldToRegScale(loc)
-    display_text(f" {v / m * 100:3.0f}% ", pos, size * 1.5, (1, 1, 0.0, 1.0))
+    percent = f" {v / m * 100:3.0f}% "
+    display_text(percent, pos, size * 1.5, (1, 1, 0.0, 1.0))
+    if LivePreview.KEY == id(task):
+        blf.size(FONT_ID, size * 1.5)
+        loc.x += blf.dimensions(FONT_ID, percent)[0] / size * vsize
+        stats = LivePreview.STATS
+        display_text(f"{stats['fps']:.1f}fps {stats['decode_ms']:.0f}ms", VecWorldToRegScale(loc), size, (0.6, 0.6, 0.6, 1.0))
     draw_node_process(n, v / m)
 
 
@@ -14,7 +14,7 @@ from functools import lru_cache
 from mathutils import Vector, Matrix
 from bpy.types import Context, Event
 from .utils import SELECTED_COLLECTIONS, get_default_tree
-from ..utils import logger, Icon, _T, read_json
+from ..utils import logger, Icon, _T, read_json, FSWatcher, update_screen
 from ..datas import ENUM_ITEMS_CACHE, IMG_SUFFIX
 from ..timer import Timer
 from ..translations import ctxt, get_reg_name, get_ori_name
@@ -147,6 +147,79 @@ def calc_hash_type(stype):
     return hash_type
 
 
+class IconIndex:
+    """
+    模型目录预览图索引: {目录: 目录内图片}
+        每个目录只扫描一次, 所有引用该目录的枚举共享
+        通过 FSWatcher 监听目录变化, 变化后丢弃索引, 下次查询时重建
+        INDEX 只在主线程读写, 监听线程的回调通过 Timer 转交主线程
+    """
+    INDEX: dict[Path, dict] = {}
+
+    @staticmethod
+    def get(directory: Path) -> dict:
+        directory = Path(directory)
+        if index := IconIndex.INDEX.get(directory):
+            return index
+        index = {"mtime": 0, "names": {}, "stems": {}, "files": []}
+        try:
+            index["mtime"] = directory.stat().st_mtime_ns
+            for file in directory.iterdir():
+                if file.suffix.lower() not in IMG_SUFFIX:
+                    continue
+                index["names"].setdefault(file.name.lower(), file)
+                index["stems"].setdefault(file.stem, file)
+                index["files"].append(file)
+        except OSError:
+            ...
+        IconIndex.INDEX[directory] = index
+        FSWatcher.register(directory, IconIndex.on_change)
+        return index
+
+    @staticmethod
+    def on_change(path: Path):
+        FSWatcher.consume_change(path)
+        Timer.put((IconIndex.invalidate, path))
+
+    @staticmethod
+    def invalidate(path: Path):
+        index = IconIndex.INDEX.get(path)
+        try:
+            if index and index["mtime"] == path.stat().st_mtime_ns:
+                return
+        except OSError:
+            ...
+        IconIndex.INDEX.pop(path, None)
+
+    @staticmethod
+    def find_exact(directory: Path, item: str) -> Path | None:
+        # 同 <item 去后缀>.png 或 <item>.png, item 可能包含子目录
+        ipath = Path(directory).joinpath(item)
+        names = IconIndex.get(ipath.parent)["names"]
+        for suffix in IMG_SUFFIX:
+            for name in (ipath.stem + suffix, ipath.name + suffix):
+                if file := names.get(name.lower()):
+                    return file
+        return None
+
+    @staticmethod
+    def find_fuzzy(directory: Path, item: str) -> Path | None:
+        index = IconIndex.get(directory)
+        item_prefix = Path(item).stem
+        if file := index["stems"].get(item_prefix):
+            return file
+        for file in index["files"]:
+            if (item in file.stem) or (item_prefix in file.stem):
+                return file
+        return None
+
+    @staticmethod
+    def clear():
+        for path in list(IconIndex.INDEX):
+            FSWatcher.unregister(path)
+        IconIndex.INDEX.clear()
+
+
 class PropGen:
     @staticmethod
     def _find_icon_local(nname, inp_name, item):
@@ -154,27 +227,17 @@ class PropGen:
         if not prev_path_list:
             return 0
 
-        file_list = []
+        dirs = []
         for prev_path in prev_path_list:
             pp = Path(prev_path)
             if not pp.exists():
                 continue
             # 直接搜索 prev_path_list + item文件名 + jpg/png后缀
-            for suffix in IMG_SUFFIX:
-                ipath = pp.joinpath(item)
-                pimg = ipath.with_suffix(suffix)
-                pimg = pimg if pimg.exists() else Path(ipath.as_posix() + suffix)
-                if not pimg.exists():
-                    continue
+            if pimg := IconIndex.find_exact(pp, item):
                 return Icon.reg_icon(pimg.absolute())
-            for file in pp.iterdir():
-                file_list.append(file)
-        item_prefix = Path(item).stem
-        # file_list = [file for prev_path in prev_path_list for file in Path(prev_path).iterdir()]
-        for file in file_list:
-            if (item not in file.stem) and (item_prefix not in file.stem):
-                continue
-            if file.suffix.lower() not in IMG_SUFFIX:
+            dirs.append(pp)
+        for pp in dirs:
+            if not (file := IconIndex.find_fuzzy(pp, item)):
                 continue
             # logger.info(f"🌟 Found Icon -> {file.name}")
             return Icon.reg_icon(file.absolute())
@@ -186,11 +249,18 @@ class PropGen:
         from .manager import TaskManager, RemoteServer
         server: RemoteServer = TaskManager.server
         mtype = name2type.get(inp_name, "")
-        path: Path = server.cache_model_icon(mtype, item)
+        path: Path = server.cache_model_icon(mtype, item, (PropGen._drop_enum_cache, inp_name))
         if not path:
             return
         return Icon.reg_icon(path.absolute(), reload=True)
 
+    @staticmethod
+    def _drop_enum_cache(inp_name):
+        # 封面下载完成, 丢弃使用占位图标的枚举缓存
+        for cache in ENUM_ITEMS_CACHE.values():
+            cache.pop(inp_name, None)
+        update_screen()
+
     @staticmethod
     def _find_icon(nname, inp_name, item):
         from .manager import TaskManager
@@ -739,14 +809,16 @@ class NodeBase(bpy.types.Node):
 
     def unique_id(self):
         pool = self.pool_get()
+        used = set(pool)
         for i in range(3, 99999):
             i = str(i)
-            if i not in pool:
+            if i not in used:
                 pool.add(i)
                 return i
 
     def free(self):
         self.pool_get().discard(self.id)
+        SocketIndex.count(self.class_type, -1)
         bp = self.get_blueprints()
         bp.free(self)
 
@@ -754,6 +826,8 @@ class NodeBase(bpy.types.Node):
         bp = self.get_blueprints()
         bp.copy(self, node)
         self.apply_unique_id()
+        LazyNodeRegistry.mark_type(self)
+        SocketIndex.count(self.class_type)
         if hasattr(self, "sync_rand"):
             self.sync_rand = False
         if self.class_type == "材质图":
@@ -1161,6 +1235,7 @@ class Ops_Add_SaveImage(bpy.types.Operator):
         inp = node.inputs[0]
         if not inp.is_linked:
             return {"FINISHED"}
+        LazyNodeRegistry.ensure("存储")
         save_image_node = tree.nodes.new("存储")
         save_image_node.location = node.location
         save_image_node.location.y += 200
@@ -1851,6 +1926,8 @@ class NodeParser:
                 self.outputs.clear()
 
                 self.apply_unique_id()
+                LazyNodeRegistry.mark_type(self)
+                SocketIndex.count(self.class_type)
                 # self.use_custom_color = True
                 # self.color = self.dcolor
                 for index, inp_name in enumerate(self.inp_types):
@@ -1860,8 +1937,6 @@ class NodeParser:
                         continue
                     socket = inp[0]
                     if isinstance(inp[0], list):
-                        # socket = "ENUM"
-                        socket = calc_hash_type(inp[0])
                         continue
                     if socket in {"ENUM", "INT", "FLOAT", "STRING", "BOOLEAN"}:
                         continue
@@ -1947,11 +2022,298 @@ class NodeParser:
         return node_clss
 
 
+class SocketIndex:
+    """
+    socket 类型 <-> 节点索引(Linker 拖拽创建节点使用)
+        INPUTS[socket类型] = {class_type}  可接收该类型的节点
+        OUTPUTS[socket类型] = {class_type}  可输出该类型的节点
+        COUNTS[class_type] = 当前文件中该类型节点数(新建/复制/删除时增量更新)
+    """
+    INPUTS: dict[str, set[str]] = {}
+    OUTPUTS: dict[str, set[str]] = {}
+    COUNTS: dict[str, int] = {}
+
+    @staticmethod
+    def add(cls):
+        SocketIndex.remove(cls.class_type)
+        for inp in cls.inp_types.values():
+            # 枚举/基础类型为属性, 不参与连接
+            if not inp or isinstance(inp[0], list):
+                continue
+            if inp[0] in {"ENUM", "INT", "FLOAT", "STRING", "BOOLEAN"}:
+                continue
+            SocketIndex.INPUTS.setdefault(inp[0], set()).add(cls.class_type)
+        for out_type, _ in cls.out_types:
+            SocketIndex.OUTPUTS.setdefault(out_type, set()).add(cls.class_type)
+
+    @staticmethod
+    def remove(class_type):
+        for index in (SocketIndex.INPUTS, SocketIndex.OUTPUTS):
+            for stype in list(index):
+                index[stype].discard(class_type)
+                if not index[stype]:
+                    index.pop(stype)
+
+    @staticmethod
+    def find(stype, is_output) -> set[str]:
+        """
+        is_output: 从输出socket拖出, 查找可接收的节点, 反之查找可输出的节点
+        """
+        index = SocketIndex.INPUTS if is_output else SocketIndex.OUTPUTS
+        return index.get(stype, set())
+
+    @staticmethod
+    def count(class_type, delta=1):
+        SocketIndex.COUNTS[class_type] = max(SocketIndex.COUNTS.get(class_type, 0) + delta, 0)
+
+    @staticmethod
+    @bpy.app.handlers.persistent
+    def recount(*_):
+        """
+        打开文件/撤销后节点不经过 init/free, 重新统计一次
+        """
+        SocketIndex.COUNTS.clear()
+        for tree in bpy.data.node_groups:
+            if tree.bl_idname != "CFNodeTree":
+                continue
+            for node in tree.nodes:
+                # 与 init/copy/free 一致按 class_type 统计, 未注册的节点从 ID 属性读取
+                if class_type := getattr(node, "class_type", "") or node.get(LazyNodeRegistry.TYPE_KEY, ""):
+                    SocketIndex.count(class_type)
+
+    @staticmethod
+    def clear():
+        SocketIndex.INPUTS.clear()
+        SocketIndex.OUTPUTS.clear()
+
+
+class LazyNodeRegistry:
+    """
+    节点类按需注册:
+        解析阶段只生成类(菜单/搜索/Linker 依赖), bpy.utils.register_class 推迟到
+        1. 新建节点(菜单/搜索/拖拽)
+        2. 加载工作流
+        3. 打开的 .blend 中已存在该类型节点
+        4. 后台预热(按历史使用次数)
+    """
+    EAGER = {"PrimitiveNode", "Note"}
+    # 类未注册时节点 bl_idname 为 NodeUndefined, 类型另存于节点 ID 属性中
+    TYPE_KEY = "sdn_class_type"
+    USAGE_PATH = Path(__file__).parent / "node_usage.json"
+    USAGE_SAVE_DELAY = 10  # 使用次数合并写盘间隔(秒)
+    WARMUP_COUNT = 64
+    WARMUP_BATCH = 4
+    NODES: dict[str, type] = {}  # {class_type: NodeDesc}
+    SOCKETS: dict[str, list[type]] = {}  # {socket_type: [SocketDesc, InterfaceDesc]}
+    REG_NODES: dict[str, type] = {}
+    REG_SOCKETS: dict[str, list[type]] = {}
+    USAGE: dict[str, int] = {}
+    WARMUP_QUEUE: list[str] = []
+
+    @staticmethod
+    def setup(node_clss: list[type], socket_clss: list[type]):
+        LazyNodeRegistry.NODES.update({c.class_type: c for c in node_clss})
+        for c in node_clss:
+            SocketIndex.add(c)
+        for c in socket_clss:
+            stype = getattr(c, "bl_socket_idname", c.__name__)
+            LazyNodeRegistry.SOCKETS.setdefault(stype, []).append(c)
+        if not LazyNodeRegistry.USAGE and LazyNodeRegistry.USAGE_PATH.exists():
+            LazyNodeRegistry.USAGE.update(read_json(LazyNodeRegistry.USAGE_PATH))
+        LazyNodeRegistry.ensure(*LazyNodeRegistry.EAGER)
+
+    @staticmethod
+    def is_registered(name) -> bool:
+        return name in LazyNodeRegistry.REG_NODES
+
+    @staticmethod
+    def node_sockets(cls) -> set[str]:
+        # 包括 widget 转换后的 socket 类型(switch_socket_widget)
+        sockets = set(NodeParser.SOCKET_TYPE.get(cls.class_type, {}).values())
+        sockets.update(out_type for out_type, _ in cls.out_types)
+        return sockets
+
+    @staticmethod
+    def _register(cls) -> bool:
+        try:
+            bpy.utils.register_class(cls)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to register {cls} -> {e}")
+        return False
+
+    @staticmethod
+    def _unregister(cls):
+        try:
+            bpy.utils.unregister_class(cls)
+        except Exception as e:
+            logger.error(f"Failed to unregister {cls} -> {e}")
+
+    @staticmethod
+    def ensure_socket(stype):
+        if stype in LazyNodeRegistry.REG_SOCKETS or stype not in LazyNodeRegistry.SOCKETS:
+            return
+        clss = [c for c in LazyNodeRegistry.SOCKETS[stype] if LazyNodeRegistry._register(c)]
+        LazyNodeRegistry.REG_SOCKETS[stype] = clss
+
+    @staticmethod
+    def ensure(*names) -> list[str]:
+        """
+        注册给定类型的节点类(及其 socket), 返回本次新注册的类型
+        """
+        registered = []
+        for name in names:
+            if name in LazyNodeRegistry.REG_NODES:
+                continue
+            if not (cls := LazyNodeRegistry.NODES.get(name)):
+                continue
+            for stype in LazyNodeRegistry.node_sockets(cls):
+                LazyNodeRegistry.ensure_socket(stype)
+            if LazyNodeRegistry._register(cls):
+                LazyNodeRegistry.REG_NODES[name] = cls
+                registered.append(name)
+        return registered
+
+    @staticmethod
+    def ensure_workflow(data: dict):
+        names = {n.get("type", "") for n in data.get("nodes", [])}
+        for group in data.get("extra", {}).get("groupNodes", {}).values():
+            names.update(n.get("type", "") for n in group.get("nodes", []))
+        LazyNodeRegistry.record_usage(names)
+        LazyNodeRegistry.ensure(*names)
+
+    @staticmethod
+    def node_type(node) -> str:
+        if node.bl_idname != "NodeUndefined":
+            return node.bl_idname
+        return node.get(LazyNodeRegistry.TYPE_KEY, "")
+
+    @staticmethod
+    def mark_type(node):
+        node[LazyNodeRegistry.TYPE_KEY] = node.class_type
+
+    @staticmethod
+    def ensure_nodes(nodes):
+        """
+        注册 nodes 中尚未注册的节点类型
+            类型从 ID 属性读取, 旧文件中的节点没有记录时只能全部注册
+        """
+        names = set()
+        for n in nodes:
+            if n.is_registered_node_type():
+                continue
+            if not (name := n.get(LazyNodeRegistry.TYPE_KEY, "")):
+                names.update(LazyNodeRegistry.NODES)
+                break
+            names.add(name)
+        LazyNodeRegistry.ensure(*names)
+
+    @staticmethod
+    def ensure_blend():
+        for ng in bpy.data.node_groups:
+            if ng.bl_idname != "CFNodeTree":
+                continue
+            LazyNodeRegistry.ensure_nodes(ng.nodes)
+            # 补记旧文件中节点的类型
+            for n in ng.nodes:
+                if n.bl_idname in LazyNodeRegistry.NODES and LazyNodeRegistry.TYPE_KEY not in n:
+                    LazyNodeRegistry.mark_type(n)
+
+    @staticmethod
+    def record_usage(names):
+        names = [n for n in names if n in LazyNodeRegistry.NODES]
+        if not names:
+            return
+        for name in names:
+            LazyNodeRegistry.USAGE[name] = LazyNodeRegistry.USAGE.get(name, 0) + 1
+        # 不在添加节点/加载工作流时同步写盘, 合并到定时器或注销时
+        if not bpy.app.timers.is_registered(LazyNodeRegistry.save_usage):
+            bpy.app.timers.register(LazyNodeRegistry.save_usage, first_interval=LazyNodeRegistry.USAGE_SAVE_DELAY, persistent=True)
+
+    @staticmethod
+    def save_usage():
+        try:
+            LazyNodeRegistry.USAGE_PATH.write_text(json.dumps(LazyNodeRegistry.USAGE, ensure_ascii=False))
+        except OSError:
+            ...
+
+    @staticmethod
+    def warmup():
+        usage = LazyNodeRegistry.USAGE
+        names = sorted((n for n in usage if n in LazyNodeRegistry.NODES), key=lambda n: usage[n], reverse=True)
+        LazyNodeRegistry.WARMUP_QUEUE[:] = names[:LazyNodeRegistry.WARMUP_COUNT]
+        if not bpy.app.timers.is_registered(LazyNodeRegistry.warmup_step):
+            bpy.app.timers.register(LazyNodeRegistry.warmup_step, first_interval=0.5)
+
+    @staticmethod
+    def warmup_step():
+        # 主线程分批注册, 避免卡顿
+        queue = LazyNodeRegistry.WARMUP_QUEUE
+        batch = queue[:LazyNodeRegistry.WARMUP_BATCH]
+        del queue[:LazyNodeRegistry.WARMUP_BATCH]
+        LazyNodeRegistry.ensure(*batch)
+        return 0.05 if queue else None
+
+    @staticmethod
+    def replace(node_clss: list[type], socket_clss: list[type]):
+        """
+        节点定义变化(diff)时替换类, 已注册的重新注册
+        """
+        for c in socket_clss:
+            stype = getattr(c, "bl_socket_idname", c.__name__)
+            if stype in LazyNodeRegistry.REG_SOCKETS:
+                continue
+            if c not in LazyNodeRegistry.SOCKETS.setdefault(stype, []):
+                LazyNodeRegistry.SOCKETS[stype].append(c)
+        for c in node_clss:
+            LazyNodeRegistry.NODES[c.class_type] = c
+            SocketIndex.add(c)
+            if old_c := LazyNodeRegistry.REG_NODES.pop(c.class_type, None):
+                LazyNodeRegistry._unregister(old_c)
+                LazyNodeRegistry.ensure(c.class_type)
+
+    @staticmethod
+    def unregister_all():
+        if bpy.app.timers.is_registered(LazyNodeRegistry.warmup_step):
+            bpy.app.timers.unregister(LazyNodeRegistry.warmup_step)
+        if bpy.app.timers.is_registered(LazyNodeRegistry.save_usage):
+            bpy.app.timers.unregister(LazyNodeRegistry.save_usage)
+            LazyNodeRegistry.save_usage()
+        LazyNodeRegistry.WARMUP_QUEUE.clear()
+        for cls in reversed(list(LazyNodeRegistry.REG_NODES.values())):
+            LazyNodeRegistry._unregister(cls)
+        for clss in reversed(list(LazyNodeRegistry.REG_SOCKETS.values())):
+            for cls in reversed(clss):
+                LazyNodeRegistry._unregister(cls)
+        LazyNodeRegistry.REG_NODES.clear()
+        LazyNodeRegistry.REG_SOCKETS.clear()
+        LazyNodeRegistry.NODES.clear()
+        LazyNodeRegistry.SOCKETS.clear()
+        SocketIndex.clear()
+
+
+class Ops_Add_Node_Lazy(bpy.types.Operator):
+    bl_idname = "sdn.add_node_lazy"
+    bl_label = "Add Node"
+    bl_options = {"REGISTER", "UNDO"}
+    bl_translation_context = ctxt
+    type: bpy.props.StringProperty()
+
+    def invoke(self, context, event):
+        LazyNodeRegistry.ensure(self.type)
+        LazyNodeRegistry.record_usage([self.type])
+        if not LazyNodeRegistry.is_registered(self.type):
+            self.report({"WARNING"}, _T("Invalid Node Type: {}").format(self.type))
+            return {"CANCELLED"}
+        bpy.ops.node.add_node("INVOKE_DEFAULT", type=self.type, use_transform=True)
+        return {"FINISHED"}
+
+
 class Images(bpy.types.PropertyGroup):
     image: bpy.props.PointerProperty(type=bpy.types.Image)
 
 
-clss = [SDNConfig, MLTText, MLTRec, MLTWords_UL_UIList, MLTText_UL_UIList, Ops_Switch_Socket_Disp, Ops_Switch_Socket_Widget, Ops_Add_SaveImage, Set_Render_Res, GetSelCol, AdvTextEdit, Ops_Active_Tex, Ops_Link_Mask, Images]
+clss = [SDNConfig, MLTText, MLTRec, MLTWords_UL_UIList, MLTText_UL_UIList, Ops_Switch_Socket_Disp, Ops_Switch_Socket_Widget, Ops_Add_SaveImage, Set_Render_Res, GetSelCol, AdvTextEdit, Ops_Active_Tex, Ops_Link_Mask, Ops_Add_Node_Lazy, Images]
 
 reg, unreg = bpy.utils.register_classes_factory(clss)
 
@@ -2011,3 +2373,4 @@ def nodes_unreg():
 def clear_nodes_data_cache():
     ENUM_ITEMS_CACHE.clear()
     PREVICONPATH.clear()
+    IconIndex.clear()
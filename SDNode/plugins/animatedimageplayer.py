@@ -1,21 +1,25 @@
 import bpy
 from platform import system
+import numpy as np
+from math import ceil, sqrt
+from queue import Queue
 from threading import Thread
 from pathlib import Path
-from time import sleep
+from time import perf_counter
 from ...utils import update_screen, ScopeTimer, PrevMgr
-from ...timer import Timer
 from ...kclogger import logger
 
 
+HAS_IMGLIB = False
 if system() != "Linux": #TODO: Linux lupa
     from ...External.lupawrapper import get_lua_runtime
     rt = get_lua_runtime("AnimatedImage")
     imglib = rt.load_dll("image")
+    HAS_IMGLIB = True
 
 
 def read_frame_to_preview(imgpath, p: bpy.types.ImagePreview, frame):
-    if system() != "Linux": #TODO: Linux lupa
+    if not HAS_IMGLIB:
         p.icon_size = (32, 32)
         p.image_size = (32, 32)
     else:
@@ -24,18 +28,122 @@ def read_frame_to_preview(imgpath, p: bpy.types.ImagePreview, frame):
         p.image_size = (w, h)
         imglib.read_frame(imgpath, frame, p.as_pointer())
 
+
+class FrameDecoder:
+    """
+    没有 imglib 时使用的共享解码线程, 按播放器请求顺序预解码全部帧
+        帧缩小到 MAX_SIZE 以内, 并保证单个播放器缓存不超过 CACHE_BYTES
+    """
+    MAX_SIZE = 512
+    CACHE_BYTES = 128 * 1024 * 1024
+    QUEUE = Queue()
+    _running = False
+
+    @staticmethod
+    def request(player: "AnimatedImagePlayer"):
+        FrameDecoder.QUEUE.put(player)
+        if FrameDecoder._running:
+            return
+        FrameDecoder._running = True
+        Thread(target=FrameDecoder._worker, daemon=True).start()
+
+    @staticmethod
+    def _worker():
+        while FrameDecoder._running:
+            player: AnimatedImagePlayer = FrameDecoder.QUEUE.get()
+            if player is None:
+                break
+            if player.freed:
+                continue
+            ts = perf_counter()
+            try:
+                frames = FrameDecoder.decode(player)
+            except Exception as e:
+                logger.error("Decode %s failed: %s", player.imgpath, e)
+                continue
+            player.stats["decode_ms"] = (perf_counter() - ts) * 1000
+            if frames and not player.freed:
+                player.set_frames(frames)
+
+    @staticmethod
+    def decode(player: "AnimatedImagePlayer") -> list[tuple[np.ndarray, float]]:
+        from .animdecoder import open_animation
+        anim = open_animation(player.imgpath)
+        if not anim:
+            logger.warning("Unsupported animated image: %s", player.imgpath)
+            return []
+        w, h = anim.width, anim.height
+        factor = max(-(-max(w, h) // FrameDecoder.MAX_SIZE),
+                     ceil(sqrt(anim.count * w * h * 4 / FrameDecoder.CACHE_BYTES)), 1)
+        frames = []
+        for rgba, delay in anim.frames():
+            if player.freed:
+                return []
+            if factor > 1:
+                sh, sw = h // factor, w // factor
+                rgba = rgba[:sh * factor, :sw * factor].reshape(sh, factor, sw, factor, 4).mean(axis=(1, 3)).astype(np.uint8)
+            # ImagePreview 原点在左下角, 每个像素按 int32 写入 image_pixels
+            pixels = np.ascontiguousarray(rgba[::-1]).view(np.int32).ravel()
+            frames.append((pixels, rgba.shape[1], rgba.shape[0], delay))
+        return frames
+
+
+class PlaybackScheduler:
+    """
+    所有播放器共用一个 bpy.app.timers 定时器, 按各自的时间线推进, 落后时跳帧并计入 dropped
+    """
+    PLAYERS: set["AnimatedImagePlayer"] = set()
+    MIN_INTERVAL = 1 / 120
+    MAX_INTERVAL = 0.1
+
+    @staticmethod
+    def add(player: "AnimatedImagePlayer"):
+        PlaybackScheduler.PLAYERS.add(player)
+        if not bpy.app.timers.is_registered(PlaybackScheduler.tick):
+            bpy.app.timers.register(PlaybackScheduler.tick, first_interval=0, persistent=True)
+
+    @staticmethod
+    def remove(player: "AnimatedImagePlayer"):
+        PlaybackScheduler.PLAYERS.discard(player)
+
+    @staticmethod
+    def tick():
+        if not PlaybackScheduler.PLAYERS:
+            return None
+        now = perf_counter()
+        next_due = now + PlaybackScheduler.MAX_INTERVAL
+        changed = False
+        for player in list(PlaybackScheduler.PLAYERS):
+            try:
+                due, updated = player.advance(now)
+            except Exception as e:
+                logger.error(e)
+                PlaybackScheduler.remove(player)
+                continue
+            next_due = min(next_due, due)
+            changed |= updated
+        if changed:
+            update_screen()
+        return min(max(next_due - perf_counter(), PlaybackScheduler.MIN_INTERVAL), PlaybackScheduler.MAX_INTERVAL)
+
+
 class AnimatedImagePlayer:
     def __init__(self, prev: bpy.types.ImagePreview, imgpath: str, destroycb=None) -> None:
         self.prev = prev
         self.destroy = destroycb
         self.imgpath = imgpath
-        if system() != "Linux": #TODO: Linux lupa
+        self.freed = False
+        self.decoded = []  # [(像素, w, h, 延迟)], 仅无 imglib 时使用
+        self.stats = {"shown": 0, "dropped": 0, "decode_ms": 0.0}
+        self.next_time = 0
+        if HAS_IMGLIB:
             f, w, h, c, d = imglib.cache_animated_image(self.imgpath)
+            self.delays = list(d.values())
         else:
-            f, w, h, c, d = (32, 32, 32, 32, 32)
+            f, w, h = 0, 32, 32
+            self.delays = []
         self.w = w
         self.h = h
-        self.delays = list(d.values())
         self.frames = f
         self.prev.icon_size = (32, 32)
         self.prev.image_size = (w, h)
@@ -43,21 +151,66 @@ class AnimatedImagePlayer:
         self.playing = False
         if not Path(self.imgpath).exists():
             return
-        if system() != "Linux": #TODO: Linux lupa
+        if HAS_IMGLIB:
             imglib.read_frame(self.imgpath, 0, self.prev.as_pointer())
+        else:
+            FrameDecoder.request(self)
+
+    def set_frames(self, frames):
+        # 解码线程调用, 整体替换后主线程才会使用
+        self.delays = [f[3] for f in frames]
+        self.decoded = frames
+        self.frames = len(frames)
+
+    @property
+    def ready(self) -> bool:
+        return self.frames > 0 and len(self.delays) >= self.frames
+
+    def show_frame(self):
+        if not self.prev:
+            return
+        if HAS_IMGLIB:
+            imglib.read_frame(self.imgpath, self.cframe, self.prev.as_pointer())
+            return
+        pixels, w, h, _ = self.decoded[self.cframe]
+        if tuple(self.prev.image_size) != (w, h):
+            self.prev.image_size = (w, h)
+        self.prev.image_pixels.foreach_set(pixels)
+
+    def advance(self, now) -> tuple[float, bool]:
+        """
+        推进到 now 对应的帧, 返回 (下次到期时间, 是否更新了画面)
+        """
+        if not self.ready:
+            return now + PlaybackScheduler.MAX_INTERVAL, False
+        if not self.next_time:
+            self.next_time = now + self.delays[self.cframe]
+            self.show_frame()
+            return self.next_time, True
+        if now < self.next_time:
+            return self.next_time, False
+        steps = 0
+        while now >= self.next_time:
+            self.cframe = (self.cframe + 1) % self.frames
+            self.next_time += max(self.delays[self.cframe], 0.001)
+            steps += 1
+            if steps > self.frames:
+                # 落后超过一轮, 直接对齐到当前时间
+                self.next_time = now + self.delays[self.cframe]
+                break
+        self.stats["dropped"] += steps - 1
+        self.stats["shown"] += 1
+        self.show_frame()
+        return self.next_time, True
 
     def next_frame(self):
         if not Path(self.imgpath).exists():
             return
-        if not self.playing:
-            return
-        if not self.prev:
+        if not self.prev or not self.ready:
             return
         self.cframe = (self.cframe + 1) % self.frames
         try:
-            ptr = self.prev.as_pointer()
-            if system() != "Linux": #TODO: Linux lupa
-                imglib.read_frame(self.imgpath, self.cframe, ptr)
+            self.show_frame()
             # 更新窗口
             update_screen()
         except Exception as e:
@@ -65,24 +218,25 @@ class AnimatedImagePlayer:
 
     def pause(self):
         self.playing = False
+        PlaybackScheduler.remove(self)
 
     def auto_play(self):
         if self.playing:
             return
         self.playing = True
-        Thread(target=self.auto_play_ex, daemon=True).start()
-
-    def auto_play_ex(self):
-        while self.playing:
-            delay = self.delays[self.cframe]
-            sleep(delay)
-            Timer.put(self.next_frame)
-        imglib.free_image(self.imgpath)
-        logger.info("Freed image: %s", self.imgpath)
+        self.next_time = 0
+        PlaybackScheduler.add(self)
 
     def free(self):
-        self.playing = False
+        if self.freed:
+            return
+        self.pause()
+        self.freed = True
         self.prev = None
+        self.decoded = []
+        if HAS_IMGLIB:
+            imglib.free_image(self.imgpath)
+            logger.info("Freed image: %s", self.imgpath)
 
     def __del__(self):
         self.free()
@@ -0,0 +1,349 @@
+"""
+纯 python/numpy 的动图解码, 用于没有 lua imglib 的平台(Linux)
+    支持 GIF 和 APNG(8位深, 非隔行), 动画 WEBP 需要 VP8 解码, 不在此支持
+    open_animation(path) -> Animation | None
+    Animation.frames() 逐帧产出 (RGBA uint8 数组 [h, w, 4] 自上而下, 延迟秒数)
+"""
+import struct
+import zlib
+from pathlib import Path
+import numpy as np
+
+MIN_DELAY = 0.02
+
+
+class Animation:
+    def __init__(self, width, height, count, frames) -> None:
+        self.width = width
+        self.height = height
+        self.count = count
+        self.frames = frames
+
+
+def open_animation(path) -> Animation | None:
+    data = Path(path).read_bytes()
+    if data[:6] in {b"GIF87a", b"GIF89a"}:
+        return _open_gif(data)
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return _open_apng(data)
+    return None
+
+
+# ---------------------------------------- GIF ----------------------------------------
+def _read_sub_blocks(data: bytes, pos: int) -> tuple[bytes, int]:
+    chunks = []
+    while (size := data[pos]) != 0:
+        chunks.append(data[pos + 1:pos + 1 + size])
+        pos += size + 1
+    return b"".join(chunks), pos + 1
+
+
+def _read_palette(data: bytes, pos: int, flags: int) -> tuple[np.ndarray, int]:
+    size = 3 << ((flags & 7) + 1)
+    pal = np.full((256, 4), 255, dtype=np.uint8)
+    colors = np.frombuffer(data[pos:pos + size], dtype=np.uint8).reshape(-1, 3)
+    pal[:len(colors), :3] = colors
+    return pal, pos + size
+
+
+def _lzw_decode(data: bytes, min_code_size: int, npix: int) -> bytes:
+    clear = 1 << min_code_size
+    eoi = clear + 1
+    out = bytearray()
+    table = [bytes((i,)) for i in range(clear)] + [b"", b""]
+    code_size = min_code_size + 1
+    prev = None
+    acc = nbits = 0
+    for byte in data:
+        acc |= byte << nbits
+        nbits += 8
+        while nbits >= code_size:
+            code = acc & ((1 << code_size) - 1)
+            acc >>= code_size
+            nbits -= code_size
+            if code == clear:
+                table = table[:eoi + 1]
+                code_size = min_code_size + 1
+                prev = None
+                continue
+            if code == eoi:
+                return bytes(out[:npix])
+            if prev is None:
+                entry = table[code]
+            elif code < len(table):
+                entry = table[code]
+                table.append(prev + entry[:1])
+            else:
+                entry = prev + prev[:1]
+                table.append(entry)
+            out += entry
+            prev = entry
+            if len(table) == (1 << code_size) and code_size < 12:
+                code_size += 1
+            if len(out) >= npix:
+                return bytes(out[:npix])
+    return bytes(out[:npix])
+
+
+def _deinterlace(indices: np.ndarray) -> np.ndarray:
+    h = indices.shape[0]
+    rows = [*range(0, h, 8), *range(4, h, 8), *range(2, h, 4), *range(1, h, 2)]
+    res = np.empty_like(indices)
+    res[rows] = indices
+    return res
+
+
+def _open_gif(data: bytes) -> Animation | None:
+    width, height, flags = struct.unpack("<HHB", data[6:11])
+    pos = 13
+    global_pal = None
+    if flags & 0x80:
+        global_pal, pos = _read_palette(data, pos, flags)
+    # 先只解析块结构, 得到帧数后再按需解码
+    images = []
+    gce = (0, 0.1, None)  # (disposal, delay, transparent)
+    while pos < len(data):
+        block = data[pos]
+        if block == 0x21:  # 扩展块
+            label = data[pos + 1]
+            body, pos = _read_sub_blocks(data, pos + 2)
+            if label == 0xF9 and len(body) >= 4:
+                pflags, delay, trans = struct.unpack("<BHB", body[:4])
+                gce = ((pflags >> 2) & 7, delay / 100, trans if pflags & 1 else None)
+        elif block == 0x2C:  # 图像描述
+            x, y, w, h, iflags = struct.unpack("<HHHHB", data[pos + 1:pos + 10])
+            pos += 10
+            pal = global_pal
+            if iflags & 0x80:
+                pal, pos = _read_palette(data, pos, iflags)
+            min_code_size = data[pos]
+            body, pos = _read_sub_blocks(data, pos + 1)
+            images.append(((x, y, w, h), bool(iflags & 0x40), pal, min_code_size, body, gce))
+            gce = (0, 0.1, None)
+        elif block == 0x3B:
+            break
+        else:
+            return None
+    if not images:
+        return None
+
+    def frames():
+        canvas = np.zeros((height, width, 4), dtype=np.uint8)
+        for (x, y, w, h), interlaced, pal, min_code_size, body, (disposal, delay, trans) in images:
+            if pal is None:
+                pal = np.full((256, 4), 255, dtype=np.uint8)
+            npix = w * h
+            indices = np.frombuffer(_lzw_decode(body, min_code_size, npix), dtype=np.uint8)
+            if len(indices) < npix:
+                indices = np.pad(indices, (0, npix - len(indices)))
+            indices = indices.reshape(h, w)
+            if interlaced:
+                indices = _deinterlace(indices)
+            colors = pal[indices]
+            if trans is not None:
+                colors[indices == trans, 3] = 0
+            saved = canvas.copy() if disposal == 3 else None
+            # 帧可能超出画布
+            h, w = min(h, height - y), min(w, width - x)
+            if h > 0 and w > 0:
+                region = canvas[y:y + h, x:x + w]
+                colors = colors[:h, :w]
+                mask = colors[..., 3] > 0
+                region[mask] = colors[mask]
+            # 与浏览器一致, 过小的延迟按 0.1s 处理
+            yield canvas.copy(), delay if delay >= MIN_DELAY else 0.1
+            if disposal == 2 and h > 0 and w > 0:
+                canvas[y:y + h, x:x + w] = 0
+            elif saved is not None:
+                canvas = saved
+    return Animation(width, height, len(images), frames)
+
+
+# ---------------------------------------- APNG ----------------------------------------
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+
+def _unfilter_row(cur: bytearray, up: bytes, ftype: int, bpp: int):
+    # Average/Paeth 单行逐字节还原, 只在这类行很少时使用
+    stride = len(cur)
+    if ftype == 3:
+        for i in range(stride):
+            left = cur[i - bpp] if i >= bpp else 0
+            cur[i] = (cur[i] + ((left + up[i]) >> 1)) & 0xFF
+    else:
+        for i in range(stride):
+            a = cur[i - bpp] if i >= bpp else 0
+            b = up[i]
+            c = up[i - bpp] if i >= bpp else 0
+            p = a + b - c
+            pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+            pred = a if pa <= pb and pa <= pc else (b if pb <= pc else c)
+            cur[i] = (cur[i] + pred) & 0xFF
+
+
+def _unfilter(raw: bytes, w: int, h: int, bpp: int) -> np.ndarray:
+    stride = w * bpp
+    lines = np.frombuffer(raw, dtype=np.uint8, count=h * (stride + 1)).reshape(h, stride + 1)
+    ftypes = lines[:, 0]
+    lines = lines[:, 1:]
+    slow = int(np.count_nonzero(ftypes >= 3))
+    # 逐字节还原每字节与对角线推进每步的耗时约为 1:128
+    if slow * stride > (w + h) * 128:
+        return _unfilter_wavefront(lines, ftypes, w, h, bpp)
+    out = np.zeros((h, stride), dtype=np.uint8)
+    prior = np.zeros(stride, dtype=np.uint8)
+    for y in range(h):
+        ftype, line = ftypes[y], lines[y]
+        if ftype == 0:
+            out[y] = line
+        elif ftype == 1:
+            # Sub: 按像素累加, uint8 累加自动取模
+            out[y] = np.cumsum(line.reshape(-1, bpp), axis=0, dtype=np.uint8).ravel()
+        elif ftype == 2:
+            out[y] = line + prior
+        else:
+            cur = bytearray(line.tobytes())
+            _unfilter_row(cur, prior.tobytes(), ftype, bpp)
+            out[y] = np.frombuffer(cur, dtype=np.uint8)
+        prior = out[y]
+    return out
+
+
+def _unfilter_wavefront(lines, ftypes, w, h, bpp) -> np.ndarray:
+    """
+    Average/Paeth 依赖左侧像素, 无法按行向量化; 像素 (y, x) 只依赖 (y, x-1) (y-1, x) (y-1, x-1),
+    同一反对角线 x+y=k 上的像素互不依赖, 按对角线推进, 每步对 min(w, h) 个像素向量化计算
+        斜置存储: 像素 (y, x) -> buf[x+y+2, y+1], 前 2 行/第 0 列为 0(图像外), 每步读写连续内存
+    """
+    buf = np.zeros((w + h + 2, h + 1, bpp), dtype=np.int16)
+    raw = np.zeros_like(buf)
+    ys = np.arange(h)[:, None]
+    cols = np.arange(w)[None, :] + ys + 2
+    raw[cols, ys + 1] = lines.reshape(h, w, bpp)
+    masks = [(ftypes == t)[:, None] for t in range(4)]
+    present = [m.any() for m in masks]
+    pa, pb, pc, pred, tmp = (np.empty((h, bpp), dtype=np.int16) for _ in range(5))
+    cond = np.empty((h, bpp), dtype=bool)
+    for k in range(w + h - 1):
+        y0, y1 = max(0, k - w + 1), min(h, k + 1)
+        n = y1 - y0
+        a = buf[k + 1, y0 + 1:y1 + 1]
+        b = buf[k + 1, y0:y1]
+        c = buf[k, y0:y1]
+        _pa, _pb, _pc, _pred, _tmp, _cond = pa[:n], pb[:n], pc[:n], pred[:n], tmp[:n], cond[:n]
+        # Paeth: pa=|b-c| pb=|a-c| pc=|a+b-2c|
+        np.subtract(b, c, out=_pa)
+        np.subtract(a, c, out=_pb)
+        np.add(_pa, _pb, out=_pc)
+        np.abs(_pa, out=_pa)
+        np.abs(_pb, out=_pb)
+        np.abs(_pc, out=_pc)
+        np.less_equal(_pb, _pc, out=_cond)
+        np.copyto(_pred, c)
+        np.copyto(_pred, b, where=_cond)
+        np.less_equal(_pa, _pb, out=_cond)
+        _cond &= _pa <= _pc
+        np.copyto(_pred, a, where=_cond)
+        if present[3]:
+            np.add(a, b, out=_tmp)
+            _tmp >>= 1
+            np.copyto(_pred, _tmp, where=masks[3][y0:y1])
+        if present[2]:
+            np.copyto(_pred, b, where=masks[2][y0:y1])
+        if present[1]:
+            np.copyto(_pred, a, where=masks[1][y0:y1])
+        if present[0]:
+            np.copyto(_pred, 0, where=masks[0][y0:y1])
+        out = buf[k + 2, y0 + 1:y1 + 1]
+        np.add(raw[k + 2, y0 + 1:y1 + 1], _pred, out=out)
+        out &= 0xFF
+    return buf[cols, ys + 1].astype(np.uint8).reshape(h, w * bpp)
+
+
+def _to_rgba(pixels: np.ndarray, w: int, h: int, color_type: int, pal, trns) -> np.ndarray:
+    channels = PNG_CHANNELS[color_type]
+    pixels = pixels.reshape(h, w, channels)
+    if color_type == 3:
+        return pal[pixels[..., 0]]
+    rgba = np.full((h, w, 4), 255, dtype=np.uint8)
+    if color_type in {0, 4}:
+        rgba[..., :3] = pixels[..., :1]
+    else:
+        rgba[..., :3] = pixels[..., :3]
+    if color_type in {4, 6}:
+        rgba[..., 3] = pixels[..., -1]
+    elif trns is not None:
+        key = np.frombuffer(trns, dtype=">u2")[:3 if color_type == 2 else 1].astype(np.uint8)
+        rgba[(pixels[..., :len(key)] == key).all(axis=-1), 3] = 0
+    return rgba
+
+
+def _open_apng(data: bytes) -> Animation | None:
+    pos = 8
+    ihdr = pal = trns = None
+    count = 0
+    frames = []  # [[fctl, [数据块]]]
+    default_is_frame = False
+    while pos + 8 <= len(data):
+        length, ctype = struct.unpack(">I4s", data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        pos += length + 12
+        if ctype == b"IHDR":
+            ihdr = struct.unpack(">IIBBBBB", body)
+        elif ctype == b"PLTE":
+            colors = np.frombuffer(body, dtype=np.uint8).reshape(-1, 3)
+            pal = np.full((256, 4), 255, dtype=np.uint8)
+            pal[:len(colors), :3] = colors
+        elif ctype == b"tRNS":
+            trns = body
+        elif ctype == b"acTL":
+            count = struct.unpack(">I", body[:4])[0]
+        elif ctype == b"fcTL":
+            frames.append([struct.unpack(">IIIIIHHBB", body[:26]), []])
+        elif ctype == b"IDAT":
+            if frames and not default_is_frame and len(frames) == 1 and not frames[0][1]:
+                default_is_frame = True
+            if default_is_frame and len(frames) == 1:
+                frames[0][1].append(body)
+        elif ctype == b"fdAT" and frames:
+            frames[-1][1].append(body[4:])
+        elif ctype == b"IEND":
+            break
+    if not ihdr or not count or not frames:
+        return None
+    width, height, depth, color_type, _, _, interlace = ihdr
+    if depth != 8 or interlace or color_type not in PNG_CHANNELS:
+        return None
+    if color_type == 3:
+        if pal is None:
+            return None
+        if trns:
+            pal[:len(trns), 3] = np.frombuffer(trns, dtype=np.uint8)
+    bpp = PNG_CHANNELS[color_type]
+
+    def iter_frames():
+        canvas = np.zeros((height, width, 4), dtype=np.uint8)
+        for (_, w, h, x, y, dnum, dden, dispose, blend), chunks in frames:
+            if not chunks:
+                continue
+            pixels = _unfilter(zlib.decompress(b"".join(chunks)), w, h, bpp)
+            rgba = _to_rgba(pixels, w, h, color_type, pal, trns)
+            saved = canvas[y:y + h, x:x + w].copy() if dispose == 2 else None
+            region = canvas[y:y + h, x:x + w]
+            if blend == 0:
+                region[:] = rgba
+            else:
+                src_a = rgba[..., 3:4].astype(np.float32) / 255
+                dst_a = region[..., 3:4].astype(np.float32) / 255
+                out_a = src_a + dst_a * (1 - src_a)
+                color = rgba[..., :3] * src_a + region[..., :3] * dst_a * (1 - src_a)
+                color = np.divide(color, out_a, out=np.zeros_like(color), where=out_a > 0)
+                region[..., :3] = color.clip(0, 255).astype(np.uint8)
+                region[..., 3:4] = (out_a * 255).astype(np.uint8)
+            delay = dnum / (dden or 100)
+            yield canvas.copy(), max(delay, MIN_DELAY)
+            if dispose == 1:
+                canvas[y:y + h, x:x + w] = 0
+            elif saved is not None:
+                canvas[y:y + h, x:x + w] = saved
+    return Animation(width, height, len(frames), iter_frames)
@@ -0,0 +1,96 @@
+"""
+截图节点的连续采集
+    采集线程按目标帧率抓取区域到小环形缓冲, 内容未变化的帧跳过
+    只在构建 prompt 时把最新帧编码为 PNG(内存中), 同一帧只编码一次
+"""
+import time
+import zlib
+from collections import deque
+from threading import Thread, Lock
+from ..utils import PngWriter, logger
+
+
+class ScreenStream:
+    STREAMS: dict[str, "ScreenStream"] = {}  # {节点 stream_uid: 采集流}
+    RING_SIZE = 3
+
+    def __init__(self, monitor: dict, fps=10) -> None:
+        self.monitor = monitor
+        self.fps = fps
+        self.ring = deque(maxlen=ScreenStream.RING_SIZE)  # [(时间, 指纹, ScreenShot)]
+        self.lock = Lock()
+        self.running = False
+        self.encoded = (None, b"")  # (指纹, png)
+        self.stats = {"fps": 0.0, "latency_ms": 0.0, "captured": 0, "skipped": 0}
+        self._times = deque(maxlen=30)
+
+    @staticmethod
+    def start(key, monitor: dict, fps=10) -> "ScreenStream":
+        if (stream := ScreenStream.STREAMS.get(key)) and stream.running:
+            if stream.monitor == monitor:
+                stream.fps = fps
+                return stream
+            stream.stop()
+        stream = ScreenStream.STREAMS[key] = ScreenStream(monitor, fps)
+        stream.running = True
+        Thread(target=stream._loop, daemon=True).start()
+        return stream
+
+    @staticmethod
+    def get(key) -> "ScreenStream":
+        stream = ScreenStream.STREAMS.get(key)
+        return stream if stream and stream.running else None
+
+    @staticmethod
+    def stop_stream(key):
+        if stream := ScreenStream.STREAMS.pop(key, None):
+            stream.stop()
+
+    @staticmethod
+    def stop_all():
+        for key in list(ScreenStream.STREAMS):
+            ScreenStream.stop_stream(key)
+
+    def stop(self):
+        self.running = False
+
+    def _loop(self):
+        # mss 的句柄与线程绑定, 必须在采集线程内创建
+        from ..External.mss import mss
+        last_fp = None
+        try:
+            with mss() as sct:
+                while self.running:
+                    ts = time.perf_counter()
+                    shot = sct.grab(self.monitor)
+                    now = time.perf_counter()
+                    self.stats["latency_ms"] = (now - ts) * 1000
+                    fp = zlib.adler32(shot.raw)
+                    if fp == last_fp:
+                        self.stats["skipped"] += 1
+                    else:
+                        last_fp = fp
+                        with self.lock:
+                            self.ring.append((now, fp, shot))
+                        self.stats["captured"] += 1
+                    self._times.append(now)
+                    if len(self._times) > 1:
+                        self.stats["fps"] = (len(self._times) - 1) / max(now - self._times[0], 1e-6)
+                    time.sleep(max(0, 1 / max(self.fps, 1) - (time.perf_counter() - ts)))
+        except Exception as e:
+            logger.error("Screen stream stopped: %s", e)
+        self.running = False
+
+    def latest_png(self) -> bytes:
+        """
+        编码最新一帧, 帧未变化时直接返回上次的结果
+        """
+        with self.lock:
+            if not self.ring:
+                return b""
+            _, fp, shot = self.ring[-1]
+        if self.encoded[0] == fp:
+            return self.encoded[1]
+        png = PngWriter.encode(shot.rgb, shot.size, level=1)
+        self.encoded = (fp, png)
+        return png
@@ -17,7 +17,8 @@ from functools import partial
 from collections import OrderedDict
 from bpy.types import NodeTree
 from nodeitems_utils import NodeCategory, NodeItem, unregister_node_categories, _node_categories
-from .nodes import nodes_reg, nodes_unreg, NodeParser, NodeBase, clear_nodes_data_cache
+from .nodes import nodes_reg, nodes_unreg, NodeParser, NodeBase, clear_nodes_data_cache, LazyNodeRegistry, SocketIndex
+from .screencap import ScreenStream
 from ..utils import logger, Icon, rgb2hex, hex2rgb, _T, FSWatcher
 from ..datas import EnumCache
 from ..timer import Timer
@@ -39,6 +40,11 @@ class CFNodeItem(NodeItem):
     def draw(self, layout, context):
         col = layout.column()
         col.enabled = self.new_btn_enable(layout, context)
+        # draw 中无法 register_class, 未注册的节点交给 sdn.add_node_lazy 注册后再添加
+        if not LazyNodeRegistry.is_registered(self.nodetype):
+            props = col.operator("sdn.add_node_lazy", text=pgettext(self.label), text_ctxt=ctxt)
+            props.type = self.nodetype
+            return
         props = col.operator("node.add_node", text=pgettext(self.label), text_ctxt=ctxt)
         props.type = self.nodetype
         props.use_transform = True
@@ -108,6 +114,9 @@ class CFNodeTree(NodeTree):
     __metadata__ = {}
 
     class Pool:
+        # 批量模式下 {tree指针: id集合}, 避免每次 add/contains 都对 ID_POOL 做 eval/str
+        BATCH: dict[int, set] = {}
+
         def __init__(self, tree: CFNodeTree) -> None:
             self.tree = tree
 
@@ -142,6 +151,8 @@ class CFNodeTree(NodeTree):
             return repr(self._get_id_pool())
 
         def _get_id_pool(self) -> set:
+            if (batch := self.BATCH.get(self.tree.as_pointer())) is not None:
+                return batch
             if "ID_POOL" not in self.tree:
                 self.tree["ID_POOL"] = "set()"
             try:
@@ -153,6 +164,10 @@ class CFNodeTree(NodeTree):
         def _set_id_pool(self, value):
             if not isinstance(value, set):
                 raise TypeError("ID POOL must be set")
+            key = self.tree.as_pointer()
+            if key in self.BATCH:
+                self.BATCH[key] = value
+                return
             try:
                 self.inner_set(value)
             except AttributeError:
@@ -165,6 +180,21 @@ class CFNodeTree(NodeTree):
     def get_id_pool(self) -> Pool:
         return self.Pool(self)
 
+    @contextmanager
+    def batch_id_pool(self):
+        """
+        批量操作id池: 进入时读取一次, 退出时写回一次
+        """
+        key = self.as_pointer()
+        if key in CFNodeTree.Pool.BATCH:
+            yield
+            return
+        CFNodeTree.Pool.BATCH[key] = self.get_id_pool()._get_id_pool()
+        try:
+            yield
+        finally:
+            self.get_id_pool()._set_id_pool(CFNodeTree.Pool.BATCH.pop(key))
+
     def reset_error_mark(self):
         for n in self.nodes:
             if not n.label.endswith(("-ERROR", "-EXEC")) or n.color != Color((1, 0, 0)):
@@ -272,6 +302,8 @@ class CFNodeTree(NodeTree):
 
         if nodes is None:
             nodes = self.nodes
+        # 追加/粘贴进来的节点可能尚未注册
+        LazyNodeRegistry.ensure_nodes(nodes)
         for n in nodes:
             if not n.is_registered_node_type():
                 raise InvalidNodeType(_T("Invalid Node Type: {}").format(n.name))
@@ -485,7 +517,8 @@ class CFNodeTree(NodeTree):
         return self.save_json_ex(dump_nodes, dump_frames, selected_only=True)
 
     def load_json(self, data):
-        self.clear_nodes()
+        if self.nodes:
+            self.clear_nodes()
         Timer.clear()  # blueprints中的setwidth 可能崩溃, 因此提前清理
         Timer.put((self.load_json_ex, data))
 
@@ -494,6 +527,11 @@ class CFNodeTree(NodeTree):
 
     @load_json_wrapper
     def load_json_ex(self, data, is_group=False):
+        LazyNodeRegistry.ensure_workflow(data)
+        with self.batch_id_pool():
+            return self._load_json_ex(data, is_group)
+
+    def _load_json_ex(self, data, is_group=False):
         for node in self.get_nodes(False):
             node.select = False
         load_nodes = []
@@ -501,7 +539,7 @@ class CFNodeTree(NodeTree):
         id_node_map = {}
         pool = self.get_id_pool()
         groupNodes = data.get("extra", {}).get("groupNodes", {})
-        # 先加载groupNodes
+        # 先加载groupNodes(新建的空树, 直接同步加载, 无需 clear_nodes/Timer 中转)
         for gname, group in groupNodes.items():
             if old_gp := bpy.data.node_groups.get(gname):
                 bpy.data.node_groups.remove(old_gp)
@@ -510,7 +548,7 @@ class CFNodeTree(NodeTree):
             gtree.root = False
             for link in group.get("links", []):
                 link[:5] = link[5], *link[0:4]
-            gtree.load_json(group)
+            gtree.load_json_ex(group)
             gtree.nodes.new("NodeGroupInput").location = (-250, 0)
             gtree.nodes.new("NodeGroupOutput").location = (250, 0)
             gtree.__metadata__ = group
@@ -557,7 +595,6 @@ class CFNodeTree(NodeTree):
                 oname = node.outputs[int(oindex)].name
                 node.set_sock_visible(oname, in_out="OUTPUT", value=out.get("visible", True))
 
-        self.update_editor()
         nlinks = self.dolink(data.get("links", []), id_map, id_node_map)
 
         for group in data.get("groups", []):
@@ -580,6 +617,8 @@ class CFNodeTree(NodeTree):
             node.width = bounding[2]
             node.height = bounding[3]
             node.update()
+        # UI 刷新统一放到最后
+        self.update_editor()
 
         def f(links, id_map, id_node_map):
             # hack: wait for nodegroup sockets update
@@ -589,8 +628,30 @@ class CFNodeTree(NodeTree):
 
         return load_nodes
 
+    @staticmethod
+    def find_slot_socket(node: NodeBase, is_output: bool, slot: int, cache: dict) -> bpy.types.NodeSocket:
+        """
+        按 slot_index 查找socket, 每个节点每个方向只遍历一次socket并缓存索引
+        Reroute 任意slot都对应首个socket
+        """
+        key = (node.as_pointer(), is_output)
+        if key not in cache:
+            sockets = node.outputs if is_output else node.inputs
+            if node.class_type == "Reroute":
+                cache[key] = sockets[0] if sockets else None
+            else:
+                slot_map = {}
+                for sock in sockets:
+                    slot_map.setdefault(sock.slot_index, sock)
+                cache[key] = slot_map
+        slot_map = cache[key]
+        if not isinstance(slot_map, dict):
+            return slot_map
+        return slot_map.get(slot)
+
     def dolink(self, links, id_map, id_node_map):
         not_found_links = []
+        slot_cache = {}
         for link in links:
             # logger.debug(link)
             if str(link[1]) not in id_map:
@@ -610,24 +671,8 @@ class CFNodeTree(NodeTree):
             if to_node.is_group() and len(to_node.inputs) == 0:
                 not_found_links.append(link)
                 continue
-            from_slot = link[2]
-            to_slot = link[4]
-            find_out = None
-            for out in from_node.outputs:
-                if from_node.class_type == "Reroute":
-                    find_out = out
-                    break
-                if out.slot_index == from_slot:
-                    find_out = out
-                    break
-            find_in = None
-            for inp in to_node.inputs:
-                if to_node.class_type == "Reroute":
-                    find_in = inp
-                    break
-                if inp.slot_index == to_slot:
-                    find_in = inp
-                    break
+            find_out = self.find_slot_socket(from_node, True, link[2], slot_cache)
+            find_in = self.find_slot_socket(to_node, False, link[4], slot_cache)
             if find_in and find_out:
                 self.links.new(find_out, find_in)
             else:
@@ -874,11 +919,15 @@ class CFNodeTree(NodeTree):
     @staticmethod
     @bpy.app.handlers.persistent
     def reinit(scene):
+        LazyNodeRegistry.ensure_blend()
         Timer.unreg()
         Icon.clear()
         EnumCache.clear()
+        # 采集流不随文件保存, 打开文件后开关一律复位
+        ScreenStream.stop_all()
         CFNodeTree.force_regen_id()
         CFNodeTree.reset_node()
+        SocketIndex.recount()
         Timer.reg()
         CFNodeTree.unreg_switch_update()
         CFNodeTree.reg_switch_update()
@@ -893,6 +942,8 @@ class CFNodeTree(NodeTree):
                 node.use_custom_color = False
                 # node.color = node.dcolor
                 node.calc_slot_index()
+                if getattr(node, "stream", False):
+                    node.stream = False
 
     @staticmethod
     def force_regen_id():
@@ -1171,21 +1222,12 @@ def set_draw_intern(reg):
 
 def rtnode_reg_diff():
     t1 = time.time()
-    _, node_clss, _ = NodeParser().parse(diff=True)
+    _, node_clss, socket_clss = NodeParser().parse(diff=True)
     if not node_clss:
         return
     logger.info(f"{_T('Changed Node')}: {[c.bl_label for c in node_clss]}")
     clear_nodes_data_cache()
-    clss_map = {}
-    for c in clss:
-        clss_map[c.bl_label] = c
-    for c in node_clss:
-        old_c = clss_map.pop(c.bl_label, None)
-        if old_c:
-            bpy.utils.unregister_class(old_c)
-            clss.remove(old_c)
-        bpy.utils.register_class(c)
-        clss.append(c)
+    LazyNodeRegistry.replace(node_clss, socket_clss)
     logger.info(_T("RegNodeDiff Time:") + f" {time.time()-t1:.2f}s")
 
 
@@ -1200,15 +1242,22 @@ def rtnode_reg():
         t2 = time.time()
         logger.info(_T("ParseNode Time:") + f" {t2-t1:.2f}s")
         node_cat = load_node(nodetree_desc=nt_desc)
-        clss.extend(node_clss)
-        clss.extend(socket_clss)
     except Exception:
         node_cat = []
+        node_clss, socket_clss = [], []
     reg()
+    # 节点类只在首次使用时注册
+    LazyNodeRegistry.setup(node_clss, socket_clss)
+    Timer.put(LazyNodeRegistry.ensure_blend)
+    Timer.put(SocketIndex.recount)
+    LazyNodeRegistry.warmup()
     reg_nodetree(TREE_NAME, node_cat)  # register_node_categories(TREE_NAME, node_cat)
     set_draw_intern(reg=True)
     if CFNodeTree.reinit not in bpy.app.handlers.load_post:
         bpy.app.handlers.load_post.append(CFNodeTree.reinit)
+    for handler in (bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if SocketIndex.recount not in handler:
+            handler.append(SocketIndex.recount)
     if not bpy.app.timers.is_registered(update_tree_handler):
         bpy.app.timers.register(update_tree_handler, persistent=True)
 
@@ -1217,6 +1266,9 @@ def rtnode_unreg():
     # bpy.app.timers.unregister(update_tree_handler)
     if CFNodeTree.reinit in bpy.app.handlers.load_post:
         bpy.app.handlers.load_post.remove(CFNodeTree.reinit)
+    for handler in (bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if SocketIndex.recount in handler:
+            handler.remove(SocketIndex.recount)
     set_draw_intern(reg=False)
     if TREE_NAME in _node_categories:
         try:
@@ -1224,6 +1276,7 @@ def rtnode_unreg():
             unregister_node_categories(TREE_NAME)
         except RuntimeError:
             ...
+    LazyNodeRegistry.unregister_all()
     unreg()
     nodes_unreg()
     clss.clear()
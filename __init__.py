@@ -40,10 +40,12 @@ from .MultiLineText import EnableMLT
 
 from .utils import Icon, FSWatcher, ScopeTimer
 from .timer import timer_reg, timer_unreg
-from .preference import pref_register, pref_unregister
+from .preference import pref_register, pref_unregister, get_pref
 from .ops import Ops, Ops_Mask, Load_History, Popup_Load, Copy_Tree, Load_Batch, Fetch_Node_Status, Clear_Node_Cache, Sync_Stencil_Image, NodeSearch, SDNode_To_Image, Image_To_SDNode, Image_Set_Channel_Packed
 from .ui import ui_reg, ui_unreg, Panel, HISTORY_UL_UIList, HistoryItem
 from .SDNode.history import History
+from .SDNode.metaindex import MetaIndex
+from .SDNode.screencap import ScreenStream
 from .SDNode.rt_tracker import reg_tracker, unreg_tracker
 from .SDNode.nodegroup import nodegroup_reg, nodegroup_unreg
 from .SDNode.custom_support import custom_support_reg, custom_support_unreg
@@ -127,6 +129,7 @@ def register():
     linker_register()
     use_hook()
     FSWatcher.init()
+    MetaIndex.watch(get_pref().meta_index_dirs.split(";"))
     disable_reload()
     nodegroup_reg()
     custom_support_reg()
@@ -153,6 +156,8 @@ def unregister():
     use_hook(False)
     nodegroup_unreg()
     custom_support_unreg()
+    MetaIndex.stop()
+    ScreenStream.stop_all()
     FSWatcher.stop()
 
 
@@ -12,7 +12,7 @@ from mathutils import Vector
 from functools import partial
 from .translations import ctxt
 from .prop import Prop
-from .utils import _T, logger, FSWatcher, read_json
+from .utils import _T, logger, FSWatcher, Icon, read_json
 from .timer import Timer, Worker, WorkerFunc
 from .SDNode import TaskManager
 from .SDNode.history import History
@@ -768,6 +768,9 @@ class NodeSearch(bpy.types.Operator):
         if not get_default_tree():
             self.report({'ERROR'}, _T("No NodeTree Found"))
             return {"FINISHED"}
+        from .SDNode.nodes import LazyNodeRegistry
+        LazyNodeRegistry.ensure(self.item)
+        LazyNodeRegistry.record_usage([self.item])
         try:
             bpy.ops.node.add_node(use_transform=True, settings=[], type=self.item)
         except BaseException:
@@ -911,15 +914,14 @@ def sdn_get_image(node: bpy.types.Node):
 
             # If found, see if loaded, create if not
             if biggest[0] != None:
-                for im in bpy.data.images:
-                    if im.filepath == f.as_posix():
-                        image = im
-                        break
+                f = biggest[0]
+                image = Icon.find_image(f)
                 
                 if image == None:
                     image = bpy.data.images.new(f.stem + f.suffix, 32, 32)
                     image.source = 'FILE'
                     image.filepath = f.as_posix()
+                    Icon.index_image(image)
                 
                 return image
     
@@ -1050,6 +1052,7 @@ class Image_To_SDNode(bpy.types.Operator):
                 newim = bpy.data.images.new(image.name + MODIFIED_IMAGE_SUFFIX, 32, 32, alpha=True)
                 newim.source = 'FILE'
                 newim.filepath = newpath
+                Icon.index_image(newim)
                 ime_area.spaces[0].image = newim
             else:
                 extensionless = image.filepath_raw[:image.filepath_raw.rfind(".")]
@@ -1066,6 +1069,8 @@ class Image_To_SDNode(bpy.types.Operator):
         if active and active.bl_idname == '输入图像' and active.select: # "Input Image" Blender-side node
             active.image = image.filepath_raw
         else:
+            from .SDNode.nodes import LazyNodeRegistry
+            LazyNodeRegistry.ensure('输入图像')
             new_node = sdn_area.spaces[0].node_tree.nodes.new('输入图像')
             new_node.location = new_node_loc
             new_node.image = image.filepath_raw
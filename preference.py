@@ -5,7 +5,7 @@ import json
 import re
 from pathlib import Path
 
-from .utils import Icon, _T, FSWatcher
+from .utils import Icon, _T, FSWatcher, MemCache
 from .External.lupawrapper import toggle_debug
 from .translations import ctxt
 from .kclogger import logger
@@ -244,6 +244,20 @@ class AddonPreference(bpy.types.AddonPreferences):
                                                             ("DEFAULT", "Blender Default", "Default Blender behavior, previews are not automatically resized", 2),
                                                             ])
     preview_image_size: bpy.props.IntProperty(default=256, min=64, max=8192, name="Preview Image Size")
+
+    def update_cache_memory_budget(self, context):
+        MemCache.set_budget(self.cache_memory_budget)
+
+    def update_meta_index_dirs(self, context):
+        from .SDNode.metaindex import MetaIndex
+        MetaIndex.watch(self.meta_index_dirs.split(";"))
+
+    meta_index_dirs: bpy.props.StringProperty(default="", name="Metadata Index Folders",
+                                              description="Output folders whose PNG metadata (prompt, seed, model, nodes) is indexed for search, separated by ';'",
+                                              update=update_meta_index_dirs)
+    cache_memory_budget: bpy.props.IntProperty(default=2048, min=128, max=65536, name="Image Cache Budget (MB)",
+                                               description="Memory budget shared by icons and preview images, least recently used ones are released first",
+                                               update=update_cache_memory_budget)
     play_finish_sound: bpy.props.BoolProperty(default=True, name="Play Finish Sound", description="Play a sound when the ComfyUI queue is empty")
     finish_sound_path: bpy.props.StringProperty(subtype="FILE_PATH", name="Finish Sound Path", 
                                                 description="Path to the file to play when the ComfyUI queue is empty",
@@ -554,6 +568,8 @@ class AddonPreference(bpy.types.AddonPreferences):
         col = row.column()
         col.enabled = self.preview_image_size_type == "FIXED"
         col.prop(self, "preview_image_size", text="", text_ctxt=ctxt)
+        layout.prop(self, "cache_memory_budget", text_ctxt=ctxt)
+        layout.prop(self, "meta_index_dirs", text_ctxt=ctxt)
         row = layout.row(align=True)
         row.prop(self, "play_finish_sound", text_ctxt=ctxt)
         col = row.column(align=True)
@@ -233,14 +233,21 @@ class Prop(bpy.types.PropertyGroup):
         mtw = bpy.context.window_manager.mlt_words
         mtw.clear()
         ts = time.time()
+        Trie.set_pinyin(bpy.context.preferences.view.language in {"zh_HANS", "zh_CN"})
         candicates_words = Trie.TRIE.bl_search(self.search_tag, max_size=200)
+        seen = set()
         for word in candicates_words:
+            # 译名/拼音命中时填入原标签
+            key = word[1] if word[1] in words.word_map or not word[3] else word[3]
+            if key in seen:
+                continue
+            seen.add(key)
             it = mtw.add()
-            if word[1] not in words.word_map:
-                it.value = word[1]
-                it.name = word[1]
+            if key not in words.word_map:
+                it.value = key
+                it.name = key
                 continue
-            word = words.word_map[word[1]]
+            word = words.word_map[key]
             it.value = word[0]
             it.name = word[0]
             if len(word) == 3 and word[2]:
@@ -0,0 +1,22 @@
+"""
+插件模块依赖 blender(bpy), 通过 addon 夹具以插件包的方式导入, 没有 bpy 时跳过
+External 下的第三方库不依赖 blender, 直接导入
+"""
+import importlib
+import sys
+from pathlib import Path
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, ROOT.joinpath("External").as_posix())
+
+
+@pytest.fixture(scope="session")
+def addon():
+    pytest.importorskip("bpy")
+    if ROOT.parent.as_posix() not in sys.path:
+        sys.path.insert(0, ROOT.parent.as_posix())
+
+    def import_module(name: str):
+        return importlib.import_module(f"{ROOT.name}.{name}")
+    return import_module
@@ -0,0 +1,235 @@
+"""
+animdecoder 只依赖 numpy, 按文件路径导入
+    测试内手写 GIF(LZW)/APNG(逐行滤波) 编码, 解码结果与原始像素逐帧比较
+"""
+import importlib.util
+import struct
+import zlib
+from pathlib import Path
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(scope="module")
+def decoder():
+    spec = importlib.util.spec_from_file_location("sdn_animdecoder", ROOT / "SDNode" / "plugins" / "animdecoder.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def chunk(ctype: bytes, body: bytes) -> bytes:
+    return struct.pack(">I", len(body)) + ctype + body + struct.pack(">I", zlib.crc32(ctype + body))
+
+
+def png_filter(pixels: np.ndarray, ftypes, bpp: int) -> bytes:
+    """
+    按 ftypes 逐行滤波(PNG 规范), pixels: [h, w*bpp] uint8
+    """
+    h, stride = pixels.shape
+    cur = pixels.astype(np.int16)
+    up = np.vstack([np.zeros((1, stride), dtype=np.int16), cur[:-1]])
+    left = np.hstack([np.zeros((h, bpp), dtype=np.int16), cur[:, :-bpp]])
+    upleft = np.hstack([np.zeros((h, bpp), dtype=np.int16), up[:, :-bpp]])
+    p = left + up - upleft
+    pa, pb, pc = np.abs(p - left), np.abs(p - up), np.abs(p - upleft)
+    paeth = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, up, upleft))
+    preds = [np.zeros_like(cur), left, up, (left + up) >> 1, paeth]
+    out = bytearray()
+    for y in range(h):
+        ftype = ftypes[y % len(ftypes)]
+        out.append(ftype)
+        out += ((cur[y] - preds[ftype][y]) & 0xFF).astype(np.uint8).tobytes()
+    return bytes(out)
+
+
+def encode_apng(frames: list[np.ndarray], color_type: int, ftypes, delay=(1, 10)) -> bytes:
+    h, w = frames[0].shape[:2]
+    bpp = {0: 1, 2: 3, 4: 2, 6: 4}[color_type]
+    png = b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, color_type, 0, 0, 0))
+    png += chunk(b"acTL", struct.pack(">II", len(frames), 0))
+    seq = 0
+    for i, frame in enumerate(frames):
+        png += chunk(b"fcTL", struct.pack(">IIIIIHHBB", seq, w, h, 0, 0, *delay, 0, 0))
+        seq += 1
+        data = zlib.compress(png_filter(frame.reshape(h, w * bpp), ftypes, bpp))
+        if i == 0:
+            png += chunk(b"IDAT", data)
+        else:
+            png += chunk(b"fdAT", struct.pack(">I", seq) + data)
+            seq += 1
+    return png + chunk(b"IEND", b"")
+
+
+def lzw_encode(indices: bytes, min_code_size: int) -> bytes:
+    clear = 1 << min_code_size
+    table = {bytes((i,)): i for i in range(clear)}
+    next_code = clear + 2
+    code_size = min_code_size + 1
+    acc = nbits = 0
+    out = bytearray()
+
+    def emit(code):
+        nonlocal acc, nbits
+        acc |= code << nbits
+        nbits += code_size
+        while nbits >= 8:
+            out.append(acc & 0xFF)
+            acc >>= 8
+            nbits -= 8
+
+    emit(clear)
+    word = b""
+    for i in indices:
+        wk = word + bytes((i,))
+        if wk in table:
+            word = wk
+            continue
+        emit(table[word])
+        if next_code < 4096:
+            table[wk] = next_code
+            next_code += 1
+            # 与解码端一致: 码表长度达到 2^code_size 后加宽
+            if next_code - 1 == (1 << code_size) and code_size < 12:
+                code_size += 1
+        word = bytes((i,))
+    if word:
+        emit(table[word])
+    emit(clear + 1)
+    if nbits:
+        out.append(acc & 0xFF)
+    return bytes(out)
+
+
+def sub_blocks(data: bytes) -> bytes:
+    return b"".join(bytes((len(data[i:i + 255]),)) + data[i:i + 255] for i in range(0, len(data), 255)) + b"\0"
+
+
+def encode_gif(width, height, palette: np.ndarray, frames) -> bytes:
+    """
+    frames: [(x, y, indices[h, w], transparent, interlaced, disposal, delay_cs)]
+    """
+    bits = max(1, int(np.ceil(np.log2(len(palette)))))
+    pal = np.zeros((1 << bits, 3), dtype=np.uint8)
+    pal[:len(palette)] = palette
+    gif = b"GIF89a" + struct.pack("<HHBBB", width, height, 0x80 | (bits - 1), 0, 0) + pal.tobytes()
+    for x, y, indices, trans, interlaced, disposal, delay in frames:
+        h, w = indices.shape
+        pflags = (disposal << 2) | (1 if trans is not None else 0)
+        gif += b"\x21\xF9\x04" + struct.pack("<BHB", pflags, delay, trans or 0) + b"\0"
+        if interlaced:
+            indices = indices[[*range(0, h, 8), *range(4, h, 8), *range(2, h, 4), *range(1, h, 2)]]
+        gif += b"\x2C" + struct.pack("<HHHHB", x, y, w, h, 0x40 if interlaced else 0)
+        min_code_size = max(2, bits)
+        gif += bytes((min_code_size,)) + sub_blocks(lzw_encode(indices.astype(np.uint8).tobytes(), min_code_size))
+    return gif + b"\x3B"
+
+
+def decode_all(decoder, path):
+    anim = decoder.open_animation(path)
+    assert anim is not None
+    frames = list(anim.frames())
+    assert len(frames) == anim.count
+    return anim, frames
+
+
+@pytest.mark.parametrize("color_type", [0, 2, 4, 6])
+@pytest.mark.parametrize("size", [(1, 1), (7, 5), (33, 17), (16, 200)])
+@pytest.mark.parametrize("ftypes", [[0], [1], [2], [3], [4], [0, 1, 2, 3, 4], [4, 4, 3, 1]])
+def test_apng_roundtrip(decoder, tmp_path, color_type, size, ftypes):
+    rng = np.random.default_rng(hash((color_type, size, tuple(ftypes))) & 0xFFFF)
+    w, h = size
+    channels = {0: 1, 2: 3, 4: 2, 6: 4}[color_type]
+    frames = [rng.integers(0, 256, (h, w, channels), dtype=np.uint8) for _ in range(3)]
+    if channels in {2, 4}:
+        # blend_op=SOURCE, alpha 直接覆盖
+        for f in frames:
+            f[..., -1] = rng.integers(0, 256, (h, w), dtype=np.uint8)
+    path = tmp_path / "anim.png"
+    path.write_bytes(encode_apng(frames, color_type, ftypes))
+    anim, decoded = decode_all(decoder, path)
+    assert (anim.width, anim.height) == (w, h)
+    for src, (rgba, delay) in zip(frames, decoded):
+        assert rgba.shape == (h, w, 4)
+        assert delay == pytest.approx(0.1)
+        if channels in {1, 2}:
+            assert (rgba[..., :3] == src[..., :1]).all()
+        else:
+            assert (rgba[..., :3] == src[..., :3]).all()
+        if channels in {2, 4}:
+            assert (rgba[..., 3] == src[..., -1]).all()
+        else:
+            assert (rgba[..., 3] == 255).all()
+
+
+@pytest.mark.parametrize("size", [(64, 64), (300, 40)])
+def test_unfilter_paths_agree(decoder, size):
+    # 逐字节与按对角线推进两种还原方式结果一致
+    rng = np.random.default_rng(7)
+    w, h = size
+    bpp = 4
+    pixels = rng.integers(0, 256, (h, w * bpp), dtype=np.uint8)
+    raw = png_filter(pixels, list(rng.integers(0, 5, h)), bpp)
+    lines = np.frombuffer(raw, dtype=np.uint8).reshape(h, w * bpp + 1)
+    assert (decoder._unfilter(raw, w, h, bpp) == pixels).all()
+    assert (decoder._unfilter_wavefront(lines[:, 1:], lines[:, 0], w, h, bpp) == pixels).all()
+
+
+@pytest.mark.parametrize("ncolors", [2, 4, 16, 256])
+@pytest.mark.parametrize("interlaced", [False, True])
+def test_gif_roundtrip(decoder, tmp_path, ncolors, interlaced):
+    rng = np.random.default_rng(ncolors)
+    w, h = 37, 23
+    palette = rng.integers(0, 256, (ncolors, 3), dtype=np.uint8)
+    first = rng.integers(0, ncolors, (h, w))
+    # 第二帧为局部区域, 带透明色, 透明处保留上一帧
+    patch = rng.integers(0, ncolors, (9, 11))
+    trans = 1
+    path = tmp_path / "anim.gif"
+    path.write_bytes(encode_gif(w, h, palette, [
+        # 过小的延迟按 0.1s 处理
+        (0, 0, first, None, interlaced, 1, 1),
+        (20, 10, patch, trans, interlaced, 1, 12),
+    ]))
+    anim, decoded = decode_all(decoder, path)
+    assert (anim.width, anim.height, anim.count) == (w, h, 2)
+    (f0, d0), (f1, d1) = decoded
+    assert (f0[..., :3] == palette[first]).all() and (f0[..., 3] == 255).all()
+    expect = palette[first].copy()
+    region = expect[10:19, 20:31]
+    mask = patch != trans
+    region[mask] = palette[patch][mask]
+    assert (f1[..., :3] == expect).all()
+    assert d0 == pytest.approx(0.1) and d1 == pytest.approx(0.12)
+
+
+def test_gif_long_lzw_stream(decoder, tmp_path):
+    # 码表写满 4096 后继续解码
+    rng = np.random.default_rng(3)
+    w, h = 200, 120
+    palette = rng.integers(0, 256, (256, 3), dtype=np.uint8)
+    indices = rng.integers(0, 256, (h, w))
+    path = tmp_path / "big.gif"
+    path.write_bytes(encode_gif(w, h, palette, [(0, 0, indices, None, False, 0, 10)]))
+    _, decoded = decode_all(decoder, path)
+    assert (decoded[0][0][..., :3] == palette[indices]).all()
+
+
+def test_apng_matches_pillow(decoder, tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    rng = np.random.default_rng(11)
+    # 平滑图像, Pillow 自适应滤波多选 Paeth/Average
+    yy, xx = np.mgrid[0:48, 0:64]
+    frames = []
+    for i in range(3):
+        rgba = np.stack([(xx * 4 + i * 20) % 256, (yy * 5) % 256, (xx + yy) % 256, np.full_like(xx, 255)], axis=-1)
+        rgba = (rgba + rng.integers(0, 3, rgba.shape)).clip(0, 255).astype(np.uint8)
+        frames.append(Image.fromarray(rgba, "RGBA"))
+    path = tmp_path / "pillow.png"
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=100, loop=0)
+    _, decoded = decode_all(decoder, path)
+    assert len(decoded) == 3
+    for src, (rgba, _) in zip(frames, decoded):
+        assert (rgba == np.asarray(src)).all()
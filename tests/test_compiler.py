@@ -0,0 +1,108 @@
+"""
+compiler 只依赖标准库, 按文件路径导入, 不经过插件包(需要 bpy)
+"""
+import importlib.util
+import json
+from pathlib import Path
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+INPAINT = ROOT / "presets" / "04高级" / "Inpaint内补生成-标准版.json"
+
+OBJECT_INFO = {
+    "Loader": {"input": {"required": {"ckpt_name": [["a.safetensors", "b.safetensors"]]}},
+               "output": ["MODEL", "LATENT"]},
+    "Sampler": {"input": {"required": {"model": ["MODEL"],
+                                       "latent": ["LATENT"],
+                                       "seed": ["INT", {"default": 5, "min": 0}],
+                                       "cfg": ["FLOAT", {"default": 7.5}],
+                                       "denoise": ["FLOAT"],
+                                       "sampler": [["euler", "ddim"]],
+                                       "tiled": [[True, False]],
+                                       "note": ["STRING", {"multiline": True}]}},
+                "output": ["LATENT"]},
+}
+
+
+@pytest.fixture(scope="module")
+def compiler():
+    spec = importlib.util.spec_from_file_location("sdn_compiler", ROOT / "SDNode" / "compiler.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def node(nid, ntype, inputs=(), widgets=(), outputs=()):
+    return {"id": nid, "type": ntype,
+            "inputs": [dict(inp) for inp in inputs],
+            "outputs": [dict(out) for out in outputs],
+            "widgets_values": list(widgets)}
+
+
+def compile_prompt(compiler, nodes, links, object_info=OBJECT_INFO):
+    workflow = {"nodes": nodes, "links": links}
+    return compiler.WorkflowCompiler(compiler.load_object_info(None) | object_info).compile(workflow)
+
+
+def test_missing_widgets_use_defaults(compiler):
+    nodes = [
+        node(1, "Loader", widgets=[], outputs=[{"name": "MODEL"}, {"name": "LATENT"}]),
+        node(2, "Sampler", inputs=[{"name": "model"}, {"name": "latent"}], widgets=[]),
+    ]
+    links = [[1, 1, 0, 2, 0, "MODEL"], [2, 1, 1, 2, 1, "LATENT"]]
+    prompt = compile_prompt(compiler, nodes, links)
+    assert prompt["1"] == {"inputs": {"ckpt_name": "a.safetensors"}, "class_type": "Loader"}
+    assert prompt["2"]["inputs"] == {
+        "model": ["1", 0],
+        "latent": ["1", 1],
+        "seed": 5,
+        "control_after_generate": "fixed",
+        "cfg": 7.5,
+        "denoise": 0.0,
+        "sampler": "euler",
+        "tiled": False,
+        "note": "",
+    }
+
+
+def test_widget_values_and_primitive(compiler):
+    nodes = [
+        node(1, "Loader", widgets=["b.safetensors"], outputs=[{"name": "MODEL"}, {"name": "LATENT"}]),
+        node(3, "Reroute", inputs=[{"name": ""}], outputs=[{"name": ""}]),
+        node(4, "PrimitiveNode", outputs=[{"name": "INT", "widget": {"name": "seed"}}], widgets=[99, "fixed"]),
+        node(2, "Sampler",
+             inputs=[{"name": "model"}, {"name": "latent"}, {"name": "seed", "widget": {"name": "seed"}}],
+             widgets=["42", "randomize", 3.0, 0.5, "ddim", True, "hi"]),
+    ]
+    links = [[1, 1, 0, 3, 0, "MODEL"], [2, 3, 0, 2, 0, "MODEL"], [3, 1, 1, 2, 1, "LATENT"], [4, 4, 0, 2, 2, "INT"]]
+    prompt = compile_prompt(compiler, nodes, links)
+    assert set(prompt) == {"1", "2"}
+    inputs = prompt["2"]["inputs"]
+    # Reroute 向上追溯到源节点
+    assert inputs["model"] == ["1", 0]
+    # PrimitiveNode 取目标节点的值, seed 转为整数
+    assert inputs["seed"] == 42
+    assert (inputs["cfg"], inputs["denoise"], inputs["sampler"], inputs["tiled"]) == (3.0, 0.5, "ddim", True)
+
+
+def test_invalid_type(compiler):
+    with pytest.raises(compiler.CompileError):
+        compile_prompt(compiler, [node(1, "Missing")], [])
+
+
+@pytest.mark.skipif(not INPAINT.exists(), reason="preset not found")
+def test_inpaint_preset(compiler):
+    workflow = compiler.read_json(INPAINT)
+    payload = compiler.compile_workflow(workflow, compiler.load_object_info(), client_id="test")
+    assert payload["client_id"] == "test"
+    assert payload["extra_data"]["extra_pnginfo"]["workflow"] is workflow
+    prompt = json.loads(json.dumps(payload["prompt"]))
+    for nid, item in prompt.items():
+        for name, value in item["inputs"].items():
+            # ComfyUI 校验时拒绝 null
+            assert value is not None, (nid, item["class_type"], name)
+            if isinstance(value, list):
+                assert value[0] in prompt, (nid, name)
+    inpaint = next(item for item in prompt.values() if item["class_type"] == "VAEEncodeForInpaint")
+    assert inpaint["inputs"]["grow_mask_by"] == 6
+    assert "PreviewImage" in {item["class_type"] for item in prompt.values()}
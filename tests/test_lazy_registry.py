@@ -0,0 +1,52 @@
+from pathlib import Path
+import pytest
+
+ADDON = Path(__file__).resolve().parent.parent.name
+
+
+@pytest.fixture(scope="module")
+def registry(addon):
+    import addon_utils
+    addon_utils.enable(ADDON, default_set=True)
+    yield addon("SDNode.nodes").LazyNodeRegistry
+    addon_utils.disable(ADDON)
+
+
+def cold_type(registry) -> str:
+    # 未预热(未注册)的节点类型
+    for name in sorted(registry.NODES):
+        if name not in registry.REG_NODES and name not in registry.EAGER:
+            return name
+    pytest.skip("no lazy node class")
+
+
+def test_open_blend_with_cold_node(registry, tmp_path):
+    import bpy
+    name = cold_type(registry)
+    tree = bpy.data.node_groups.new("SDN_LAZY", "CFNodeTree")
+    registry.ensure(name)
+    tree.nodes.new(name)
+    path = tmp_path.joinpath("cold.blend").as_posix()
+    bpy.ops.wm.save_as_mainfile(filepath=path)
+
+    # 模拟新会话: 该类型没有被预热
+    registry._unregister(registry.REG_NODES.pop(name))
+    bpy.ops.wm.open_mainfile(filepath=path)
+
+    node = bpy.data.node_groups["SDN_LAZY"].nodes[0]
+    assert registry.is_registered(name)
+    assert node.bl_idname == name
+    assert node.get(registry.TYPE_KEY) == name
+
+
+def test_validation_registers_appended_node(registry):
+    import bpy
+    name = cold_type(registry)
+    tree = bpy.data.node_groups.new("SDN_LAZY_APPEND", "CFNodeTree")
+    registry.ensure(name)
+    tree.nodes.new(name)
+    registry._unregister(registry.REG_NODES.pop(name))
+    assert tree.nodes[0].bl_idname == "NodeUndefined"
+
+    tree.validation()
+    assert tree.nodes[0].bl_idname == name
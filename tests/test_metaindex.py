@@ -0,0 +1,110 @@
+import json
+import os
+import struct
+import zlib
+import pytest
+
+
+def chunk(ctype: bytes, body: bytes) -> bytes:
+    return struct.pack(">I", len(body)) + ctype + body + struct.pack(">I", zlib.crc32(ctype + body))
+
+
+def write_png(path, texts: dict[str, str] = None, mtime=None):
+    png = b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">2I5B", 1, 1, 8, 0, 0, 0, 0))
+    for key, value in (texts or {}).items():
+        png += chunk(b"tEXt", key.encode("latin-1") + b"\0" + value.encode("utf8"))
+    png += chunk(b"IDAT", zlib.compress(b"\0\0")) + chunk(b"IEND", b"")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(png)
+    if mtime is not None:
+        os.utime(path, ns=(mtime, mtime))
+
+
+def prompt_meta(text, seed, model="sd_xl.safetensors"):
+    prompt = {
+        "1": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": model}},
+        "2": {"class_type": "CLIPTextEncode", "inputs": {"text": text}},
+        "3": {"class_type": "KSampler", "inputs": {"seed": seed}},
+    }
+    return {"prompt": json.dumps(prompt)}
+
+
+@pytest.fixture
+def meta(addon, tmp_path, monkeypatch):
+    module = addon("SDNode.metaindex")
+    MetaIndex = module.MetaIndex
+    MetaIndex.close()
+    monkeypatch.setattr(MetaIndex, "DB_PATH", tmp_path / "db" / "meta_index.db")
+    monkeypatch.setattr(MetaIndex, "WATCHED", set())
+    # 子目录扫描只记录, 不启动后台线程
+    queued = []
+    monkeypatch.setattr(MetaIndex, "put", staticmethod(lambda path, recursive=True: queued.append(path)))
+    monkeypatch.setattr(MetaIndex, "queued", queued, raising=False)
+    yield MetaIndex
+    MetaIndex.unwatch(tmp_path.as_posix())
+    MetaIndex.close()
+
+
+def paths(rows):
+    return sorted(os.path.basename(r["path"]) for r in rows)
+
+
+def test_like_pattern(addon):
+    like_pattern = addon("SDNode.metaindex").like_pattern
+    assert like_pattern("long_hair") == "%long\\_hair%"
+    assert like_pattern("50%") == "%50\\%%"
+    assert like_pattern("a\\b") == "%a\\\\b%"
+
+
+def test_scan_and_query(meta, tmp_path):
+    root = tmp_path / "out"
+    write_png(root / "a.png", prompt_meta("1girl, long_hair", 7))
+    write_png(root / "sub" / "b.png", prompt_meta("1girl, longXhair", 8, "v1_5.ckpt"))
+    write_png(root / "plain.png")
+    assert meta.scan(root.as_posix()) == 3
+    assert meta.scan(root.as_posix()) == 0
+
+    # 无元数据的图片不出现在查询结果中
+    assert paths(meta.query()) == ["a.png", "b.png"]
+    # _ 按字面匹配
+    assert paths(meta.query(text="long_hair")) == ["a.png"]
+    assert paths(meta.query(text="1girl")) == ["a.png", "b.png"]
+    assert paths(meta.query(seed=8)) == ["b.png"]
+    assert paths(meta.query(model="sd_xl")) == ["a.png"]
+    assert paths(meta.query(model="sd%xl")) == []
+    assert paths(meta.query(class_type="KSampler")) == ["a.png", "b.png"]
+    assert json.loads(meta.get_workflow(root / "a.png"))["3"]["inputs"]["seed"] == 7
+
+
+def test_scan_incremental(meta, tmp_path):
+    root = tmp_path / "out"
+    write_png(root / "a.png", prompt_meta("cat", 1), mtime=1_000_000_000)
+    write_png(root / "sub" / "b.png", prompt_meta("dog", 2))
+    assert meta.scan(root.as_posix()) == 2
+
+    # 修改后只重新解析该文件
+    write_png(root / "a.png", prompt_meta("bird", 1), mtime=2_000_000_000)
+    assert meta.scan(root.as_posix()) == 1
+    assert paths(meta.query(text="bird")) == ["a.png"]
+    assert meta.query(text="cat") == []
+
+    # 非递归扫描不解析子目录, 新子目录加入队列, 删除的文件/子目录移除记录
+    write_png(root / "new" / "c.png", prompt_meta("fox", 3))
+    (root / "a.png").unlink()
+    for p in (root / "sub").iterdir():
+        p.unlink()
+    (root / "sub").rmdir()
+    assert meta.scan(root.as_posix(), recursive=False) == 0
+    assert meta.queued == [(root / "new").as_posix()]
+    assert meta.query() == []
+    assert (root / "sub").as_posix() not in meta.WATCHED
+
+
+def test_find_similar(meta, tmp_path):
+    root = tmp_path / "out"
+    write_png(root / "a.png", prompt_meta("1girl, red hair, smile", 5))
+    write_png(root / "b.png", prompt_meta("1girl, red hair", 6))
+    write_png(root / "c.png", prompt_meta("landscape", 9, "other.safetensors"))
+    meta.scan(root.as_posix())
+    results = meta.find_similar(root / "a.png")
+    assert [os.path.basename(item["path"]) for _, item in results] == ["b.png"]
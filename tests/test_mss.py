@@ -0,0 +1,44 @@
+import random
+import pytest
+from mss import base, screenshot
+from mss.base import MSSBase
+from mss.screenshot import ScreenShot
+
+
+def random_shot(rng: random.Random, left, top, width, height, alpha=None) -> ScreenShot:
+    raw = bytearray(rng.getrandbits(8) for _ in range(width * height * 4))
+    if alpha:
+        # 光标大部分像素全透明或不透明, 其余半透明
+        raw[3::4] = bytes(rng.choice(alpha) for _ in range(width * height))
+    return ScreenShot(raw, {"left": left, "top": top, "width": width, "height": height})
+
+
+def copy_shot(shot: ScreenShot) -> ScreenShot:
+    return ScreenShot(bytearray(shot.raw), {"left": shot.left, "top": shot.top, "width": shot.width, "height": shot.height})
+
+
+def test_rgb_matches_loop(monkeypatch):
+    rng = random.Random(0)
+    for width, height in [(1, 1), (7, 3), (64, 17), (255, 2)]:
+        shot = random_shot(rng, 0, 0, width, height)
+        fast = copy_shot(shot).rgb
+        monkeypatch.setattr(screenshot, "np", None)
+        slow = copy_shot(shot).rgb
+        monkeypatch.undo()
+        assert fast == slow
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_merge_matches_loop(monkeypatch, seed):
+    rng = random.Random(seed)
+    x, y = rng.randint(-50, 50), rng.randint(-50, 50)
+    w, h = rng.randint(1, 40), rng.randint(1, 40)
+    screen = random_shot(rng, x, y, w, h)
+    cw, ch = rng.randint(1, 24), rng.randint(1, 24)
+    # 光标可能完全在屏幕内, 部分越过任意一边, 或完全在屏幕外
+    cx, cy = rng.randint(x - cw - 2, x + w + 2), rng.randint(y - ch - 2, y + h + 2)
+    cursor = random_shot(rng, cx, cy, cw, ch, alpha=[0, 0, 255, 255, 1, 128, 254])
+    fast = MSSBase._merge(copy_shot(screen), cursor).raw
+    monkeypatch.setattr(base, "np", None)
+    slow = MSSBase._merge(copy_shot(screen), cursor).raw
+    assert fast == slow
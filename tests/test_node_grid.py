@@ -0,0 +1,106 @@
+import random
+import pytest
+
+
+@pytest.fixture(scope="module")
+def linker(addon):
+    return addon("Linker.linker")
+
+
+class FakeNode:
+    def __init__(self, name, location, dimensions, node_type="CUSTOM", bl_idname="SDNTestNode"):
+        self.name = name
+        self.type = node_type
+        self.bl_idname = bl_idname
+        self.location = location
+        self.dimensions = dimensions
+        self.parent = None
+
+
+class FakeNodes(dict):
+    """
+    与 bpy 的 nodes 集合一致: 迭代得到节点, get 按名称查找
+    """
+
+    def __iter__(self):
+        return iter(list(self.values()))
+
+
+def random_node(rng: random.Random, name: str, spread: float):
+    from mathutils import Vector
+    location = Vector((rng.uniform(-spread, spread), rng.uniform(-spread, spread)))
+    kind = rng.random()
+    if kind < 0.1:
+        return FakeNode(name, location, Vector((0, 0)), bl_idname="NodeReroute")
+    if kind < 0.15:
+        return FakeNode(name, location, Vector((rng.uniform(400, 1500), rng.uniform(400, 1500))), node_type="FRAME")
+    # 包括跨越多个格子的大节点
+    return FakeNode(name, location, Vector((rng.uniform(80, 700), rng.uniform(40, 900))))
+
+
+def brute_force(linker, nodes, pos):
+    return linker.GetNearestNodes([nd for nd in nodes if nd.type != "FRAME"], pos)
+
+
+def assert_same_order(linker, grid, nodes, pos):
+    expected = brute_force(linker, nodes, pos)
+    found = list(grid.nearest(nodes, pos))
+    dists = [dist for _, dist in found]
+    assert dists == sorted(dists)
+    # 距离相同的节点顺序可以不同
+    assert [round(d, 6) for d in dists] == [round(d, 6) for _, d in expected]
+    assert sorted(nd.name for nd, _ in found) == sorted(nd.name for nd, _ in expected)
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_nearest_matches_brute_force(linker, seed):
+    from mathutils import Vector
+    rng = random.Random(seed)
+    spread = rng.choice([100, 1000, 5000])
+    nodes = FakeNodes({f"n{i}": random_node(rng, f"n{i}", spread) for i in range(rng.randint(0, 120))})
+    grid = linker.NodeGrid()
+    grid.sync(nodes)
+    for _ in range(10):
+        # 光标可能在节点内, 节点间或远离所有节点
+        pos = Vector((rng.uniform(-2 * spread, 2 * spread), rng.uniform(-2 * spread, 2 * spread)))
+        assert_same_order(linker, grid, nodes, pos)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_sync_after_edits(linker, seed):
+    from mathutils import Vector
+    rng = random.Random(seed)
+    nodes = FakeNodes({f"n{i}": random_node(rng, f"n{i}", 2000) for i in range(80)})
+    grid = linker.NodeGrid()
+    grid.sync(nodes)
+    for step in range(5):
+        # 移动, 缩放, 删除和新增节点后只增量同步
+        for nd in rng.sample(list(nodes), min(10, len(nodes))):
+            nd.location = nd.location + Vector((rng.uniform(-600, 600), rng.uniform(-600, 600)))
+            if nd.bl_idname != "NodeReroute":
+                nd.dimensions = Vector((rng.uniform(80, 700), rng.uniform(40, 900)))
+        for name in rng.sample(list(nodes.keys()), 5):
+            nodes.pop(name)
+        for i in range(5):
+            name = f"s{step}_{i}"
+            nodes[name] = random_node(rng, name, 2000)
+        grid.sync(nodes)
+        assert set(grid.boxes) == {nd.name for nd in nodes if nd.type != "FRAME"}
+        pos = Vector((rng.uniform(-3000, 3000), rng.uniform(-3000, 3000)))
+        assert_same_order(linker, grid, nodes, pos)
+
+
+def test_partial_iteration_is_nearest_first(linker):
+    from mathutils import Vector
+    rng = random.Random(7)
+    nodes = FakeNodes({f"n{i}": random_node(rng, f"n{i}", 20000) for i in range(2000)})
+    grid = linker.NodeGrid()
+    grid.sync(nodes)
+    pos = Vector((123.0, -456.0))
+    expected = brute_force(linker, nodes, pos)[:5]
+    found = []
+    for item in grid.nearest(nodes, pos):
+        found.append(item)
+        if len(found) == 5:
+            break
+    assert [round(d, 6) for _, d in found] == [round(d, 6) for _, d in expected]
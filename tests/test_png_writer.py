@@ -0,0 +1,110 @@
+import struct
+import zlib
+import numpy as np
+import pytest
+
+SIZES = [(1, 1), (3, 5), (17, 9), (64, 33), (129, 7)]
+LEVELS = [0, 1, 6, 9]
+
+
+@pytest.fixture(scope="module")
+def writer(addon):
+    return addon("utils").PngWriter
+
+
+def read_chunks(png: bytes) -> dict[bytes, bytes]:
+    assert png[:8] == b"\x89PNG\r\n\x1a\n"
+    chunks, pos = {}, 8
+    while pos < len(png):
+        length, ctype = struct.unpack(">I4s", png[pos:pos + 8])
+        body = png[pos + 8:pos + 8 + length]
+        assert struct.unpack(">I", png[pos + 8 + length:pos + 12 + length])[0] == zlib.crc32(ctype + body)
+        chunks[ctype] = chunks.get(ctype, b"") + body
+        pos += length + 12
+    return chunks
+
+
+def decode(png: bytes) -> tuple[int, int, int, np.ndarray]:
+    """
+    参照 PNG 规范逐字节还原滤波
+    """
+    chunks = read_chunks(png)
+    w, h, depth, color_type, _, _, _ = struct.unpack(">2I5B", chunks[b"IHDR"])
+    assert depth == 8
+    channels = {0: 1, 4: 2, 2: 3, 6: 4}[color_type]
+    raw = zlib.decompress(chunks[b"IDAT"])
+    stride = w * channels
+    assert len(raw) == h * (stride + 1)
+    out = bytearray(h * stride)
+    for y in range(h):
+        ftype = raw[y * (stride + 1)]
+        line = raw[y * (stride + 1) + 1:(y + 1) * (stride + 1)]
+        row = y * stride
+        for i in range(stride):
+            a = out[row + i - channels] if i >= channels else 0
+            b = out[row + i - stride] if y else 0
+            c = out[row + i - stride - channels] if y and i >= channels else 0
+            if ftype == 0:
+                pred = 0
+            elif ftype == 1:
+                pred = a
+            elif ftype == 2:
+                pred = b
+            elif ftype == 3:
+                pred = (a + b) >> 1
+            else:
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                pred = a if pa <= pb and pa <= pc else (b if pb <= pc else c)
+            out[row + i] = (line[i] + pred) & 0xFF
+    return w, h, channels, np.frombuffer(bytes(out), dtype=np.uint8).reshape(h, w, channels)
+
+
+def random_pixels(w, h, channels, seed):
+    rng = np.random.default_rng(seed)
+    # 平滑渐变加噪声, 让各种滤波都有机会被选中
+    base = np.add.outer(np.arange(h), np.arange(w))[..., None] * np.arange(1, channels + 1)
+    return ((base + rng.integers(0, 8, (h, w, channels))) % 256).astype(np.uint8)
+
+
+@pytest.mark.parametrize("adaptive", [False, True])
+@pytest.mark.parametrize("channels", [1, 2, 3, 4])
+@pytest.mark.parametrize("size", SIZES)
+def test_round_trip(writer, size, channels, adaptive):
+    w, h = size
+    for level in LEVELS:
+        pixels = random_pixels(w, h, channels, seed=w * h * channels + level)
+        png = writer.encode(pixels.tobytes(), size, channels=channels, level=level, adaptive=adaptive)
+        *shape, decoded = decode(png)
+        assert shape == [w, h, channels]
+        assert np.array_equal(decoded, pixels)
+
+
+@pytest.mark.parametrize("channels", [1, 3, 4])
+def test_round_trip_many_bands(writer, monkeypatch, channels):
+    # 每块只有几行, 覆盖 Z_SYNC_FLUSH 拼接和 adler32 合并
+    monkeypatch.setattr(writer, "BAND_BYTES", 100)
+    w, h = 37, 23
+    for adaptive in (False, True):
+        pixels = random_pixels(w, h, channels, seed=channels)
+        png = writer.encode(pixels, (w, h), channels=channels, level=6, adaptive=adaptive)
+        assert np.array_equal(decode(png)[3], pixels)
+
+
+def test_write_file(writer, tmp_path):
+    pixels = random_pixels(5, 4, 3, seed=0)
+    output = tmp_path.joinpath("out.png")
+    assert writer.encode(pixels, (5, 4), output=output) is None
+    assert np.array_equal(decode(output.read_bytes())[3], pixels)
+
+
+@pytest.mark.parametrize("channels", [1, 2, 3, 4])
+def test_pillow_decode(writer, channels):
+    Image = pytest.importorskip("PIL.Image")
+    import io
+    w, h = 31, 17
+    pixels = random_pixels(w, h, channels, seed=channels)
+    png = writer.encode(pixels, (w, h), channels=channels, level=1, adaptive=True)
+    with Image.open(io.BytesIO(png)) as img:
+        decoded = np.asarray(img).reshape(h, w, channels)
+    assert np.array_equal(decoded, pixels)
@@ -1,5 +1,7 @@
+import os
 import struct
 import queue
+import tempfile
 import platform
 import time
 import re
@@ -7,12 +9,15 @@ import json
 from pathlib import Path
 from threading import Thread
 from functools import lru_cache
+from collections import OrderedDict
+from copy import deepcopy
+from typing import Any
 from urllib.parse import urlparse
 from ast import literal_eval
 from .kclogger import logger
 from .translations import LANG_TEXT
 from .timer import Timer
-from .datas import IMG_SUFFIX, get_bl_version
+from .datas import IMG_SUFFIX, ENUM_ITEMS_CACHE, get_bl_version
 translation = {}
 
 
@@ -150,6 +155,94 @@ def __del__():
     PrevMgr.clear()
 
 
+class MemCache:
+    """
+    按内存预算淘汰的 LRU, 图标和预览图共用同一份预算
+        put: 记录条目及其占用字节, 超出预算时按最久未使用淘汰, 淘汰回调在主线程执行
+        touch: 访问条目(统计命中/未命中)
+        stats: 各缓存池的命中/未命中/淘汰次数及占用
+    """
+    BUDGET = 2048 * 1024 * 1024
+    ENTRIES: OrderedDict[tuple[str, str], tuple[int, Any]] = OrderedDict()  # {(pool, key): (nbytes, on_evict)}
+    USED = 0
+    STATS: dict[str, dict[str, int]] = {}
+
+    @staticmethod
+    def pool_stats(pool) -> dict[str, int]:
+        return MemCache.STATS.setdefault(pool, {"hit": 0, "miss": 0, "evict": 0, "bytes": 0, "count": 0})
+
+    @staticmethod
+    def set_budget(mb):
+        MemCache.BUDGET = int(mb) * 1024 * 1024
+        MemCache.evict()
+
+    @staticmethod
+    def touch(pool, key) -> bool:
+        if (pool, key) not in MemCache.ENTRIES:
+            return False
+        MemCache.ENTRIES.move_to_end((pool, key))
+        MemCache.pool_stats(pool)["hit"] += 1
+        return True
+
+    @staticmethod
+    def miss(pool):
+        MemCache.pool_stats(pool)["miss"] += 1
+
+    @staticmethod
+    def tracked(pool, key) -> bool:
+        return (pool, key) in MemCache.ENTRIES
+
+    @staticmethod
+    def put(pool, key, nbytes, on_evict=None):
+        MemCache.discard(pool, key)
+        MemCache.ENTRIES[(pool, key)] = (nbytes, on_evict)
+        MemCache.USED += nbytes
+        stats = MemCache.pool_stats(pool)
+        stats["bytes"] += nbytes
+        stats["count"] += 1
+        MemCache.evict()
+
+    @staticmethod
+    def discard(pool, key):
+        """
+        移除记录, 不执行淘汰回调
+        """
+        if (entry := MemCache.ENTRIES.pop((pool, key), None)) is None:
+            return
+        MemCache.USED -= entry[0]
+        stats = MemCache.pool_stats(pool)
+        stats["bytes"] -= entry[0]
+        stats["count"] -= 1
+
+    @staticmethod
+    def evict():
+        while MemCache.USED > MemCache.BUDGET and len(MemCache.ENTRIES) > 1:
+            (pool, key), (_, on_evict) = next(iter(MemCache.ENTRIES.items()))
+            MemCache.discard(pool, key)
+            MemCache.pool_stats(pool)["evict"] += 1
+            if on_evict:
+                Timer.put(on_evict)
+
+    @staticmethod
+    def stats() -> dict:
+        return {"budget": MemCache.BUDGET, "used": MemCache.USED, "pools": deepcopy(MemCache.STATS)}
+
+    @staticmethod
+    def report():
+        logger.info("Cache: %.1fMB / %.1fMB", MemCache.USED / 1024**2, MemCache.BUDGET / 1024**2)
+        for pool, stats in MemCache.STATS.items():
+            total = stats["hit"] + stats["miss"]
+            rate = stats["hit"] / total * 100 if total else 0
+            logger.info("    %-8s %5d items %8.1fMB  hit %5.1f%%  evict %d",
+                        pool, stats["count"], stats["bytes"] / 1024**2, rate, stats["evict"])
+
+    @staticmethod
+    def clear(pool=None):
+        for p, key in list(MemCache.ENTRIES):
+            if pool is None or p == pool:
+                MemCache.discard(p, key)
+
+
 class MetaIn(type):
     def __contains__(cls, name):
         return cls.__contains__(cls, name)
@@ -160,9 +253,13 @@ class Icon(metaclass=MetaIn):
     NONE_IMAGE = ""
     IMG_STATUS = {}
     PIX_STATUS = {}
-    PATH2BPY = {}
+    EVICTED_ICONS: set[int] = set()  # 已淘汰但可能仍被枚举缓存引用的 icon_id
+    PATH2BPY = {}  # {规范化绝对路径: bpy.types.Image}, 增量维护, 访问时校验
+    PATH2BPY_COUNT = -1  # 索引同步时 bpy.data.images 的数量, 插件自己增删图像时同步增减
     ENABLE_HQ_PREVIEW = False
     INSTANCE = None
+    PREVIEW_MAX_SIZE = 512
+    ICON_EST_BYTES = 256 * 256 * 4  # 非HQ模式下由 blender 生成的缩略图大小
 
     def __init__(self) -> None:
         if Icon.NONE_IMAGE and Icon.NONE_IMAGE not in Icon:
@@ -179,7 +276,45 @@ class Icon(metaclass=MetaIn):
         import bpy
         Icon.PATH2BPY.clear()
         for i in bpy.data.images:
-            Icon.PATH2BPY[FSWatcher.to_str(i.filepath)] = i
+            if key := Icon.image_key(i):
+                Icon.PATH2BPY[key] = i
+        Icon.PATH2BPY_COUNT = len(bpy.data.images)
+
+    @staticmethod
+    def image_key(img) -> str:
+        import bpy
+        if not img.filepath:
+            return ""
+        return FSWatcher.to_str(bpy.path.abspath(img.filepath, library=img.library))
+
+    @staticmethod
+    def index_image(img):
+        """
+        新建/加载图像后登记到路径索引
+        """
+        import bpy
+        if key := Icon.image_key(img):
+            Icon.PATH2BPY[key] = img
+        # 索引原本同步时只多了这一张, 无需全量扫描
+        if Icon.PATH2BPY_COUNT == len(bpy.data.images) - 1:
+            Icon.PATH2BPY_COUNT += 1
+
+    @staticmethod
+    def unindex_image(path):
+        Icon.PATH2BPY.pop(FSWatcher.to_str(path), None)
+
+    @staticmethod
+    def remove_image(img):
+        """
+        删除图像并同步路径索引
+        """
+        import bpy
+        synced = Icon.PATH2BPY_COUNT == len(bpy.data.images)
+        if (key := Icon.image_key(img)) and Icon.PATH2BPY.get(key) == img:
+            Icon.PATH2BPY.pop(key)
+        bpy.data.images.remove(img)
+        if synced:
+            Icon.PATH2BPY_COUNT -= 1
 
     @staticmethod
     def apply_alpha(img):
@@ -199,12 +334,68 @@ class Icon(metaclass=MetaIn):
         Icon.IMG_STATUS.clear()
         Icon.PIX_STATUS.clear()
         Icon.PATH2BPY.clear()
+        Icon.PATH2BPY_COUNT = -1
+        MemCache.clear("icon")
+        MemCache.clear("image")
+        Thumbnail.clear()
         Icon.reg_icon(Icon.NONE_IMAGE)
 
     @staticmethod
     def set_hq_preview():
         from .preference import get_pref
         Icon.ENABLE_HQ_PREVIEW = get_pref().enable_hq_preview
+        MemCache.set_budget(get_pref().cache_memory_budget)
+
+    @staticmethod
+    def track_icon(name, nbytes):
+        if not nbytes or name == FSWatcher.to_str(Icon.NONE_IMAGE):
+            return
+        MemCache.put("icon", name, nbytes, (Icon.evict_icon, name))
+
+    @staticmethod
+    def evict_icon(name):
+        # 淘汰回调执行前可能已重新注册
+        if name == FSWatcher.to_str(Icon.NONE_IMAGE) or MemCache.tracked("icon", name):
+            return
+        Icon.IMG_STATUS.pop(name, None)
+        Icon.PIX_STATUS.pop(name, None)
+        if name in Icon.PREV_DICT:
+            if not Icon.EVICTED_ICONS:
+                Timer.put(Icon.drop_enum_items)
+            Icon.EVICTED_ICONS.add(Icon.PREV_DICT[name].icon_id)
+            del Icon.PREV_DICT[name]  # __delitem__ 会释放预览
+
+    @staticmethod
+    def drop_enum_items():
+        """
+        丢弃引用了已淘汰图标的枚举缓存, 下次绘制时重新生成并注册图标
+        """
+        evicted, Icon.EVICTED_ICONS = Icon.EVICTED_ICONS, set()
+        for cache in ENUM_ITEMS_CACHE.values():
+            for inp_name, items in list(cache.items()):
+                if any(item[3] in evicted for item in items):
+                    cache.pop(inp_name)
+        update_screen()
+
+    @staticmethod
+    def track_image(path, img):
+        w, h = Thumbnail.get_size(path)
+        MemCache.put("image", path, w * h * 4, (Icon.evict_image, path))
+
+    @staticmethod
+    def evict_image(path):
+        import bpy
+        if MemCache.tracked("image", path):
+            return
+        img = Icon.PATH2BPY.get(path, None)
+        try:
+            if not img or img.users:
+                # 仍被节点引用时只释放像素缓冲, 下次访问会重新解码
+                img and img.buffers_free()
+                return
+            Icon.remove_image(img)
+        except ReferenceError:
+            Icon.unindex_image(path)
 
     @staticmethod
     def try_mark_image(path) -> bool:
@@ -225,17 +416,54 @@ class Icon(metaclass=MetaIn):
         Icon.IMG_STATUS[path] = p.stat().st_mtime_ns
         return True
 
+    @staticmethod
+    def pixel_fingerprint(prev):
+        # 只读取图像元信息, 读取 pixels 的任何元素都会拷贝整张图
+        return prev.as_pointer(), tuple(prev.size), prev.filepath_raw
+
     @staticmethod
     def can_mark_pixel(prev, name) -> bool:
         name = FSWatcher.to_str(name)
-        if Icon.PIX_STATUS.get(name) == hash(prev.pixels):
+        fingerprint = Icon.pixel_fingerprint(prev)
+        if Icon.PIX_STATUS.get(name) == fingerprint:
             return False
-        Icon.PIX_STATUS[name] = hash(prev.pixels)
+        Icon.PIX_STATUS[name] = fingerprint
         return True
 
+    @staticmethod
+    def copy_pixels(prev, p):
+        """
+        bpy.types.Image -> ImagePreview, 经 numpy 缓冲传输并缩小到 PREVIEW_MAX_SIZE
+        """
+        import numpy as np
+        w, h = prev.size[0], prev.size[1]
+        channels = prev.channels
+        if not w or not h or not channels:
+            return
+        # 原图大小的缓冲用完即释放, 不常驻内存
+        pixels = np.empty(w * h * channels, dtype=np.float32)
+        prev.pixels.foreach_get(pixels)
+        pixels = pixels.reshape(h, w, channels)
+        if channels != 4:
+            rgba = np.ones((h, w, 4), dtype=np.float32)
+            rgba[..., :min(channels, 3)] = pixels[..., :3]
+            if channels < 3:
+                rgba[..., 1:3] = pixels[..., :1]
+            pixels = rgba
+        factor = -(-max(w, h) // Icon.PREVIEW_MAX_SIZE)
+        if factor > 1:
+            # 盒式滤波缩小
+            h, w = h // factor, w // factor
+            pixels = pixels[:h * factor, :w * factor].reshape(h, factor, w, factor, 4).mean(axis=(1, 3), dtype=np.float32)
+        p.icon_size = (32, 32)
+        p.image_size = (w, h)
+        p.image_pixels_float.foreach_set(np.ascontiguousarray(pixels, dtype=np.float32).ravel())
+        return w * h * 4 * 4
+
     @staticmethod
     def remove_mark(name) -> bool:
         name = FSWatcher.to_str(name)
+        MemCache.discard("icon", name)
         Icon.IMG_STATUS.pop(name)
         Icon.PIX_STATUS.pop(name)
         Icon.PREV_DICT.pop(name)
@@ -263,6 +491,7 @@ class Icon(metaclass=MetaIn):
         else:
             if path not in Icon:
                 Icon.PREV_DICT.load(path, path, 'IMAGE')
+                Icon.track_icon(path, Icon.ICON_EST_BYTES)
             if reload:
                 Timer.put(Icon.PREV_DICT[path].reload)
             return Icon[path]
@@ -278,18 +507,41 @@ class Icon(metaclass=MetaIn):
             img = bpy.data.images.load(path)
             Icon.apply_alpha(img)
             Icon.reg_icon_by_pixel(img, path)
-            Timer.put((bpy.data.images.remove, img))  # 直接使用 bpy.data.images.remove 会导致卡死
+            Timer.put((Icon.remove_image, img))  # 直接使用 bpy.data.images.remove 会导致卡死
 
     @staticmethod
     def find_image(path):
-        img = Icon.PATH2BPY.get(FSWatcher.to_str(path), None)
-        if not img:
-            return None
-        try:
-            _ = img.name  # hack ref detect
-            return img
-        except ReferenceError:
+        """
+        按路径查找 bpy.data.images, 命中时校验引用和路径, 未命中时仅在图像数量变化后才全量扫描
+        """
+        import bpy
+        path = FSWatcher.to_str(path)
+        img = Icon.PATH2BPY.get(path, None)
+        if img:
+            try:
+                key = Icon.image_key(img)  # hack ref detect
+            except ReferenceError:
+                key = None
+                Icon.PATH2BPY_COUNT = -1
+            if key == path:
+                MemCache.touch("image", path)
+                return img
+            # 已删除或 filepath 被修改
+            Icon.PATH2BPY.pop(path, None)
+            if key:
+                Icon.PATH2BPY[key] = img
+            Icon.PATH2BPY_COUNT = -1
+        if len(bpy.data.images) != Icon.PATH2BPY_COUNT:
             Icon.update_path2bpy()
+            if img := Icon.PATH2BPY.get(path, None):
+                MemCache.touch("image", path)
+                return img
+        # 数量不变时外部可能同时增删了图像, 外部加载的图像默认以文件名命名, 按名称查找一次
+        elif (img := bpy.data.images.get(os.path.basename(path))) and Icon.image_key(img) == path:
+            Icon.PATH2BPY[path] = img
+            MemCache.touch("image", path)
+            return img
+        MemCache.miss("image")
         return None
 
     @staticmethod
@@ -311,10 +563,27 @@ class Icon(metaclass=MetaIn):
             img = bpy.data.images.load(path)
             img.filepath = path
             Icon.apply_alpha(img)
-            Icon.update_path2bpy()
+            Icon.index_image(img)
+            Icon.track_image(path, img)
             # img.name = path
             return img
 
+    @staticmethod
+    def load_image(path):
+        """
+        新建/刷新 bpy.data.images 但不读取像素(图像在首次访问像素时才解码)
+        """
+        import bpy
+        path = FSWatcher.to_str(path)
+        if img := Icon.find_image(path):
+            img.reload()
+            return img
+        img = bpy.data.images.load(path)
+        img.filepath = path
+        Icon.index_image(img)
+        Icon.track_image(path, img)
+        return img
+
     @staticmethod
     def reg_icon_by_pixel(prev, name):
         name = FSWatcher.to_str(name)
@@ -323,14 +592,16 @@ class Icon(metaclass=MetaIn):
         if name in Icon:
             return
         p = Icon.PREV_DICT.new(name)
-        p.icon_size = (32, 32)
-        p.image_size = (prev.size[0], prev.size[1])
-        p.image_pixels_float[:] = prev.pixels[:]
+        Icon.track_icon(name, Icon.copy_pixels(prev, p))
 
     @staticmethod
     def get_icon_id(name: Path):
-        p = Icon.PREV_DICT.get(FSWatcher.to_str(name), None)
-        if not p:
+        name = FSWatcher.to_str(name)
+        p = Icon.PREV_DICT.get(name, None)
+        if p:
+            MemCache.touch("icon", name)
+        else:
+            MemCache.miss("icon")
             p = Icon.PREV_DICT.get(FSWatcher.to_str(Icon.NONE_IMAGE), None)
         return p.icon_id if p else 0
 
@@ -344,9 +615,7 @@ class Icon(metaclass=MetaIn):
         if not p:
             # logger.error("No")
             return
-        p.icon_size = (32, 32)
-        p.image_size = (prev.size[0], prev.size[1])
-        p.image_pixels_float[:] = prev.pixels[:]
+        Icon.track_icon(name, Icon.copy_pixels(prev, p))
 
     def __getitem__(self, name):
         return Icon.get_icon_id(name)
@@ -358,7 +627,127 @@ class Icon(metaclass=MetaIn):
         return cls.__getitem__(cls, name)
 
 
+class Thumbnail:
+    """
+    预览节点缩略图
+        后台线程解码原图一次, 生成 LEVELS 多级缩略图, 以文件内容 md5 为名缓存到磁盘
+        draw 中只读取图片头获取尺寸, 只使用缩略图注册图标, 未就绪时返回占位图标
+    """
+    LEVELS = (128, 256, 512)
+    DIR = Path(tempfile.gettempdir()) / "SDN_thumbnails"
+    SIZES: dict[str, tuple[int, int, int]] = {}  # {path: (mtime, w, h)}
+    KEYS: dict[str, tuple[int, str | None]] = {}  # {path: (mtime, md5)}, 解码失败时 md5 为 None
+    PENDING: set[str] = set()
+    PENDING_ICON: set[str] = set()
+    QUEUE = queue.Queue()
+    _running = False
+
+    @staticmethod
+    def mtime(path) -> int:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return -1
+
+    @staticmethod
+    def get_size(path) -> tuple[int, int]:
+        from .External.imagesize import imagesize
+        path = FSWatcher.to_str(path)
+        mtime = Thumbnail.mtime(path)
+        if (size := Thumbnail.SIZES.get(path)) and size[0] == mtime:
+            return size[1:]
+        try:
+            w, h = imagesize.get(path)
+        except Exception:
+            w, h = 0, 0
+        w, h = max(w, 0), max(h, 0)
+        Thumbnail.SIZES[path] = (mtime, w, h)
+        return w, h
+
+    @staticmethod
+    def get_icon(path, display_size=512) -> int:
+        path = FSWatcher.to_str(path)
+        mtime = Thumbnail.mtime(path)
+        if mtime == -1:
+            return Icon["NONE"]
+        state = Thumbnail.KEYS.get(path)
+        if not state or state[0] != mtime:
+            Thumbnail.request(path, mtime)
+            return Icon["NONE"]
+        # 解码失败的文件修改前不再重试
+        if state[1] is None:
+            return Icon["NONE"]
+        level = next((lv for lv in Thumbnail.LEVELS if lv >= display_size), Thumbnail.LEVELS[-1])
+        thumb = FSWatcher.to_str(Thumbnail.DIR / f"{state[1]}_{level}.png")
+        if thumb in Icon:
+            return Icon[thumb]
+        # draw 中不能新建图像, 交给 Timer
+        if thumb not in Thumbnail.PENDING_ICON:
+            Thumbnail.PENDING_ICON.add(thumb)
+            Timer.put((Thumbnail.reg_thumb_icon, thumb))
+        return Icon["NONE"]
+
+    @staticmethod
+    def reg_thumb_icon(thumb):
+        Thumbnail.PENDING_ICON.discard(thumb)
+        Icon.reg_icon_hq(thumb)
+        update_screen()
+
+    @staticmethod
+    def request(path, mtime):
+        if path in Thumbnail.PENDING:
+            return
+        Thumbnail.PENDING.add(path)
+        Thumbnail.QUEUE.put((path, mtime))
+        if not Thumbnail._running:
+            Thumbnail._running = True
+            Thread(target=Thumbnail._worker, daemon=True).start()
+
+    @staticmethod
+    def _worker():
+        while True:
+            path, mtime = Thumbnail.QUEUE.get()
+            try:
+                Thumbnail.build(path, mtime)
+            except Exception as e:
+                logger.error("Thumbnail failed: %s -> %s", path, e)
+                Thumbnail.KEYS[path] = (mtime, None)
+                continue
+            finally:
+                Thumbnail.PENDING.discard(path)
+            Timer.put(update_screen)
+
+    @staticmethod
+    def build(path, mtime):
+        import imbuf
+        from hashlib import md5
+        key = md5(Path(path).read_bytes()).hexdigest()
+        thumbs = {lv: Thumbnail.DIR / f"{key}_{lv}.png" for lv in Thumbnail.LEVELS}
+        if not all(t.exists() for t in thumbs.values()):
+            Thumbnail.DIR.mkdir(parents=True, exist_ok=True)
+            buf = imbuf.load(path)
+            w, h = buf.size
+            for lv, thumb in thumbs.items():
+                if thumb.exists():
+                    continue
+                scale = min(1, lv / max(w, h, 1))
+                tbuf = buf.copy()
+                tbuf.resize((max(1, round(w * scale)), max(1, round(h * scale))), method="BILINEAR")
+                if hasattr(tbuf, "file_type"):
+                    tbuf.file_type = "PNG"
+                imbuf.write(tbuf, filepath=thumb.as_posix())
+        Thumbnail.KEYS[path] = (mtime, key)
+
+    @staticmethod
+    def clear():
+        Thumbnail.SIZES.clear()
+        Thumbnail.KEYS.clear()
+        Thumbnail.PENDING_ICON.clear()
+
+
 class PngParse:
+    SIGNATURE = b'\x89PNG\r\n\x1a\n'
+    TEXT_CHUNKS = frozenset({b'tEXt', b'zTXt', b'iTXt'})
 
     @staticmethod
     def read_head(pngpath):
@@ -380,31 +769,188 @@ class PngParse:
             }
 
     @staticmethod
-    def read_text_chunk(pngpath) -> dict[str, str]:
+    def iter_chunks(file, read_types=frozenset(), check_crc=False):
+        """
+        逐块读取, 只读取 read_types 中的块内容, 其余块(IDAT 等)直接 seek 跳过
+        yield (chunk_type, chunk_data | None)
+        """
+        import zlib
+        while True:
+            head = file.read(8)
+            if len(head) < 8:
+                return
+            length, chunk_type = struct.unpack('>I4s', head)
+            if chunk_type not in read_types:
+                file.seek(length + 4, os.SEEK_CUR)
+                yield chunk_type, None
+                continue
+            chunk_data = file.read(length)
+            crc = file.read(4)
+            if len(chunk_data) < length:
+                return
+            if check_crc and struct.unpack('>I', crc)[0] != zlib.crc32(chunk_type + chunk_data):
+                logger.warning("PNG chunk %s CRC mismatch", chunk_type)
+                continue
+            yield chunk_type, chunk_data
+
+    @staticmethod
+    def decode_text(data: bytes) -> str:
+        # 规范要求 tEXt/zTXt 为 latin-1, 但 ComfyUI 等写入的是 utf8
+        try:
+            return data.decode("utf8")
+        except UnicodeDecodeError:
+            return data.decode("latin-1")
+
+    @staticmethod
+    def decode_text_chunk(chunk_type, chunk_data: bytes) -> tuple[str, str]:
+        import zlib
+        keyword, body = chunk_data.split(b'\0', 1)
+        keyword = keyword.decode("latin-1")
+        if chunk_type == b'tEXt':
+            return keyword, PngParse.decode_text(body)
+        if chunk_type == b'zTXt':
+            # 压缩方法(1字节) + zlib 数据
+            return keyword, PngParse.decode_text(zlib.decompress(body[1:]))
+        # iTXt: 压缩标志 + 压缩方法 + 语言\0 + 翻译关键字\0 + utf8 文本
+        compressed = body[0]
+        _lang, _tkey, text = body[2:].split(b'\0', 2)
+        if compressed:
+            text = zlib.decompress(text)
+        return keyword, text.decode("utf8")
+
+    @staticmethod
+    def read_text_chunk(pngpath, check_crc=False) -> dict[str, str]:
+        """
+        读取 tEXt/zTXt/iTXt 元数据
+            跳过非文本块; 在 IDAT 前已读到文本时, 遇到 IDAT 即停止, 否则继续查找直到 IEND
+        """
         data = {}
         with open(pngpath, 'rb') as file:
             signature = file.read(8)
-            if signature != b'\x89PNG\r\n\x1a\n':
-                print('Error: Not a PNG file')
+            if signature != PngParse.SIGNATURE:
+                logger.error('Error: Not a PNG file')
                 return data
-
-            # IDHR, PLTE, sRGB, tEXt
-            while True:
-                length_bytes = file.read(4)
-                length = struct.unpack('>I', length_bytes)[0]  # Read chunk length (4 bytes)
-                chunk_type = file.read(4)       # Read chunk type (4 bytes)
-                chunk_data = file.read(length)  # Read chunk data (length bytes)
-                _ = file.read(4)                # Read CRC (4 bytes)
-                if chunk_type in {b'IHDR', b'PLTE'}:  # header and Palette
-                    continue
-                elif chunk_type == b'tEXt':
-                    keyword, text = chunk_data.decode().split('\0', 1)
-                    data[keyword] = text
-                elif chunk_type == b'IEND':
+            for chunk_type, chunk_data in PngParse.iter_chunks(file, PngParse.TEXT_CHUNKS, check_crc):
+                if chunk_type == b'IEND':
                     break
+                if chunk_type == b'IDAT':
+                    if data:
+                        break
+                    continue
+                if chunk_data is None:
+                    continue
+                try:
+                    keyword, text = PngParse.decode_text_chunk(chunk_type, chunk_data)
+                except Exception as e:
+                    logger.warning("PNG chunk %s decode error: %s", chunk_type, e)
+                    continue
+                data[keyword] = text
         return data
 
 
+class PngWriter:
+    """
+    多线程 PNG 编码
+        按行带(band)分块: 每块在线程中用 numpy 滤波(默认 Up, adaptive 时逐行选择 None/Sub/Up/Average/Paeth
+        中绝对值和最小者, 更小但慢数倍), 并独立压缩为 raw deflate 流,
+        非末块以 Z_SYNC_FLUSH 结尾, 拼接后即为合法的 zlib 数据(同 pigz)
+    """
+    EXECUTOR = None
+    BAND_BYTES = 1024 * 1024
+
+    @staticmethod
+    def executor():
+        from concurrent.futures import ThreadPoolExecutor
+        if PngWriter.EXECUTOR is None:
+            PngWriter.EXECUTOR = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="SDNPng")
+        return PngWriter.EXECUTOR
+
+    @staticmethod
+    def filter_rows(rows, prev_row, bpp, adaptive=False):
+        """
+        rows: uint8 [n, stride], prev_row: 上一行(首行为全0) -> 带滤波类型字节的扫描线
+        """
+        import numpy as np
+        if not adaptive:
+            out = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+            out[:, 0] = 2
+            # uint8 相减自动取模
+            out[0, 1:] = rows[0] - prev_row
+            out[1:, 1:] = rows[1:] - rows[:-1]
+            return out.tobytes()
+        a = rows.astype(np.int16)
+        b = np.vstack([prev_row[None].astype(np.int16), a[:-1]])
+        left = np.zeros_like(a)
+        left[:, bpp:] = a[:, :-bpp]
+        up_left = np.zeros_like(b)
+        up_left[:, bpp:] = b[:, :-bpp]
+        p = left + b - up_left
+        pa, pb, pc = np.abs(p - left), np.abs(p - b), np.abs(p - up_left)
+        paeth = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, b, up_left))
+        candidates = np.stack([a, a - left, a - b, a - ((left + b) >> 1), a - paeth])
+        # 按有符号字节的绝对值和选择滤波(libpng 的启发式)
+        filtered = (candidates & 0xFF).astype(np.uint8)
+        cost = np.abs(filtered.view(np.int8).astype(np.int32)).sum(axis=2)
+        best = cost.argmin(axis=0)
+        out = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+        out[:, 0] = best
+        out[:, 1:] = filtered[best, np.arange(rows.shape[0])]
+        return out.tobytes()
+
+    @staticmethod
+    def compress_band(pixels, start, end, bpp, level, last, adaptive) -> bytes:
+        import zlib
+        import numpy as np
+        prev_row = pixels[start - 1] if start else np.zeros(pixels.shape[1], dtype=np.uint8)
+        scanlines = PngWriter.filter_rows(pixels[start:end], prev_row, bpp, adaptive)
+        comp = zlib.compressobj(level, zlib.DEFLATED, -15)
+        return comp.compress(scanlines) + comp.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH), zlib.adler32(scanlines)
+
+    @staticmethod
+    def chunk(chunk_type: bytes, data: bytes) -> bytes:
+        import zlib
+        return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF)
+
+    @staticmethod
+    def encode(data, size, channels=3, level=6, output=None, adaptive=False) -> bytes | None:
+        """
+        data: RGB/RGBA 字节或 numpy 数组(自上而下), size: (w, h)
+        output 为空时返回 PNG 数据, 否则写入文件
+        """
+        import numpy as np
+        w, h = size
+        stride = w * channels
+        pixels = np.frombuffer(data, dtype=np.uint8) if isinstance(data, (bytes, bytearray, memoryview)) else data
+        pixels = np.ascontiguousarray(pixels, dtype=np.uint8).reshape(h, stride)
+        band = max(1, PngWriter.BAND_BYTES // max(stride, 1))
+        bands = [(y, min(y + band, h)) for y in range(0, h, band)]
+        executor = PngWriter.executor()
+        futures = [executor.submit(PngWriter.compress_band, pixels, start, end, channels, level, end == h, adaptive)
+                   for start, end in bands]
+        parts = [f.result() for f in futures]
+        # 合并各块的 adler32: adler = (a, b), 需要各块长度
+        a, b = 1, 0
+        for (start, end), (_, adler) in zip(bands, parts):
+            length = (end - start) * (stride + 1)
+            a2, b2 = adler & 0xFFFF, adler >> 16
+            b = (b + b2 + (a - 1) * length) % 65521
+            a = (a + a2 - 1) % 65521
+        # zlib 头: deflate, 32K 窗口, 校验位使头可被 31 整除
+        idat = b"\x78\x01" + b"".join(p[0] for p in parts) + struct.pack(">I", (b << 16) | a)
+        color_type = {1: 0, 2: 4, 3: 2, 4: 6}[channels]
+        png = b"".join([
+            b"\x89PNG\r\n\x1a\n",
+            PngWriter.chunk(b"IHDR", struct.pack(">2I5B", w, h, 8, color_type, 0, 0, 0)),
+            PngWriter.chunk(b"IDAT", idat),
+            PngWriter.chunk(b"IEND", b""),
+        ])
+        if not output:
+            return png
+        with open(output, "wb") as f:
+            f.write(png)
+        return None
+
+
 class PkgInstaller:
     source = [
         "https://mirrors.aliyun.com/pypi/simple/",
@@ -506,8 +1052,8 @@ class FSWatcher:
     @staticmethod
     def unregister(path):
         path = FSWatcher.to_path(path)
-        FSWatcher._watcher_path.pop(path)
-        FSWatcher._watcher_callback.pop(path)
+        FSWatcher._watcher_path.pop(path, None)
+        FSWatcher._watcher_callback.pop(path, None)
 
     @staticmethod
     def _run():
@@ -522,12 +1068,14 @@ class FSWatcher:
         while FSWatcher._running:
             try:
                 path = FSWatcher._watcher_queue.get(timeout=0.1)
-                if path not in FSWatcher._watcher_path:
-                    continue
-                if callback := FSWatcher._watcher_callback[path]:
+                # 回调期间可能被注销
+                if callback := FSWatcher._watcher_callback.get(path):
                     callback(path)
             except queue.Empty:
                 pass
+            except Exception as e:
+                # 单个回调出错不能中断所有监听的分发
+                logger.error("FSWatcher callback error: %s", e)
 
     @staticmethod
     def _loop():